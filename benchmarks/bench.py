@@ -0,0 +1,183 @@
+"""
+Throughput benchmarks for notebook discovery, parsing, conversion and execution.
+
+Results are printed (or written with --output) as JSON, so they can be compared between releases.
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from importlib.metadata import PackageNotFoundError, version
+from typing import Any, Callable
+
+import click
+
+from generate import generate_notebooks
+from test_nb.parse import extract_bash, extract_code
+from test_nb.reader import read_cells
+from test_nb.run import NotebookRunner
+from test_nb.utils import find_notebooks_in_dir
+
+
+def _measure(fn: Callable[[], Any], repeat: int) -> tuple[float, int]:
+    """Best wall time over `repeat` runs, and the peak traced memory of the first one."""
+    best = float("inf")
+    peak = 0
+    for i in range(repeat):
+        if i == 0:
+            tracemalloc.start()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+        if i == 0:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return best, peak
+
+
+def _throughput(seconds: float, **counts: int) -> dict[str, float]:
+    result = {"seconds": seconds}
+    for name, count in counts.items():
+        result[f"{name}_per_sec"] = count / seconds if seconds else float("inf")
+    return result
+
+
+def bench_pipeline(
+    directory: str, notebooks: int, cells: int, jobs: int, repeat: int
+) -> dict[str, Any]:
+    total_cells = notebooks * (cells + 1)
+    results: dict[str, Any] = {}
+
+    seconds, _ = _measure(lambda: find_notebooks_in_dir(directory, True), repeat)
+    results["discover"] = _throughput(seconds, notebooks=notebooks)
+
+    files = sorted(find_notebooks_in_dir(directory, True))
+    parsed: list = []
+    seconds, peak = _measure(
+        lambda: parsed.__setitem__(slice(None), [read_cells(f) for f in files]), repeat
+    )
+    results["read"] = {
+        **_throughput(seconds, notebooks=notebooks, cells=total_cells),
+        "peak_memory_bytes": peak,
+    }
+
+    code_cells = [c for nb in parsed for c in nb or [] if c["cell_type"] == "code"]
+
+    def extract() -> None:
+        for cell in code_cells:
+            extract_bash(cell)
+            extract_code(cell)
+
+    seconds, _ = _measure(extract, repeat)
+    results["extract"] = _throughput(seconds, cells=len(code_cells))
+
+    def convert() -> None:
+        runner = NotebookRunner(file_paths=files)
+        runner.write_python_files(overwrite=True, jobs=jobs)
+
+    seconds, peak = _measure(convert, repeat)
+    results["convert"] = {
+        **_throughput(seconds, notebooks=notebooks, cells=total_cells),
+        "peak_memory_bytes": peak,
+        "jobs": jobs,
+    }
+    return results
+
+
+def bench_run(directory: str, notebooks: int) -> dict[str, Any]:
+    """Mean per-notebook wall time for trivial notebooks, i.e. the fixed cost of a run."""
+    files = generate_notebooks(directory, notebooks, cells=1, lines=1)
+    results: dict[str, Any] = {"notebooks": notebooks}
+    for name, kwargs in [
+        ("subprocess", {}),
+        ("fork_server", {"fork_server": True}),
+    ]:
+        if name == "fork_server" and not hasattr(os, "fork"):
+            continue
+        runner = NotebookRunner(file_paths=files)
+        runner.write_python_files(in_memory=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            passed, _ = runner.run(jobs=1, slowest=0, **kwargs)  # type: ignore[arg-type]
+            elapsed = time.perf_counter() - start
+        results[name] = {
+            "seconds": elapsed,
+            "overhead_per_notebook_sec": elapsed / notebooks,
+            "mean_notebook_duration_sec": sum(p["duration"] for p in passed)
+            / max(len(passed), 1),
+        }
+    return results
+
+
+@click.command(help="Benchmark test-nb on synthetic notebooks and print JSON results")
+@click.option("--notebooks", type=int, default=200, help="Number of notebooks")
+@click.option("--cells", type=int, default=30, help="Code cells per notebook")
+@click.option("--lines", type=int, default=20, help="Lines per code cell")
+@click.option(
+    "--output-size", type=int, default=4096, help="Bytes of stored output per cell"
+)
+@click.option(
+    "--shell-ratio", type=float, default=0.05, help="Fraction of `!` magic lines"
+)
+@click.option("--jobs", type=int, default=1, help="Workers used for conversion")
+@click.option("--run-notebooks", type=int, default=20, help="Notebooks executed")
+@click.option("--repeat", type=int, default=3, help="Repetitions (best is kept)")
+@click.option("--output", default=None, help="Write the JSON results to this file")
+def main(
+    notebooks: int,
+    cells: int,
+    lines: int,
+    output_size: int,
+    shell_ratio: float,
+    jobs: int,
+    run_notebooks: int,
+    repeat: int,
+    output: str | None,
+) -> None:
+    params = {
+        "notebooks": notebooks,
+        "cells": cells,
+        "lines": lines,
+        "output_size": output_size,
+        "shell_ratio": shell_ratio,
+        "jobs": jobs,
+        "run_notebooks": run_notebooks,
+        "repeat": repeat,
+    }
+    try:
+        tool_version = version("test-nb")
+    except PackageNotFoundError:
+        tool_version = "unknown"
+    with tempfile.TemporaryDirectory(prefix="test_nb_bench_") as tmp:
+        convert_dir = os.path.join(tmp, "convert")
+        generate_notebooks(
+            convert_dir, notebooks, cells, lines, output_size, shell_ratio
+        )
+        results = bench_pipeline(convert_dir, notebooks, cells, jobs, repeat)
+        if run_notebooks > 0:
+            results["run"] = bench_run(os.path.join(tmp, "run"), run_notebooks)
+    report = {
+        "test_nb_version": tool_version,
+        "python": platform.python_version(),
+        "platform": sys.platform,
+        "cpu_count": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if output is not None:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Generate synthetic notebooks of tunable size for benchmarking."""
+
+import base64
+import json
+import os
+import random
+
+import click
+
+
+def generate_notebook(
+    cells: int,
+    lines: int,
+    output_size: int,
+    shell_ratio: float,
+    rng: random.Random,
+) -> dict:
+    notebook_cells: list[dict] = [
+        {
+            "cell_type": "markdown",
+            "metadata": {},
+            "source": ["# Synthetic notebook\n", "Generated for benchmarking."],
+        }
+    ]
+    payload = base64.b64encode(rng.randbytes(output_size * 3 // 4)).decode()
+    for c in range(cells):
+        source = []
+        for i in range(lines):
+            if rng.random() < shell_ratio:
+                source.append(f"!echo 'cell {c} line {i}'\n")
+            else:
+                source.append(f"value_{c}_{i} = {i} * 2  # line {i} of cell {c}\n")
+        if source:
+            source[-1] = source[-1].rstrip("\n")
+        notebook_cells.append(
+            {
+                "cell_type": "code",
+                "execution_count": c + 1,
+                "metadata": {},
+                "outputs": [
+                    {
+                        "output_type": "display_data",
+                        "metadata": {},
+                        "data": {"image/png": payload, "text/plain": ["<Figure>"]},
+                    }
+                ]
+                if output_size
+                else [],
+                "source": source,
+            }
+        )
+    return {
+        "cells": notebook_cells,
+        "metadata": {"kernelspec": {"name": "python3", "language": "python"}},
+        "nbformat": 4,
+        "nbformat_minor": 5,
+    }
+
+
+def generate_notebooks(
+    directory: str,
+    notebooks: int = 10,
+    cells: int = 20,
+    lines: int = 10,
+    output_size: int = 0,
+    shell_ratio: float = 0.0,
+    seed: int = 0,
+) -> list[str]:
+    """Write `notebooks` synthetic notebooks to `directory` and return their paths."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for n in range(notebooks):
+        path = os.path.join(directory, f"synthetic_{n:05d}.ipynb")
+        with open(path, "w") as f:
+            json.dump(generate_notebook(cells, lines, output_size, shell_ratio, rng), f)
+        paths.append(path)
+    return paths
+
+
+@click.command(help="Generate synthetic notebooks for benchmarking")
+@click.argument("directory")
+@click.option("--notebooks", type=int, default=10, help="Number of notebooks")
+@click.option("--cells", type=int, default=20, help="Code cells per notebook")
+@click.option("--lines", type=int, default=10, help="Lines per code cell")
+@click.option(
+    "--output-size", type=int, default=0, help="Bytes of stored output per code cell"
+)
+@click.option(
+    "--shell-ratio",
+    type=float,
+    default=0.0,
+    help="Fraction of lines that are `!` magics",
+)
+@click.option("--seed", type=int, default=0, help="Random seed")
+def main(
+    directory: str,
+    notebooks: int,
+    cells: int,
+    lines: int,
+    output_size: int,
+    shell_ratio: float,
+    seed: int,
+) -> None:
+    paths = generate_notebooks(
+        directory, notebooks, cells, lines, output_size, shell_ratio, seed
+    )
+    print(f"Generated {len(paths)} notebooks in {directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Startup benchmark for the `nb` command line: time spent importing `test_nb.main`, and wall time of
+commands that do not run notebooks (compared to a bare interpreter).
+
+Results are printed (or written with --output) as JSON. The benchmark exits with an error when the
+import time exceeds --max-import-ms, or when `nb --help` imports one of the modules that should only
+be loaded by the commands using them, so that it can guard against startup regressions in CI.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import click
+
+# `nb ARGS`, as the console script runs it
+_NB = "import sys; sys.argv = ['nb', *sys.argv[1:]]; from test_nb.main import main; main()"
+# modules listed once `nb ARGS` is done
+_NB_MODULES = (
+    "import json, sys; sys.argv = ['nb', *sys.argv[1:]]\n"
+    "from test_nb.main import main\n"
+    "try:\n"
+    "    main()\n"
+    "finally:\n"
+    "    sys.stderr.write(json.dumps(sorted(sys.modules)))\n"
+)
+# loaded by `nb --help` only if a heavy import crept back to the top of the CLI modules
+HEAVY_MODULES = (
+    "asyncio",
+    "concurrent.futures",
+    "subprocess",
+    "termcolor",
+    "importlib.metadata",
+    "test_nb.run",
+    "test_nb.cache",
+    "test_nb.reporters",
+    "test_nb.watch",
+)
+COMMANDS = {
+    "help": ["--help"],
+    "convert_help": ["convert", "--help"],
+    "test_help": ["test", "--help"],
+}
+
+
+def _wall_time(args: list[str], repeat: int) -> float:
+    """Median wall time, in milliseconds, of `python ARGS` over `repeat` runs."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *args],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def _import_time(module: str, repeat: int) -> float:
+    """Best cumulative import time of `module`, in milliseconds, as reported by `-X importtime`."""
+    best = float("inf")
+    for _ in range(repeat):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        for line in process.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = [field.strip() for field in line.split("|")]
+            if len(fields) == 3 and fields[2] == module:
+                best = min(best, int(fields[1]) / 1000)
+    return best
+
+
+def heavy_imports(args: list[str]) -> list[str]:
+    """Modules of `HEAVY_MODULES` imported by `nb ARGS`."""
+    process = subprocess.run(
+        [sys.executable, "-c", _NB_MODULES, *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    modules = set(json.loads(process.stderr.splitlines()[-1]))
+    return [module for module in HEAVY_MODULES if module in modules]
+
+
+@click.command(help="Benchmark the startup of the nb command and print JSON results")
+@click.option("--repeat", type=int, default=10, help="Repetitions of each measure")
+@click.option(
+    "--max-import-ms",
+    type=float,
+    default=100.0,
+    help="Fail when importing test_nb.main takes longer than this, in milliseconds",
+)
+@click.option("--output", default=None, help="Write the JSON results to this file")
+def main(repeat: int, max_import_ms: float, output: str | None) -> None:
+    interpreter = _wall_time(["-c", "pass"], repeat)
+    results: dict[str, float] = {
+        "interpreter_ms": interpreter,
+        "import_ms": _import_time("test_nb.main", repeat),
+    }
+    for name, args in COMMANDS.items():
+        results[f"{name}_ms"] = _wall_time(["-c", _NB, *args], repeat)
+        results[f"{name}_overhead_ms"] = results[f"{name}_ms"] - interpreter
+    heavy = heavy_imports(["--help"])
+    report = {
+        "python": platform.python_version(),
+        "platform": sys.platform,
+        "cpu_count": os.cpu_count(),
+        "params": {"repeat": repeat, "max_import_ms": max_import_ms},
+        "results": results,
+        "heavy_imports": heavy,
+    }
+    text = json.dumps(report, indent=2)
+    if output is not None:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    errors = []
+    if results["import_ms"] > max_import_ms:
+        errors.append(
+            f"importing test_nb.main took {results['import_ms']:.1f}ms (budget: {max_import_ms:.1f}ms)"
+        )
+    if heavy:
+        errors.append(f"`nb --help` imported {', '.join(heavy)}")
+    if errors:
+        raise click.ClickException("; ".join(errors))
+
+
+if __name__ == "__main__":
+    main()
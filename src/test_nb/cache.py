@@ -0,0 +1,160 @@
+import json
+import os
+
+from importlib.metadata import PackageNotFoundError, version
+from .models import ConversionCacheEntry, ResultCacheEntry, TimingEntry
+from .utils import hash_text
+
+DEFAULT_CACHE_DIR = ".test_nb_cache"
+
+
+def _tool_version() -> str:
+    try:
+        return version("test-nb")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def _load_manifest(path: str) -> dict:
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_manifest(path: str, data: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+class ConversionCache:
+    """
+    Persistent manifest of converted notebooks, stored as `conversion.json` in the cache directory.
+    An entry is reused when the notebook content hash, the conversion options and the tool version
+    are unchanged and the python file it points to has not been touched since it was written.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.path = os.path.join(cache_dir, "conversion.json")
+        self._entries: dict[str, ConversionCacheEntry] = _load_manifest(self.path)
+        self._dirty = False
+
+    @staticmethod
+    def key(notebook_hash: str, **options: bool) -> str:
+        opts = ",".join(f"{k}={v}" for k, v in sorted(options.items()))
+        return hash_text(f"{notebook_hash}|{opts}|{_tool_version()}")
+
+    def get(self, notebook: str) -> ConversionCacheEntry | None:
+        return self._entries.get(os.path.abspath(notebook))
+
+    @staticmethod
+    def is_fresh(entry: ConversionCacheEntry, key: str) -> bool:
+        if entry["key"] != key:
+            return False
+        try:
+            stat = os.stat(entry["output"])
+        except OSError:
+            return False
+        return stat.st_mtime_ns == entry["mtime_ns"] and stat.st_size == entry["size"]
+
+    def store(
+        self,
+        notebook: str,
+        key: str,
+        output: str,
+        requirements: list[str] | None = None,
+    ) -> None:
+        stat = os.stat(output)
+        self._entries[os.path.abspath(notebook)] = {
+            "key": key,
+            "output": output,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "requirements": requirements or [],
+        }
+        self._dirty = True
+
+    def save(self) -> None:
+        if self._dirty:
+            _save_manifest(self.path, dict(self._entries))
+            self._dirty = False
+
+
+class ResultCache:
+    """
+    Persistent record of run outcomes, stored as `results.json` in the cache directory.
+    Outcomes are keyed by the generated script hash, the python executable and an optional lockfile hash.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.path = os.path.join(cache_dir, "results.json")
+        self._entries: dict[str, ResultCacheEntry] = _load_manifest(self.path)
+        self._dirty = False
+
+    @staticmethod
+    def key(
+        script_hash: str, python_executable: str, lockfile_hash: str | None = None
+    ) -> str:
+        return hash_text(f"{script_hash}|{python_executable}|{lockfile_hash or ''}")
+
+    def passed(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry["passed"]
+
+    def store(self, key: str, file: str, passed: bool) -> None:
+        self._entries[key] = {"file": file, "passed": passed}
+        self._dirty = True
+
+    def save(self) -> None:
+        if self._dirty:
+            _save_manifest(self.path, dict(self._entries))
+            self._dirty = False
+
+
+class TimingsStore:
+    """
+    Duration and outcome of the last run of each notebook, stored in a JSON file
+    (`timings.json` in the cache directory by default, or a file shared between CI nodes).
+    Notebooks are keyed by their path relative to the working directory.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, path: str | None = None):
+        self.path = path or os.path.join(cache_dir, "timings.json")
+        self._entries: dict[str, TimingEntry] = _load_manifest(self.path)
+        self._dirty = False
+
+    @staticmethod
+    def key(notebook: str) -> str:
+        return os.path.normpath(os.path.relpath(notebook)).replace(os.sep, "/")
+
+    def get(self, notebook: str) -> TimingEntry | None:
+        return self._entries.get(self.key(notebook))
+
+    def entries(self, notebooks: list[str]) -> dict[str, TimingEntry]:
+        """Recorded timings of the `notebooks` that have any."""
+        return {
+            notebook: entry
+            for notebook in notebooks
+            if (entry := self.get(notebook)) is not None
+        }
+
+    def durations(self, notebooks: list[str]) -> dict[str, float]:
+        """Recorded durations of the `notebooks` that have one."""
+        return {
+            notebook: entry["duration"]
+            for notebook, entry in self.entries(notebooks).items()
+        }
+
+    def store(self, notebook: str, duration: float, passed: bool) -> None:
+        self._entries[self.key(notebook)] = {"duration": duration, "passed": passed}
+        self._dirty = True
+
+    def save(self) -> None:
+        if self._dirty:
+            _save_manifest(self.path, dict(self._entries))
+            self._dirty = False
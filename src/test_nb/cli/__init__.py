@@ -1,4 +1,14 @@
+from typing import Any
+
 from .app import app
-from .commands import convert
 
 __all__ = ["app", "convert"]
+
+
+def __getattr__(name: str) -> Any:
+    # the commands are only imported when used, see `app`
+    if name == "convert":
+        from .commands import convert
+
+        return convert
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
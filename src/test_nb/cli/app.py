@@ -1,30 +1,76 @@
 """Fully lifted from https://click.palletsprojects.com/en/stable/extending-click/"""
 
+import importlib
+
 import click
 
+from typing import Any
+
 
 class AliasedGroup(click.Group):
     """
     Implements a subclass of Group that accepts a prefix for a command.
     If there was a command called push, it would accept pus as an alias (so long as it was unique):
+
+    Commands can also be registered lazily, as `name: ("module:attribute", short help)`: their module
+    is only imported once the command is looked up, and the short help is shown in the help of the group.
     """
 
+    def __init__(
+        self,
+        *args: Any,
+        lazy_commands: dict[str, tuple[str, str]] | None = None,
+        **kwargs: Any,
+    ):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        return sorted({*super().list_commands(ctx), *self.lazy_commands})
+
+    def _load_command(self, cmd_name: str) -> click.Command:
+        module_name, attribute = self.lazy_commands[cmd_name][0].split(":")
+        cmd = getattr(importlib.import_module(module_name), attribute)
+        self.add_command(cmd, cmd_name)
+        return cmd
+
     def get_command(self, ctx: click.Context, cmd_name: str) -> click.Command | None:
         rv = super().get_command(ctx, cmd_name)
 
         if rv is not None:
             return rv
 
+        if cmd_name in self.lazy_commands:
+            return self._load_command(cmd_name)
+
         matches = [x for x in self.list_commands(ctx) if x.startswith(cmd_name)]
 
         if not matches:
             return None
 
         if len(matches) == 1:
-            return click.Group.get_command(self, ctx, matches[0])
+            return self.get_command(ctx, matches[0])
 
         ctx.fail(f"Too many matches: {', '.join(sorted(matches))}")
 
+    def format_commands(
+        self, ctx: click.Context, formatter: click.HelpFormatter
+    ) -> None:
+        # same as click.Group.format_commands, without importing the lazy commands
+        limit = formatter.width - 6 - max(len(name) for name in self.list_commands(ctx))
+        rows = []
+        for name in self.list_commands(ctx):
+            cmd = self.commands.get(name)
+            if cmd is None:
+                # placeholder with the short help of the command, truncated the same way
+                cmd = click.Command(name, help=self.lazy_commands[name][1])
+            if cmd.hidden:
+                continue
+            rows.append((name, cmd.get_short_help_str(limit)))
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
     def resolve_command(
         self, ctx: click.Context, args: list[str]
     ) -> tuple[str, click.Command, list[str]]:
@@ -36,6 +82,17 @@ class AliasedGroup(click.Group):
 @click.group(
     help="Convert notebooks to python scripts and run them for testing purposes",
     cls=AliasedGroup,
+    lazy_commands={
+        "convert": ("test_nb.cli.commands:convert", "Convert notebook to python files"),
+        "test": (
+            "test_nb.cli.commands:test",
+            "Convert notebook to python files and test them end-to-end by running them",
+        ),
+        "watch": (
+            "test_nb.cli.commands:watch",
+            "Watch notebooks and run again the ones whose content changes. Scripts are kept in memory.",
+        ),
+    },
 )
 def app():
     pass
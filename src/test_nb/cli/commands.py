@@ -1,13 +1,22 @@
 import click
+import os
 import sys
 
-from .app import app
-from .options import common_options
-from test_nb.run import NotebookRunner
+from typing import TYPE_CHECKING, Iterator
+
+from .options import ShardParamType, common_options, watch_options
+from test_nb.profiler import DEFAULT_PROFILE_TOP, PROFILERS
+from test_nb.scheduling import DEFAULT_POLICY, SCHEDULING_POLICIES
+from test_nb.utils import DEFAULT_LOG_TAIL, hash_file
 from test_nb.models import RunTestArgs
 
+# the runner, reporters, cache and watchers are imported by the commands that use them,
+# so that `nb --help`, or the help of a command, starts fast
+if TYPE_CHECKING:
+    from test_nb.reporters import Reporter
+
 
-@app.command(
+@click.command(
     "convert",
     help="Convert notebook to python files",
 )
@@ -16,24 +25,36 @@ def convert(
     file: tuple[str, ...] | None = None,
     directory: str | None = None,
     recursive: bool = False,
+    include: tuple[str, ...] | None = None,
+    exclude: tuple[str, ...] | None = None,
     include_md: bool = False,
     overwrite: bool = False,
     no_errors: bool = False,
     exclude_env: bool = False,
+    cache_dir: str | None = None,
+    jobs: int | None = None,
+    profile_cells: bool = False,
+    shell_session: bool = False,
 ) -> None:
     retcode = _convert_files_and_run_if_needed(
         file=file,
         directory=directory,
         recursive=recursive,
+        include=include,
+        exclude=exclude,
         overwrite=overwrite,
         include_md=include_md,
         no_errors=no_errors,
         exclude_env=exclude_env,
+        cache_dir=cache_dir,
+        jobs=jobs,
+        profile_cells=profile_cells,
+        shell_session=shell_session,
     )
     sys.exit(retcode)
 
 
-@app.command(
+@click.command(
     "test",
     help="Convert notebook to python files and test them end-to-end by running them",
 )
@@ -53,35 +74,250 @@ def convert(
 )
 @click.option(
     "--timeout",
-    help="Timeout for notebook execution",
+    help="Timeout for notebook execution, in seconds. Notebooks exceeding it are killed with the processes they spawned, and reported as timed out.",
     type=float,
     required=False,
     default=None,
 )
+@click.option(
+    "--changed-only",
+    help="Skip notebooks whose generated script already passed with the same python executable (and lockfile, if provided).",
+    required=False,
+    default=False,
+    is_flag=True,
+)
+@click.option(
+    "--lockfile",
+    help="Lockfile (e.g. uv.lock) whose content is part of the key for cached results.",
+    required=False,
+    default=None,
+)
+@click.option(
+    "--log-dir",
+    help="Directory where the full output of each notebook is written. Defaults to a temporary directory, removed at the end of the run",
+    required=False,
+    default=None,
+)
+@click.option(
+    "--log-tail",
+    help="Kilobytes of output (from the end of the logs) kept in memory and shown in the verbose summary.",
+    type=click.IntRange(min=0),
+    required=False,
+    default=DEFAULT_LOG_TAIL // 1024,
+)
+@click.option(
+    "--fork-server",
+    help="Run notebooks as forks of a warm interpreter, started once with the `--preload` modules imported.",
+    required=False,
+    default=False,
+    is_flag=True,
+)
+@click.option(
+    "--preload",
+    help="Module to import in the fork server before running notebooks (e.g. numpy). Can be repeated.",
+    multiple=True,
+    required=False,
+    default=None,
+)
+@click.option(
+    "--in-memory",
+    help="Feed the generated scripts to the interpreter through stdin instead of writing python files next to the notebooks.",
+    required=False,
+    default=False,
+    is_flag=True,
+)
+@click.option(
+    "--slowest",
+    help="Number of slowest notebooks listed, with their CPU time and peak memory, in the summary.",
+    type=click.IntRange(min=0),
+    required=False,
+    default=5,
+)
+@click.option(
+    "--pipeline",
+    help="Start running notebooks as soon as they are converted, instead of converting all of them first.",
+    required=False,
+    default=False,
+    is_flag=True,
+)
+@click.option(
+    "--shard",
+    help="Only run shard i of n (e.g. 2/4). Shards are balanced by the durations in the timings file, when available.",
+    type=ShardParamType(),
+    required=False,
+    default=None,
+)
+@click.option(
+    "--timings-file",
+    help="JSON file where the duration and outcome of each notebook are recorded, and read to balance shards: every shard should start from the same file. Defaults to timings.json in the cache directory.",
+    required=False,
+    default=None,
+)
+@click.option(
+    "--schedule",
+    help="Order in which notebooks are started: as discovered, longest first or previously failed first, based on the timings file.",
+    type=click.Choice(list(SCHEDULING_POLICIES)),
+    required=False,
+    default=DEFAULT_POLICY,
+)
+@click.option(
+    "--fail-fast",
+    help="Do not start any other notebook after the first failure.",
+    required=False,
+    default=False,
+    is_flag=True,
+)
+@click.option(
+    "--pre-install",
+    help="Install the requirements of all the `pip install` commands in the notebooks once, before running them, and strip these commands from the scripts.",
+    required=False,
+    default=False,
+    is_flag=True,
+)
+@click.option(
+    "--wheelhouse",
+    help="Directory of wheels to install the `--pre-install` requirements from, without accessing the network.",
+    required=False,
+    default=None,
+)
+@click.option(
+    "--max-memory",
+    help="Address space limit of each notebook, and of the processes it spawns, in megabytes.",
+    type=click.IntRange(min=1),
+    required=False,
+    default=None,
+)
+@click.option(
+    "--max-cpu",
+    help="CPU time limit of each notebook, and of the processes it spawns, in seconds.",
+    type=click.IntRange(min=1),
+    required=False,
+    default=None,
+)
+@click.option(
+    "--time-budget",
+    help="Time budget of the whole suite, in seconds: notebooks still running when it runs out time out, the others are not started and reported as failed.",
+    type=click.FloatRange(min=0, min_open=True),
+    required=False,
+    default=None,
+)
+@click.option(
+    "--report-jsonl",
+    help="File where a JSON record is written for each notebook as soon as it finishes.",
+    required=False,
+    default=None,
+)
+@click.option(
+    "--junit-xml",
+    help="File where a JUnit XML report is written, with a test case for each notebook.",
+    required=False,
+    default=None,
+)
+@click.option(
+    "--profile",
+    help="Run each notebook under a profiler, saving a .pstats file next to its logs, and report the functions with the highest cumulative time over the suite. `sampling` requires pyinstrument in the environment of the notebooks, `auto` (the default when no value is given) uses it when available and cProfile otherwise.",
+    type=click.Choice(PROFILERS),
+    is_flag=False,
+    flag_value="auto",
+    required=False,
+    default=None,
+)
+@click.option(
+    "--profile-top",
+    help="Number of functions listed in the profile report.",
+    type=click.IntRange(min=1),
+    required=False,
+    default=DEFAULT_PROFILE_TOP,
+)
+@click.option(
+    "--preflight",
+    help="Compile the scripts and resolve the imports they start with, using the python executable, in one probe process, before running them: notebooks bound to fail are reported without being run.",
+    required=False,
+    default=False,
+    is_flag=True,
+)
 def test(
     file: tuple[str, ...] | None = None,
     directory: str | None = None,
     recursive: bool = False,
+    include: tuple[str, ...] | None = None,
+    exclude: tuple[str, ...] | None = None,
     include_md: bool = False,
     overwrite: bool = False,
     no_errors: bool = False,
     exclude_env: bool = False,
+    cache_dir: str | None = None,
+    jobs: int | None = None,
+    profile_cells: bool = False,
+    shell_session: bool = False,
     python_executable: str | None = None,
     verbose: bool = False,
     timeout: float | None = None,
+    changed_only: bool = False,
+    lockfile: str | None = None,
+    log_dir: str | None = None,
+    log_tail: int = DEFAULT_LOG_TAIL // 1024,
+    fork_server: bool = False,
+    preload: tuple[str, ...] | None = None,
+    in_memory: bool = False,
+    slowest: int = 5,
+    pipeline: bool = False,
+    shard: tuple[int, int] | None = None,
+    timings_file: str | None = None,
+    schedule: str = DEFAULT_POLICY,
+    fail_fast: bool = False,
+    pre_install: bool = False,
+    wheelhouse: str | None = None,
+    max_memory: int | None = None,
+    max_cpu: int | None = None,
+    time_budget: float | None = None,
+    report_jsonl: str | None = None,
+    junit_xml: str | None = None,
+    profile: str | None = None,
+    profile_top: int = DEFAULT_PROFILE_TOP,
+    preflight: bool = False,
 ) -> None:
     retcode = _convert_files_and_run_if_needed(
         file=file,
         directory=directory,
         recursive=recursive,
+        include=include,
+        exclude=exclude,
         overwrite=overwrite,
         include_md=include_md,
         no_errors=no_errors,
         exclude_env=exclude_env,
+        cache_dir=cache_dir,
+        jobs=jobs,
+        profile_cells=profile_cells,
+        shell_session=shell_session,
         run_test_args={
             "python_executable": python_executable,
             "timeout": timeout,
             "verbose": verbose,
+            "changed_only": changed_only,
+            "lockfile": lockfile,
+            "log_dir": log_dir,
+            "log_tail": log_tail * 1024,
+            "fork_server": fork_server,
+            "preload": list(preload or []),
+            "in_memory": in_memory,
+            "slowest": slowest,
+            "pipeline": pipeline,
+            "shard": shard,
+            "timings_file": timings_file,
+            "schedule": schedule,
+            "fail_fast": fail_fast,
+            "pre_install": pre_install or wheelhouse is not None,
+            "wheelhouse": wheelhouse,
+            "max_memory": max_memory << 20 if max_memory is not None else None,
+            "max_cpu": max_cpu,
+            "time_budget": time_budget,
+            "report_jsonl": report_jsonl,
+            "junit_xml": junit_xml,
+            "profile": profile,
+            "profile_top": profile_top,
+            "preflight": preflight,
         },
     )
     sys.exit(retcode)
@@ -91,15 +327,26 @@ def _convert_files_and_run_if_needed(
     file: tuple[str, ...] | None = None,
     directory: str | None = None,
     recursive: bool = False,
+    include: tuple[str, ...] | None = None,
+    exclude: tuple[str, ...] | None = None,
     include_md: bool = False,
     overwrite: bool = False,
     no_errors: bool = False,
     exclude_env: bool = False,
+    cache_dir: str | None = None,
+    jobs: int | None = None,
+    profile_cells: bool = False,
+    shell_session: bool = False,
     run_test_args: RunTestArgs | None = None,
 ) -> int:
+    from test_nb.cache import DEFAULT_CACHE_DIR, TimingsStore
+    from test_nb.reporters import JsonlReporter, JUnitXmlReporter, SummaryReporter
+    from test_nb.run import NotebookRunner
+
     files: list[str] | None = None
     if file is not None and len(file) > 0:
         files = list(file)
+    pre_install = run_test_args is not None and run_test_args.get("pre_install", False)
     try:
         runn = NotebookRunner(
             file_paths=files,
@@ -107,22 +354,229 @@ def _convert_files_and_run_if_needed(
             recursive=recursive,
             markdown_as_comment=include_md,
             exclude_env=exclude_env,
+            cache_dir=cache_dir,
+            profile_cells=profile_cells,
+            shell_session=shell_session,
+            strip_installs=pre_install,
+            include=list(include or []),
+            exclude=list(exclude or []),
         )
     except Exception as e:
         print(f"An error occurred: {e}")
         raise click.Abort()
 
+    shard = run_test_args.get("shard") if run_test_args is not None else None
+    schedule = (
+        run_test_args.get("schedule", DEFAULT_POLICY)
+        if run_test_args is not None
+        else DEFAULT_POLICY
+    )
+    timings_file = (
+        run_test_args.get("timings_file") if run_test_args is not None else None
+    )
+    if shard is not None or schedule != DEFAULT_POLICY:
+        timings = TimingsStore(cache_dir or DEFAULT_CACHE_DIR, timings_file)
+        # record the timings of this run, to plan the next ones
+        timings_file = timings.path
+        if shard is not None and not runn.shard(
+            *shard, durations=timings.durations(runn.files)
+        ):
+            print(f"Shard {shard[0]}/{shard[1]} has no notebooks to run")
+            return 0
+        runn.schedule(schedule, timings.entries(runn.files))
+
+    in_memory = run_test_args is not None and run_test_args.get("in_memory", False)
+    # requirements are only known once every notebook is converted
+    pipeline = (
+        run_test_args is not None
+        and run_test_args.get("pipeline", False)
+        and not pre_install
+    )
+    converted: Iterator[str] | None = None
     try:
-        runn.write_python_files(no_errors, overwrite)
+        if pipeline:
+            converted = runn.stream_python_files(
+                no_errors, overwrite, jobs or 1, in_memory=in_memory
+            )
+        else:
+            runn.write_python_files(
+                no_errors, overwrite, jobs or 1, in_memory=in_memory
+            )
     except Exception as e:
         return 1
 
+    if run_test_args is not None and pre_install:
+        try:
+            runn.install_requirements(
+                run_test_args["python_executable"], run_test_args.get("wheelhouse")
+            )
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            return 1
+
     if run_test_args is not None:
-        _, fail = runn.run(
-            python_executable=run_test_args["python_executable"],
-            timeout=run_test_args["timeout"],
-            verbose=run_test_args["verbose"],
-        )
+        reporters: list["Reporter"] = [
+            SummaryReporter(run_test_args["verbose"], run_test_args.get("slowest", 5))
+        ]
+        if (report_jsonl := run_test_args.get("report_jsonl")) is not None:
+            reporters.append(JsonlReporter(report_jsonl))
+        if (junit_xml := run_test_args.get("junit_xml")) is not None:
+            reporters.append(JUnitXmlReporter(junit_xml))
+        try:
+            _, fail = runn.run(
+                python_executable=run_test_args["python_executable"],
+                timeout=run_test_args["timeout"],
+                verbose=run_test_args["verbose"],
+                jobs=jobs,
+                changed_only=run_test_args.get("changed_only", False),
+                lockfile=run_test_args.get("lockfile"),
+                log_dir=run_test_args.get("log_dir"),
+                log_tail=run_test_args.get("log_tail", DEFAULT_LOG_TAIL),
+                fork_server=run_test_args.get("fork_server", False),
+                preload=run_test_args.get("preload"),
+                slowest=run_test_args.get("slowest", 5),
+                files=converted,
+                timings_file=timings_file,
+                fail_fast=run_test_args.get("fail_fast", False),
+                max_memory=run_test_args.get("max_memory"),
+                max_cpu=run_test_args.get("max_cpu"),
+                time_budget=run_test_args.get("time_budget"),
+                reporters=reporters,
+                profile=run_test_args.get("profile"),
+                profile_top=run_test_args.get("profile_top", DEFAULT_PROFILE_TOP),
+                preflight=run_test_args.get("preflight", False),
+            )
+        except Exception as e:
+            # when pipelined, conversion errors surface while running
+            if not pipeline:
+                raise
+            print(f"An error occurred: {e}")
+            return 1
         return 1 if len(fail) > 0 else 0
 
     return 0
+
+
+@click.command(
+    "watch",
+    help="Watch notebooks and run again the ones whose content changes. Scripts are kept in memory.",
+)
+@watch_options
+@click.option(
+    "--python-executable",
+    help="Path to the python executable. Defaults to executable in the current environment if not provided",
+    required=False,
+    default=None,
+)
+@click.option(
+    "--verbose",
+    help="Verbose logging for tests.",
+    required=False,
+    default=False,
+    is_flag=True,
+)
+@click.option(
+    "--timeout",
+    help="Timeout for notebook execution, in seconds. Notebooks exceeding it are killed with the processes they spawned, and reported as timed out.",
+    type=float,
+    required=False,
+    default=None,
+)
+@click.option(
+    "--debounce",
+    help="Seconds without changes to wait for before running, so that a burst of saves triggers a single run.",
+    type=click.FloatRange(min=0),
+    required=False,
+    default=0.2,
+)
+@click.option(
+    "--poll",
+    help="Poll file stats instead of using inotify.",
+    required=False,
+    default=False,
+    is_flag=True,
+)
+@click.option(
+    "--poll-interval",
+    help="Seconds between two polls.",
+    type=click.FloatRange(min=0.01),
+    required=False,
+    default=0.5,
+)
+def watch(
+    file: tuple[str, ...] | None = None,
+    directory: str | None = None,
+    recursive: bool = False,
+    include: tuple[str, ...] | None = None,
+    exclude: tuple[str, ...] | None = None,
+    include_md: bool = False,
+    no_errors: bool = False,
+    exclude_env: bool = False,
+    cache_dir: str | None = None,
+    jobs: int | None = None,
+    profile_cells: bool = False,
+    shell_session: bool = False,
+    python_executable: str | None = None,
+    verbose: bool = False,
+    timeout: float | None = None,
+    debounce: float = 0.2,
+    poll: bool = False,
+    poll_interval: float = 0.5,
+) -> None:
+    from test_nb.watch import WatchTargets, create_watcher, iter_batches
+
+    if not file and not directory:
+        print(
+            "An error occurred: at least one of --file and --directory should be provided"
+        )
+        raise click.Abort()
+    targets = WatchTargets(
+        list(file or []), directory, recursive, list(include or []), list(exclude or [])
+    )
+    watcher = create_watcher(targets, poll, poll_interval)
+    # content hash of every notebook at its last run: saves that change nothing are ignored
+    hashes: dict[str, str] = {}
+    try:
+        batches = iter_batches(watcher, debounce)
+        batch = targets.initial()[1]
+        while True:
+            changed = []
+            for notebook in sorted(batch):
+                try:
+                    digest = hash_file(notebook)
+                except OSError:
+                    hashes.pop(notebook, None)
+                    continue
+                if hashes.get(notebook) != digest:
+                    hashes[notebook] = digest
+                    changed.append(os.path.relpath(notebook))
+            if changed:
+                try:
+                    _convert_files_and_run_if_needed(
+                        file=tuple(changed),
+                        include_md=include_md,
+                        no_errors=no_errors,
+                        exclude_env=exclude_env,
+                        cache_dir=cache_dir,
+                        jobs=jobs,
+                        profile_cells=profile_cells,
+                        shell_session=shell_session,
+                        run_test_args={
+                            "python_executable": python_executable,
+                            "timeout": timeout,
+                            "verbose": verbose,
+                            "in_memory": True,
+                        },
+                    )
+                except click.Abort:
+                    # the error was already printed
+                    pass
+                except Exception as e:
+                    # keep watching: the next save may fix the notebook
+                    print(f"An error occurred: {e}")
+                print(f"\nWatching {len(hashes)} notebooks for changes...")
+            batch = next(batches)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
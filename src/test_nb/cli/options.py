@@ -1,10 +1,29 @@
 import click
-from typing import Callable, ParamSpec, TypeVar
+from typing import Any, Callable, ParamSpec, TypeVar
 
 P = ParamSpec("P")
 R = TypeVar("R")
 
 
+class ShardParamType(click.ParamType):
+    """`i/n` shard specification, with 1 <= i <= n."""
+
+    name = "i/n"
+
+    def convert(
+        self, value: Any, param: click.Parameter | None, ctx: click.Context | None
+    ) -> tuple[int, int]:
+        if isinstance(value, tuple):
+            return value
+        try:
+            index, count = (int(part) for part in str(value).split("/"))
+        except ValueError:
+            self.fail(f"{value!r} is not of the form i/n", param, ctx)
+        if count < 1 or not 1 <= index <= count:
+            self.fail(f"{value!r} should satisfy 1 <= i <= n", param, ctx)
+        return index, count
+
+
 def _file_option(f: Callable[P, R]) -> Callable[P, R]:
     return click.option(
         "--file",
@@ -34,6 +53,26 @@ def _recursive_option(f: Callable[P, R]) -> Callable[P, R]:
     )(f)
 
 
+def _include_option(f: Callable[P, R]) -> Callable[P, R]:
+    return click.option(
+        "--include",
+        help="Only convert notebooks in the directory matching this glob (e.g. 'examples/*'). Can be repeated.",
+        multiple=True,
+        required=False,
+        default=None,
+    )(f)
+
+
+def _exclude_option(f: Callable[P, R]) -> Callable[P, R]:
+    return click.option(
+        "--exclude",
+        help="Skip notebooks and directories matching this glob, in addition to the ones listed in .nbtestignore. Can be repeated.",
+        multiple=True,
+        required=False,
+        default=None,
+    )(f)
+
+
 def _include_md_option(f: Callable[P, R]) -> Callable[P, R]:
     return click.option(
         "--include-md",
@@ -74,13 +113,69 @@ def _exclude_env_option(f: Callable[P, R]) -> Callable[P, R]:
     )(f)
 
 
-def common_options(f: Callable[P, R]) -> Callable[P, R]:
+def _cache_dir_option(f: Callable[P, R]) -> Callable[P, R]:
+    return click.option(
+        "--cache-dir",
+        help="Directory for the persistent conversion cache (e.g. .test_nb_cache). Unchanged notebooks are not converted again.",
+        required=False,
+        default=None,
+    )(f)
+
+
+def _profile_cells_option(f: Callable[P, R]) -> Callable[P, R]:
+    return click.option(
+        "--profile-cells",
+        help="Instrument every cell with timing and peak-memory probes, reported in the test summary.",
+        is_flag=True,
+        required=False,
+        default=False,
+    )(f)
+
+
+def _shell_session_option(f: Callable[P, R]) -> Callable[P, R]:
+    return click.option(
+        "--shell-session",
+        help="Run the shell commands of a notebook in one persistent shell, keeping `cd` and exported variables between cells.",
+        is_flag=True,
+        required=False,
+        default=False,
+    )(f)
+
+
+def _jobs_option(f: Callable[P, R]) -> Callable[P, R]:
+    return click.option(
+        "--jobs",
+        help="Number of parallel workers. If not provided, notebooks are converted serially and run with one worker per CPU.",
+        type=click.IntRange(min=1),
+        required=False,
+        default=None,
+    )(f)
+
+
+def _notebook_options(f: Callable[P, R]) -> Callable[P, R]:
     return _file_option(
         _directory_option(
             _recursive_option(
-                _include_md_option(
-                    _no_errors_option(_exclude_env_option(_overwrite_option(f)))
+                _include_option(
+                    _exclude_option(
+                        _include_md_option(_no_errors_option(_exclude_env_option(f)))
+                    )
                 )
             )
         )
     )
+
+
+def _conversion_options(f: Callable[P, R]) -> Callable[P, R]:
+    return _cache_dir_option(
+        _jobs_option(_profile_cells_option(_shell_session_option(f)))
+    )
+
+
+def common_options(f: Callable[P, R]) -> Callable[P, R]:
+    return _notebook_options(_overwrite_option(_conversion_options(f)))
+
+
+def watch_options(f: Callable[P, R]) -> Callable[P, R]:
+    """`common_options` without --overwrite: watched notebooks are converted in memory."""
+    return _notebook_options(_conversion_options(f))
@@ -0,0 +1,203 @@
+"""
+Suite-level handling of the `pip install` commands found in notebooks: they are stripped from the
+generated scripts and their requirements are installed once, before running the notebooks.
+"""
+
+import json
+import re
+import shlex
+import shutil
+import subprocess
+
+from .models import TranslatedCell
+
+# options of `pip install` that do not change what is installed or where
+_HARMLESS_OPTIONS = {
+    "-q",
+    "-qq",
+    "-qqq",
+    "--quiet",
+    "-U",
+    "--upgrade",
+    "--no-cache-dir",
+    "--disable-pip-version-check",
+    "--no-warn-script-location",
+}
+_INSTALL_PREFIXES = (
+    ("pip", "install"),
+    ("pip3", "install"),
+    ("uv", "pip", "install"),
+)
+_PYTHON = re.compile(r"python(?:3(?:\.\d+)?)?")
+# project name at the start of a requirement specifier
+_NAME = re.compile(r"\s*([A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?)")
+# characters making the shell expand a word (variables, command substitutions)
+_EXPANSIONS = set("$`")
+# local archives, installed from the directory of the notebook
+_ARCHIVES = (".whl", ".zip", ".tar.gz", ".tgz", ".tar.bz2")
+
+# run by the target interpreter: reads requirements as JSON from stdin and prints the unsatisfied ones
+_PROBE = """
+import json
+import sys
+from importlib.metadata import version
+
+try:
+    from packaging.requirements import Requirement
+except ImportError:
+    try:
+        from pip._vendor.packaging.requirements import Requirement
+    except ImportError:
+        Requirement = None
+
+missing = []
+for spec in json.load(sys.stdin):
+    try:
+        if Requirement is None:
+            satisfied = spec.isidentifier() and bool(version(spec))
+        else:
+            requirement = Requirement(spec)
+            if requirement.marker is not None and not requirement.marker.evaluate():
+                continue
+            satisfied = requirement.url is None and requirement.specifier.contains(
+                version(requirement.name), prereleases=True
+            )
+    except Exception:
+        satisfied = False
+    if not satisfied:
+        missing.append(spec)
+print(json.dumps(missing))
+"""
+
+
+def parse_install(command: str) -> list[str] | None:
+    """
+    Requirements installed by a `pip install` (or `pip3`, `python -m pip`, `uv pip`) command,
+    or None if the command is anything else, or uses options, shell syntax (redirections,
+    pipes, command lists, expansions) or requirements (paths, URLs) that cannot be safely hoisted.
+    """
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    try:
+        args = list(lexer)
+    except ValueError:
+        return None
+    for arg in args:
+        # shell operators are split out as tokens made of punctuation characters only
+        if set(arg) <= set(lexer.punctuation_chars) or _EXPANSIONS & set(arg):
+            return None
+    if (
+        len(args) > 3
+        and _PYTHON.fullmatch(args[0])
+        and args[1:4] == ["-m", "pip", "install"]
+    ):
+        args = args[4:]
+    else:
+        for prefix in _INSTALL_PREFIXES:
+            if tuple(args[: len(prefix)]) == prefix:
+                args = args[len(prefix) :]
+                break
+        else:
+            return None
+    requirements = []
+    for arg in args:
+        if arg in _HARMLESS_OPTIONS:
+            continue
+        if arg.startswith("-") or _is_local(arg):
+            return None
+        requirements.append(arg)
+    return requirements or None
+
+
+def _is_local(requirement: str) -> bool:
+    """Whether `requirement` is a path or a URL, resolved from the working directory of the notebook."""
+    return (
+        _NAME.match(requirement) is None
+        or "/" in requirement
+        or "\\" in requirement
+        or requirement.lower().endswith(_ARCHIVES)
+    )
+
+
+def strip_installs(cells: list[TranslatedCell]) -> list[str]:
+    """Remove the install commands from the shell commands of `cells`, returning their requirements."""
+    requirements: list[str] = []
+    for cell in cells:
+        if not cell["shell"]:
+            continue
+        kept = []
+        for command in cell["shell"].split(" && "):
+            if (installed := parse_install(command.strip())) is not None:
+                requirements.extend(installed)
+            else:
+                kept.append(command)
+        cell["shell"] = " && ".join(kept) or None
+    return requirements
+
+
+def canonical_name(requirement: str) -> str:
+    """Normalized (PEP 503) name of the project of `requirement`, or the whole requirement if it has none (e.g. a path)."""
+    match = _NAME.match(requirement)
+    if match is None:
+        return requirement.strip()
+    return re.sub(r"[-_.]+", "-", match.group(1)).lower()
+
+
+def _requirement_key(requirement: str) -> tuple[str, str]:
+    """Canonical name, and the rest of the requirement ignoring case and spaces."""
+    match = _NAME.match(requirement)
+    rest = requirement[match.end() :] if match is not None else ""
+    return canonical_name(requirement), rest.replace(" ", "").lower()
+
+
+def dedup_requirements(requirements: list[str]) -> list[str]:
+    """Drop repeated requirements (same project and specifiers), keeping the first occurrence."""
+    seen: set[tuple[str, str]] = set()
+    unique = []
+    for requirement in requirements:
+        key = _requirement_key(requirement)
+        if key not in seen:
+            seen.add(key)
+            unique.append(requirement)
+    return unique
+
+
+def conflicting_requirements(requirements: list[str]) -> set[str]:
+    """
+    Canonical names of the projects required with different specifiers (or extras, markers...):
+    they cannot always be installed by a single command, e.g. `pandas==1.5` and `pandas==2.0`.
+    """
+    specifiers: dict[str, set[str]] = {}
+    for requirement in requirements:
+        name, rest = _requirement_key(requirement)
+        specifiers.setdefault(name, set()).add(rest)
+    return {name for name, found in specifiers.items() if len(found) > 1}
+
+
+def missing_requirements(requirements: list[str], python: list[str]) -> list[str]:
+    """Requirements not satisfied by the `python` environment, checked in a single probe process."""
+    if not requirements:
+        return []
+    probe = subprocess.run(
+        [*python, "-c", _PROBE],
+        input=json.dumps(requirements),
+        capture_output=True,
+        text=True,
+    )
+    if probe.returncode != 0:
+        return list(requirements)
+    return json.loads(probe.stdout)
+
+
+def install_command(
+    requirements: list[str], python: list[str], wheelhouse: str | None = None
+) -> list[str]:
+    """Command installing `requirements` into `python`, with uv when available, offline from `wheelhouse` if provided."""
+    uv = shutil.which("uv")
+    if uv is not None and len(python) == 1:
+        command = [uv, "pip", "install", "--python", python[0]]
+    else:
+        command = [*python, "-m", "pip", "install", "--disable-pip-version-check"]
+    if wheelhouse is not None:
+        command.extend(["--no-index", "--find-links", wheelhouse])
+    return [*command, *requirements]
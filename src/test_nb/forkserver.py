@@ -0,0 +1,362 @@
+"""
+Warm interpreter for running generated scripts.
+
+The server half of this module runs under the target python executable as a standalone script
+(it only depends on the standard library): it imports the preloaded modules once, then forks a
+fresh child for every script it is asked to run, so each run starts from the warm state while
+staying isolated from the others.
+Run with `--limits`, it applies resource limits to itself then execs a command (see `limits_command`).
+"""
+
+# the server half may run under older interpreters than the package supports
+from __future__ import annotations
+
+import atexit
+import importlib
+import json
+import os
+import runpy
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+
+from typing import Any, IO, Tuple
+
+try:
+    import resource
+except ImportError:
+    resource = None  # type: ignore[assignment]
+
+# user CPU seconds, system CPU seconds, peak RSS in bytes
+ResourceUsage = Tuple[float, float, int]
+
+
+def usage_from_rusage(utime: float, stime: float, maxrss: int) -> ResourceUsage:
+    # ru_maxrss is in kilobytes everywhere but on macOS
+    return utime, stime, maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def apply_limits(max_memory: int | None = None, max_cpu: int | None = None) -> None:
+    """
+    Limit the address space (in bytes) and the CPU time (in seconds) of the current process,
+    which its children inherit. Limits above the current hard limits are lowered to them.
+    """
+    if max_memory is None and max_cpu is None:
+        return
+    if resource is None:
+        raise ValueError("Resource limits are only available on POSIX platforms")
+    for limit, value, grace in (
+        (resource.RLIMIT_AS, max_memory, 0),
+        # SIGXCPU at the soft limit, SIGKILL a second later if it is ignored
+        (resource.RLIMIT_CPU, max_cpu, 1),
+    ):
+        if value is None:
+            continue
+        _, hard = resource.getrlimit(limit)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+            grace = min(grace, hard - value)
+        resource.setrlimit(limit, (value, value + grace))
+
+
+def limits_command(
+    python: list[str], args: list[str], max_memory: int | None, max_cpu: int | None
+) -> list[str]:
+    """
+    Command running `python ARGS` with its address space and CPU time limited (see `apply_limits`):
+    this module applies the limits to itself, then execs the interpreter with `ARGS`. Unlike
+    `preexec_fn`, no python code runs between fork and exec in the parent, which is not safe
+    when other threads are running.
+    """
+    limits = [
+        str(limit) if limit is not None else "-" for limit in (max_memory, max_cpu)
+    ]
+    return [*python, os.path.abspath(__file__), "--limits", *limits, *args]
+
+
+def _exec_limited(argv: list[str]) -> None:
+    """`--limits MAX_MEMORY MAX_CPU ARGS...`, with `-` for no limit."""
+    max_memory, max_cpu = (int(limit) if limit != "-" else None for limit in argv[:2])
+    apply_limits(max_memory, max_cpu)
+    os.execv(sys.executable, [sys.executable, *argv[2:]])
+
+
+def kill_group(pid: int) -> None:
+    """Kill the process group led by `pid`, i.e. a notebook and the processes it spawned."""
+    # the process itself too, in case it has not created its group yet
+    for kill in (os.killpg, os.kill):
+        try:
+            kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+class ForkServer:
+    """Client side of the fork server, safe to share between threads."""
+
+    def __init__(self, python_executable: list[str], preload: list[str] | None = None):
+        if not hasattr(os, "fork"):
+            raise ValueError(
+                "The fork server execution mode is only available on platforms supporting `os.fork`"
+            )
+        # shown when the server fails to start
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            [*python_executable, "-u", os.path.abspath(__file__), *(preload or [])],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self._stderr,
+        )
+        assert self._process.stdin is not None and self._process.stdout is not None
+        self._stdin: IO[bytes] = self._process.stdin
+        self._stdout: IO[bytes] = self._process.stdout
+        if self._stdout.readline().strip() != b"ready":
+            self._process.wait()
+            self._stderr.seek(0)
+            errors = self._stderr.read().decode("utf-8", errors="replace")
+            self._stderr.close()
+            raise RuntimeError(
+                "The fork server failed to start, check that the preloaded modules can be imported:\n"
+                + errors
+            )
+        self._lock = threading.Lock()
+        self._closed = False
+        self._next_id = 0
+        self._pending: dict[
+            int, tuple[threading.Event, list[tuple[int, ResourceUsage | None]]]
+        ] = {}
+        self._reader = threading.Thread(target=self._read_responses, daemon=True)
+        self._reader.start()
+
+    def _send(self, message: dict[str, Any]) -> None:
+        self._stdin.write(json.dumps(message).encode("utf-8") + b"\n")
+        self._stdin.flush()
+
+    def _read_responses(self) -> None:
+        for line in self._stdout:
+            response = json.loads(line)
+            with self._lock:
+                event, slot = self._pending.pop(response["id"])
+            slot.append(
+                (response["return_code"], usage_from_rusage(*response["usage"]))
+            )
+            event.set()
+        # the server exited: fail whatever is still waiting for it
+        with self._lock:
+            self._closed = True
+            for event, slot in self._pending.values():
+                slot.append((-1, None))
+                event.set()
+            self._pending.clear()
+
+    def run(
+        self,
+        script: str,
+        stdout: str,
+        stderr: str,
+        timeout: float | None = None,
+        source: str | None = None,
+        env: dict[str, str] | None = None,
+        max_memory: int | None = None,
+        max_cpu: int | None = None,
+        profile: tuple[str, str] | None = None,
+    ) -> tuple[int, ResourceUsage | None]:
+        """
+        Run `script` in a forked child, writing its output to the `stdout` and `stderr` files.
+        If `source` is provided, it is executed as the content of `script`, which does not need to exist.
+        `env` holds extra environment variables for the child, which runs in its own process group
+        limited by `max_memory` and `max_cpu` (see `apply_limits`).
+        With `profile`, a (profiler, output) pair, the script runs under `profiler.run_profiled`.
+        Returns the exit code of the child and its resource usage.
+        Raises `subprocess.TimeoutExpired` once the whole group was killed after `timeout`.
+        """
+        event, slot = threading.Event(), list[tuple[int, ResourceUsage | None]]()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The fork server is not running")
+            request_id = self._next_id
+            self._next_id += 1
+            self._pending[request_id] = (event, slot)
+            self._send(
+                {
+                    "id": request_id,
+                    "path": script,
+                    "source": source,
+                    "env": env or {},
+                    "stdout": stdout,
+                    "stderr": stderr,
+                    "limits": [max_memory, max_cpu],
+                    "profile": profile,
+                }
+            )
+        if not event.wait(timeout):
+            with self._lock:
+                if not self._closed:
+                    self._send({"kill": request_id})
+            event.wait()
+            raise subprocess.TimeoutExpired(script, timeout)  # type: ignore[arg-type]
+        return slot[0]
+
+    def close(self) -> None:
+        if self._process.poll() is None:
+            self._stdin.close()
+            self._process.wait()
+        self._stderr.close()
+
+    def __enter__(self) -> "ForkServer":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+def _exit_code(code: Any) -> int:
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _return_code(status: int) -> int:
+    # os.waitstatus_to_exitcode, which needs python 3.9
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _run_child(request: dict[str, Any]) -> None:
+    """Body of a forked child: never returns."""
+    code = 1
+    try:
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        os.setsid()
+        apply_limits(*request.get("limits", [None, None]))
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        stdout = os.open(request["stdout"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        stderr = os.open(request["stderr"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        os.dup2(devnull, 0)
+        os.dup2(stdout, 1)
+        os.dup2(stderr, 2)
+        for fd in (devnull, stdout, stderr):
+            os.close(fd)
+        os.environ.update(request.get("env", {}))
+        path = request["path"]
+        sys.argv = [path]
+        # as `python path` does (`serve` dropped the directory of this file)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+
+        def execute() -> None:
+            if request.get("source") is not None:
+                code_object = compile(request["source"], path, "exec")
+                exec(code_object, {"__name__": "__main__", "__file__": path})
+            else:
+                runpy.run_path(path, run_name="__main__")
+
+        try:
+            if request.get("profile") is not None:
+                # a sibling standalone module, this file does not run as part of the package
+                profiler = runpy.run_path(
+                    os.path.join(
+                        os.path.dirname(os.path.abspath(__file__)), "profiler.py"
+                    )
+                )
+                profiler["run_profiled"](execute, *request["profile"])
+            else:
+                execute()
+            code = 0
+        except SystemExit as e:
+            code = _exit_code(e.code)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        for thread in threading.enumerate():
+            if thread is not threading.current_thread() and not thread.daemon:
+                thread.join()
+        atexit._run_exitfuncs()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def serve(preload: list[str]) -> None:
+    # the directory of this file is not where notebooks expect to import from
+    sys.path.pop(0)
+    # on Ctrl+C, the client closes stdin and the children are killed
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for module in preload:
+        importlib.import_module(module)
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+    children: dict[int, int] = {}
+    stdin = sys.stdin.buffer.fileno()
+    buffer = b""
+    closed = False
+    print("ready", flush=True)
+    while not closed or children:
+        readable, _, _ = select.select(
+            [wakeup_r] if closed else [stdin, wakeup_r], [], []
+        )
+        if wakeup_r in readable:
+            os.read(wakeup_r, 4096)
+        if stdin in readable:
+            data = os.read(stdin, 1 << 16)
+            if not data:
+                closed = True
+                for pid in children:
+                    kill_group(pid)
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                request = json.loads(line)
+                if "kill" in request:
+                    for pid, request_id in children.items():
+                        if request_id == request["kill"]:
+                            kill_group(pid)
+                    continue
+                sys.stdout.flush()
+                pid = os.fork()
+                if pid == 0:
+                    os.close(wakeup_r)
+                    os.close(wakeup_w)
+                    _run_child(request)
+                children[pid] = request["id"]
+        while children:
+            pid, status, rusage = os.wait4(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            request_id = children.pop(pid)
+            if not closed:
+                print(
+                    json.dumps(
+                        {
+                            "id": request_id,
+                            "return_code": _return_code(status),
+                            "usage": [
+                                rusage.ru_utime,
+                                rusage.ru_stime,
+                                rusage.ru_maxrss,
+                            ],
+                        }
+                    ),
+                    flush=True,
+                )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--limits"]:
+        _exec_limited(sys.argv[2:])
+    else:
+        serve(sys.argv[1:])
@@ -15,19 +15,171 @@ class CodeCell(TypedDict):
     execution_count: int
 
 
+class NotebookCell(TypedDict):
+    cell_type: str
+    source: list[str]
+
+
+class ExecutionOptions(TypedDict):
+    python_executable: str
+    timeout: float | None
+    log_dir: str
+    # whether `log_dir` outlives the run (False for the temporary directory used by default)
+    keep_logs: bool
+    log_tail: int
+    # address space limit in bytes and CPU time limit in seconds, per notebook
+    max_memory: int | None
+    max_cpu: int | None
+    # `time.monotonic()` value at which the time budget of the suite runs out
+    deadline: float | None
+    # one of `profiler.PROFILERS`, or None not to profile
+    profile: str | None
+
+
+class NotebookExecution(TypedDict):
+    file: str
+    return_code: int
+    stdout: str
+    stderr: str
+    stdout_log: str
+    stderr_log: str
+    duration: float
+    cpu_user: float | None
+    cpu_system: float | None
+    max_rss: int | None
+    timed_out: bool
+    cells: list["CellTiming"]
+    # `.pstats` file of the run, when profiled
+    profile: str | None
+
+
 class NotebookRunFailure(TypedDict):
     file: str
     return_code: int
+    status: Literal["failed", "timeout", "preflight", "out_of_budget"]
     logs: str
+    log_file: str | None
+    duration: float
+    cpu_user: float | None
+    cpu_system: float | None
+    max_rss: int | None
 
 
 class NotebookRunSuccess(TypedDict):
     file: str
     return_code: Literal[0]
     logs: str
+    cached: bool
+    log_file: str | None
+    duration: float
+    cpu_user: float | None
+    cpu_system: float | None
+    max_rss: int | None
+
+
+class RunSummary(TypedDict):
+    # None when the logs were written to a temporary directory, removed at the end of the run
+    log_dir: str | None
+    # wall-clock duration of the run
+    duration: float
+    # whether notebooks were left out after a failure with `fail_fast`, or after the time budget ran out
+    stopped: bool
+    out_of_budget: bool
+    cell_timings: list["CellTiming"]
+    # top functions of the merged profiles (see `profiler.aggregate_profiles`), and their file
+    profile: list["FunctionProfile"]
+    profile_file: str | None
+
+
+class FunctionProfile(TypedDict):
+    # file:line(name)
+    function: str
+    cumulative: float
+    own: float
+    notebooks: int
+
+
+class ConversionCacheEntry(TypedDict):
+    key: str
+    output: str
+    mtime_ns: int
+    size: int
+    requirements: list[str]
+
 
+class TranslatedCell(TypedDict):
+    index: int
+    cell_type: Literal["code", "markdown"]
+    # shell command run before the python code of the cell
+    shell: str | None
+    code: list[str]
+    comments: list[str]
 
-class RunTestArgs(TypedDict):
+
+class ConversionOptions(TypedDict):
+    markdown_as_comment: bool
+    exclude_env: bool
+    profile_cells: bool
+    shell_session: bool
+    strip_installs: bool
+
+
+class CellTiming(TypedDict):
+    file: str
+    cell: int
+    duration: float
+    max_rss: int | None
+    rss_growth: int | None
+
+
+class ConversionResult(TypedDict):
+    file: str
+    output: str | None
+    cache_key: str | None
+    cached: bool
+    script: str | None
+    error: str | None
+    warning: str | None
+    requirements: list[str]
+
+
+class ResultCacheEntry(TypedDict):
+    file: str
+    passed: bool
+
+
+class TimingEntry(TypedDict):
+    duration: float
+    passed: bool
+
+
+class _RunTestArgsRequired(TypedDict):
     python_executable: str | None
     verbose: bool
     timeout: float | None
+
+
+class RunTestArgs(_RunTestArgsRequired, total=False):
+    changed_only: bool
+    lockfile: str | None
+    log_dir: str | None
+    log_tail: int
+    fork_server: bool
+    preload: list[str]
+    in_memory: bool
+    slowest: int
+    pipeline: bool
+    shard: tuple[int, int] | None
+    timings_file: str | None
+    schedule: str
+    fail_fast: bool
+    pre_install: bool
+    wheelhouse: str | None
+    max_memory: int | None
+    max_cpu: int | None
+    time_budget: float | None
+    report_jsonl: str | None
+    junit_xml: str | None
+    profile: str | None
+    profile_top: int
+    preflight: bool
@@ -1,52 +1,250 @@
 import re
 
-from .models import CodeCell
+from .models import CodeCell, ConversionOptions, NotebookCell, TranslatedCell
 
+_BASH_CELL_MAGIC = re.compile(r"\s*(?:%%bash|%%sh|%%script bash)")
+_ENV_ASSIGNMENT = re.compile(r"os\.environ\[['\"][^'\"]+['\"]\]\s*=")
+_DROP_ESCAPES = str.maketrans("", "", "!%")
+_ESCAPES = ("!", "%")
 
-def extract_bash(cell: CodeCell) -> str | None:
-    lines = cell["source"]
-    if (
-        lines[0].strip().startswith("%%bash")
-        or lines[0].strip().startswith("%%sh")
-        or lines[0].strip().startswith("%%script bash")
-    ):
-        sanitized_lines = []
+_SCRIPT_HEADER = "import subprocess\nimport asyncio\n"
+_SCRIPT_MAIN = "\nasync def main():\n"
+_SCRIPT_FOOTER = "\n\nasyncio.run(main())"
+
+CELL_PROFILE_ENV = "TEST_NB_CELL_PROFILE"
+
+# timing and peak-memory probes, written as JSON to the file named by CELL_PROFILE_ENV at exit
+_CELL_PROFILE_HEADER = f"""
+import atexit as _test_nb_atexit
+import json as _test_nb_json
+import os as _test_nb_os
+import sys as _test_nb_sys
+import time as _test_nb_time
+
+try:
+    import resource as _test_nb_resource
+except ImportError:
+    _test_nb_resource = None
+
+_test_nb_cells = []
+_test_nb_current = [None, 0.0, None]
+
+
+def _test_nb_max_rss():
+    if _test_nb_resource is None:
+        return None
+    rss = _test_nb_resource.getrusage(_test_nb_resource.RUSAGE_SELF).ru_maxrss
+    return rss if _test_nb_sys.platform == "darwin" else rss * 1024
+
+
+def _test_nb_probe(cell):
+    now = _test_nb_time.perf_counter()
+    index, start, start_rss = _test_nb_current
+    if index is not None:
+        rss = _test_nb_max_rss()
+        _test_nb_cells.append(
+            {{
+                "cell": index,
+                "duration": now - start,
+                "max_rss": rss,
+                "rss_growth": None if rss is None else rss - start_rss,
+            }}
+        )
+    _test_nb_current[:] = [cell, _test_nb_time.perf_counter(), _test_nb_max_rss()]
+
+
+def _test_nb_report():
+    _test_nb_probe(None)
+    path = _test_nb_os.environ.get("{CELL_PROFILE_ENV}")
+    if path:
+        with open(path, "w") as f:
+            _test_nb_json.dump(_test_nb_cells, f)
+
+
+_test_nb_atexit.register(_test_nb_report)
+"""
+
+# persistent shell used for the shell commands of the notebook with the `shell_session` option:
+# every command runs as a group in the same /bin/sh process (stdin is not shared with the script),
+# and its exit status is written to a dedicated pipe, so the output still goes straight to the logs
+_SHELL_SESSION_HEADER = """
+import atexit as _test_nb_shell_atexit
+import os as _test_nb_shell_os
+import sys as _test_nb_shell_sys
+
+
+class _TestNbShell:
+    def __init__(self):
+        self._process = None
+        self._status = None
+        self._status_fd = None
+
+    def _start(self):
+        read_fd, self._status_fd = _test_nb_shell_os.pipe()
+        self._process = subprocess.Popen(
+            ["/bin/sh"], stdin=subprocess.PIPE, pass_fds=(self._status_fd,)
+        )
+        _test_nb_shell_os.close(self._status_fd)
+        self._status = _test_nb_shell_os.fdopen(read_fd)
+
+    def run(self, command):
+        _test_nb_shell_sys.stdout.flush()
+        _test_nb_shell_sys.stderr.flush()
+        if _test_nb_shell_os.name != "posix":
+            code = subprocess.run(command, shell=True).returncode
+        else:
+            if self._process is None:
+                self._start()
+            self._process.stdin.write(
+                f"{{ {command}\\n}} < /dev/null; echo $? >&{self._status_fd}\\n".encode()
+            )
+            self._process.stdin.flush()
+            status = self._status.readline()
+            if status:
+                code = int(status)
+            else:
+                # the command exited the shell, the next one starts a new session
+                code = self._process.wait()
+                self._status.close()
+                self._process = None
+        if code != 0:
+            print(
+                f"Shell command exited with code {code}: {command}",
+                file=_test_nb_shell_sys.stderr,
+                flush=True,
+            )
+
+    def close(self):
+        if self._process is not None:
+            self._process.stdin.close()
+            self._process.wait()
+            self._status.close()
+
+
+_test_nb_shell = _TestNbShell()
+_test_nb_shell_atexit.register(_test_nb_shell.close)
+"""
+
+
+def _translate_code(
+    lines: list[str], exclude_env: bool
+) -> tuple[str | None, list[str]]:
+    """
+    Classify each line of a code cell once, returning the shell command of the cell (from a bash
+    cell magic, or from its `!` escapes and line magics) and its python lines.
+    """
+    if not lines:
+        return None, []
+    if _BASH_CELL_MAGIC.match(lines[0]):
+        commands = []
         for line in lines:
-            if (
-                sanitized_line := line.replace("%%bash", "")
+            command = (
+                line.replace("%%bash", "")
                 .replace("%%sh", "")
                 .replace("%%script bash", "")
                 .strip()
-            ):
-                sanitized_lines.append(sanitized_line)
-        return " && ".join(sanitized_lines)
-    script = ""
+            )
+            if command:
+                commands.append(command)
+        return " && ".join(commands), []
+    escapes: list[str] = []
+    code: list[str] = []
     for line in lines:
-        l = line.strip()
-        if l.startswith("!") or l.startswith("%"):
-            script += l.replace("!", "").replace("%", "").strip() + " && "
-    if script:
-        return script.strip(" && ")
-    return None
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.startswith(_ESCAPES):
+            escapes.append(stripped.translate(_DROP_ESCAPES).strip())
+        # indented escapes are kept as code too, as they always were
+        if line.startswith(_ESCAPES):
+            continue
+        if exclude_env and "environ" in line and _ENV_ASSIGNMENT.search(line):
+            continue
+        code.append(line)
+    if not escapes:
+        return None, code
+    return "".join(f"{e} && " for e in escapes).strip(" &"), code
 
 
-def extract_code(cell: CodeCell, exclude_env: bool = False) -> str | None:
-    lines = cell["source"]
-    if (
-        lines[0].strip().startswith("%%bash")
-        or lines[0].strip().startswith("%%sh")
-        or lines[0].strip().startswith("%%script bash")
-    ):
-        return None
-    code = ""
-    for line in lines:
-        if line.strip():
-            if not line.startswith("!") and not line.startswith("%"):
-                if exclude_env and re.search(
-                    r"os\.environ\[['\"][^'\"]+['\"]\]\s*=", line
-                ):
-                    continue
-                code += "\t" + line
+def translate_cells(
+    cells: list[NotebookCell],
+    markdown_as_comment: bool = False,
+    exclude_env: bool = False,
+) -> list[TranslatedCell]:
+    """Translate notebook cells into the intermediate representation used to emit scripts."""
+    translated: list[TranslatedCell] = []
+    for index, cell in enumerate(cells):
+        if cell["cell_type"] == "markdown" and markdown_as_comment:
+            translated.append(
+                {
+                    "index": index,
+                    "cell_type": "markdown",
+                    "shell": None,
+                    "code": [],
+                    "comments": [line for line in cell["source"] if line.strip()],
+                }
+            )
+        elif cell["cell_type"] == "code":
+            shell, code = _translate_code(cell["source"], exclude_env)
+            translated.append(
+                {
+                    "index": index,
+                    "cell_type": "code",
+                    "shell": shell,
+                    "code": code,
+                    "comments": [],
+                }
+            )
+    return translated
+
+
+def emit_script(
+    cells: list[TranslatedCell],
+    profile_cells: bool = False,
+    shell_session: bool = False,
+) -> str:
+    parts = [_SCRIPT_HEADER]
+    if profile_cells:
+        parts.append(_CELL_PROFILE_HEADER)
+    if shell_session:
+        parts.append(_SHELL_SESSION_HEADER)
+    parts.append(_SCRIPT_MAIN)
+    for cell in cells:
+        for comment in cell["comments"]:
+            parts.append(f"\t# {comment}\n")
+        if cell["cell_type"] != "code":
+            continue
+        if profile_cells:
+            parts.append(f"\t_test_nb_probe({cell['index']})\n")
+        if cell["shell"] and shell_session:
+            parts.append(f"\t_test_nb_shell.run({cell['shell'].strip()!r})\n")
+        elif cell["shell"]:
+            command = cell["shell"].strip().replace("'", "\\'")
+            parts.append(f"\tsubprocess.run('{command}', shell=True)\n")
+        if cell["code"]:
+            parts.append("\t")
+            parts.append("\t".join(cell["code"]))
+            parts.append("\n")
+    parts.append(_SCRIPT_FOOTER)
+    return "".join(parts)
+
+
+def build_script(cells: list[NotebookCell], options: ConversionOptions) -> str:
+    """Convert notebook cells to a python script running them in order."""
+    translated = translate_cells(
+        cells, options["markdown_as_comment"], options["exclude_env"]
+    )
+    return emit_script(translated, options["profile_cells"], options["shell_session"])
+
+
+def extract_bash(cell: CodeCell | NotebookCell) -> str | None:
+    return _translate_code(cell["source"], exclude_env=False)[0]
+
+
+def extract_code(
+    cell: CodeCell | NotebookCell, exclude_env: bool = False
+) -> str | None:
+    code = _translate_code(cell["source"], exclude_env)[1]
     if code:
-        return code
+        return "\t" + "\t".join(code)
     return None
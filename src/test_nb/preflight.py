@@ -0,0 +1,135 @@
+"""
+Static checks of the generated scripts, run before spawning an interpreter for each of them: the
+scripts are compiled, and their leading imports resolved, by a single probe process running the
+target python executable (so that syntax and modules are the ones of that interpreter).
+"""
+
+import json
+import subprocess
+
+# run by the target interpreter: reads batches of scripts as JSON lines from stdin, and answers each
+# batch with a JSON line listing the error of each script (null if it passed)
+_PROBE = r"""
+import ast
+import importlib.util
+import json
+import os
+import sys
+import traceback
+
+
+def is_probe(node):
+    # timing probes inserted before the cells by `profile_cells`
+    return (
+        isinstance(node, ast.Expr)
+        and isinstance(node.value, ast.Call)
+        and isinstance(node.value.func, ast.Name)
+        and node.value.func.id == "_test_nb_probe"
+    )
+
+
+def imports(tree):
+    # imports of the module (the header of the script), then the leading imports of the `main`
+    # coroutine running the cells: any other statement (a shell command installing packages,
+    # a change of sys.path or of the working directory...) can change what later imports resolve to
+    for node in tree.body:
+        if isinstance(node, ast.AsyncFunctionDef) and node.name == "main":
+            for statement in node.body:
+                if is_probe(statement):
+                    continue
+                if not isinstance(statement, (ast.Import, ast.ImportFrom)):
+                    return
+                yield from names(statement)
+            return
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            yield from names(node)
+
+
+def names(node):
+    if isinstance(node, ast.Import):
+        for alias in node.names:
+            yield alias.name.split(".")[0], node.lineno
+    elif node.level == 0 and node.module:
+        yield node.module.split(".")[0], node.lineno
+
+
+def check(file, source):
+    try:
+        if source is None:
+            with open(file, "rb") as f:
+                source = f.read()
+        tree = ast.parse(source, file)
+        compile(tree, file, "exec")
+    except SyntaxError as e:
+        return "".join(traceback.format_exception_only(type(e), e))
+    except (OSError, ValueError) as e:
+        return f"{type(e).__name__}: {e}\n"
+    sys.path[0] = os.path.dirname(os.path.abspath(file))
+    missing = []
+    for name, line in imports(tree):
+        try:
+            found = importlib.util.find_spec(name) is not None
+        except Exception:
+            found = True
+        if not found:
+            missing.append(f"ModuleNotFoundError: No module named {name!r} (line {line})\n")
+    return "".join(missing) or None
+
+
+for line in sys.stdin:
+    print(json.dumps([check(file, source) for file, source in json.loads(line)]), flush=True)
+"""
+
+
+class Preflight:
+    """
+    Probe process checking scripts before they are run, started with the `python` command.
+    If the probe cannot be started or dies, scripts are reported as passing: they are only
+    checked to fail early, running them will report the problem.
+    """
+
+    def __init__(self, python: list[str]):
+        try:
+            self._process: subprocess.Popen[str] | None = subprocess.Popen(
+                [*python, "-c", _PROBE],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+            )
+        except OSError:
+            self._process = None
+
+    def check(self, scripts: list[tuple[str, str | None]]) -> list[str | None]:
+        """
+        Errors of the scripts, given as (file, source) pairs (with None for scripts read from
+        their file): syntax errors, or leading imports of the cells the interpreter cannot resolve.
+        """
+        if not scripts:
+            return []
+        if self._process is not None:
+            assert self._process.stdin is not None and self._process.stdout is not None
+            try:
+                self._process.stdin.write(json.dumps(scripts) + "\n")
+                self._process.stdin.flush()
+                if line := self._process.stdout.readline():
+                    return json.loads(line)
+            except (OSError, ValueError):
+                pass
+            self.close()
+        return [None] * len(scripts)
+
+    def close(self) -> None:
+        if self._process is None:
+            return
+        try:
+            if self._process.stdin is not None:
+                self._process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self._process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+        self._process = None
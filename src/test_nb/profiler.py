@@ -0,0 +1,147 @@
+"""
+Profiling of the generated scripts.
+
+Like the fork server, the child half of this module runs under the target python executable as
+a standalone script (it only depends on the standard library, and on pyinstrument for sampling
+when it is installed there): it runs a script under the profiler and saves a `.pstats` file.
+The parent half merges the files of a suite and ranks the functions by cumulative time.
+"""
+
+# the child half may run under older interpreters than the package supports
+from __future__ import annotations
+
+import os
+import runpy
+import sys
+
+from typing import TYPE_CHECKING, Any, Callable, Container
+
+if TYPE_CHECKING:
+    from .models import FunctionProfile
+
+# sampling uses pyinstrument, auto falls back to cProfile when it is not installed
+PROFILERS = ("auto", "cprofile", "sampling")
+DEFAULT_PROFILE_TOP = 20
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+# built-in functions every script runs through: exec for the script, Context.run for asyncio tasks
+_WRAPPER_BUILTINS = {
+    "<built-in method builtins.exec>",
+    "<method 'run' of '_contextvars.Context' objects>",
+}
+
+
+def run_profiled(run: Callable[[], Any], profiler: str, output: str) -> None:
+    """Call `run` under `profiler`, saving the profile to `output` even if it raises."""
+    sampler: Any = None
+    if profiler != "cprofile":
+        try:
+            from pyinstrument import Profiler  # type: ignore
+            from pyinstrument.renderers import PstatsRenderer  # type: ignore
+        except ImportError:
+            if profiler == "sampling":
+                raise
+        else:
+            sampler = Profiler(async_mode="disabled")
+    if sampler is None:
+        import cProfile
+
+        deterministic = cProfile.Profile()
+        try:
+            deterministic.runcall(run)
+        finally:
+            deterministic.dump_stats(output)
+        return
+    sampler.start()
+    try:
+        run()
+    finally:
+        sampler.stop()
+        rendered = sampler.output(PstatsRenderer())
+        with open(output, "wb") as f:
+            f.write(rendered.encode("utf-8", errors="surrogateescape"))
+
+
+def _is_wrapper(key: tuple[str, int, str], scripts: Container[str]) -> bool:
+    """
+    Frames of the generated scripts themselves, of the code running them, and of the import
+    system (the `<module>` frames of the imported modules carry the cost of imports).
+    """
+    filename, _, name = key
+    return (
+        name in _WRAPPER_BUILTINS
+        or filename in scripts
+        or filename.startswith("<frozen importlib")
+        or os.path.dirname(os.path.abspath(filename)) == _PACKAGE_DIR
+        or os.path.basename(filename) == "runpy.py"
+        # every script runs its cells in `asyncio.run(main())`
+        or os.path.basename(os.path.dirname(filename)) == "asyncio"
+    )
+
+
+def aggregate_profiles(
+    paths: list[str],
+    scripts: Container[str] = (),
+    top: int = DEFAULT_PROFILE_TOP,
+    output: str | None = None,
+) -> list[FunctionProfile]:
+    """
+    Top `top` functions by cumulative time over the `.pstats` files at `paths` (one per notebook),
+    with the number of notebooks they appear in. Frames of the `scripts` and of their wrappers are left out.
+    If `output` is provided, the merged profile is saved there.
+    """
+    # only needed by the parent, which imports this module for its constants at startup
+    import heapq
+    import pstats
+
+    totals: dict[tuple[str, int, str], list[float]] = {}
+    merged: pstats.Stats | None = None
+    for path in paths:
+        try:
+            stats = pstats.Stats(path)
+        except (TypeError, ValueError, EOFError):
+            # empty, or truncated when the notebook was killed
+            continue
+        for key, (_, _, own, cumulative, _) in stats.stats.items():  # type: ignore[attr-defined]
+            if _is_wrapper(key, scripts):
+                continue
+            entry = totals.setdefault(key, [0.0, 0.0, 0])
+            entry[0] += cumulative
+            entry[1] += own
+            entry[2] += 1
+        if output is not None:
+            merged = stats if merged is None else merged.add(stats)
+    if merged is not None and output is not None:
+        merged.dump_stats(output)
+    return [
+        {
+            "function": pstats.func_std_string(key),  # type: ignore[attr-defined]
+            "cumulative": cumulative,
+            "own": own,
+            "notebooks": int(notebooks),
+        }
+        for key, (cumulative, own, notebooks) in heapq.nlargest(
+            top, totals.items(), key=lambda item: item[1][0]
+        )
+    ]
+
+
+def main(argv: list[str]) -> None:
+    """`profiler.py PROFILER OUTPUT SCRIPT [--stdin]`: with `--stdin`, the script is read from stdin."""
+    profiler, output, path = argv[:3]
+    source = sys.stdin.read() if argv[3:] == ["--stdin"] else None
+    sys.argv = [path]
+    sys.path[0] = os.path.dirname(os.path.abspath(path))
+
+    def execute() -> None:
+        if source is None:
+            runpy.run_path(path, run_name="__main__")
+        else:
+            code = compile(source, path, "exec")
+            exec(code, {"__name__": "__main__", "__file__": path})
+
+    run_profiled(execute, profiler, output)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
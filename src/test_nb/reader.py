@@ -0,0 +1,218 @@
+import json
+import os
+import re
+
+from typing import Any, Iterator, TextIO
+from .models import NotebookCell
+
+try:
+    import ijson  # type: ignore
+
+    _ijson: Any = ijson.get_backend("yajl2_c")
+except Exception:
+    _ijson = None
+
+_CHUNK_SIZE = 1 << 16
+# large notebooks are large because of their outputs, which the built-in scanner skips
+# much faster than ijson can tokenize them
+_FAST_BACKEND_MAX_SIZE = 4 << 20
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# run of anything but brackets and complete strings, it stops before brackets or unterminated strings
+_CONTAINER_RUN = re.compile(r'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+# content of a string up to its closing quote, or up to the end of the buffer (or a final backslash)
+_STRING_RUN = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+_SCALAR = re.compile(r"[^,\]}\s]*")
+_KEPT_CELL_KEYS = ("cell_type", "source")
+
+
+class _Scanner:
+    """
+    Minimal incremental JSON scanner: it reads the file in fixed-size chunks and can skip
+    whole values (e.g. cell outputs) without decoding or keeping them in memory.
+    """
+
+    def __init__(self, f: TextIO):
+        self._f = f
+        self._buf = ""
+        self._pos = 0
+        self._mark: int | None = None
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._f.read(_CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+            return False
+        keep = self._pos if self._mark is None else self._mark
+        self._buf = self._buf[keep:] + chunk
+        self._pos -= keep
+        if self._mark is not None:
+            self._mark = 0
+        return True
+
+    def _eof_error(self) -> ValueError:
+        return ValueError("Unexpected end of file while reading notebook")
+
+    def peek(self) -> str:
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()  # type: ignore[union-attr]
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise self._eof_error()
+
+    def expect(self, char: str) -> None:
+        if (found := self.peek()) != char:
+            raise ValueError(
+                f"Expected '{char}' while reading notebook, found '{found}'"
+            )
+        self._pos += 1
+
+    def skip_string(self) -> None:
+        self.expect('"')
+        while True:
+            self._pos = _STRING_RUN.match(self._buf, self._pos).end()  # type: ignore[union-attr]
+            if self._pos < len(self._buf) and self._buf[self._pos] == '"':
+                self._pos += 1
+                return
+            if not self._fill():
+                raise self._eof_error()
+
+    def skip_value(self) -> None:
+        char = self.peek()
+        if char == '"':
+            self.skip_string()
+        elif char in "[{":
+            depth = 0
+            while True:
+                self._pos = _CONTAINER_RUN.match(self._buf, self._pos).end()  # type: ignore[union-attr]
+                if self._pos == len(self._buf):
+                    if not self._fill():
+                        raise self._eof_error()
+                elif self._buf[self._pos] == '"':
+                    self.skip_string()
+                else:
+                    depth += 1 if self._buf[self._pos] in "[{" else -1
+                    self._pos += 1
+                    if depth == 0:
+                        return
+        else:
+            while True:
+                end = _SCALAR.match(self._buf, self._pos).end()  # type: ignore[union-attr]
+                if end < len(self._buf) or not self._fill():
+                    self._pos = end
+                    return
+
+    def read_value(self) -> Any:
+        self.peek()
+        self._mark = self._pos
+        try:
+            self.skip_value()
+            return json.loads(self._buf[self._mark : self._pos])
+        finally:
+            self._mark = None
+
+    def iter_object(self) -> Iterator[str]:
+        """Yield the keys of an object, the caller must consume each value before resuming."""
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise ValueError("Expected an object key while reading notebook")
+            key = self.read_value()
+            self.expect(":")
+            yield key
+            char = self.peek()
+            self._pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError("Expected ',' or '}' while reading notebook")
+
+    def iter_array(self) -> Iterator[None]:
+        """Yield once per array item, the caller must consume each item before resuming."""
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield None
+            char = self.peek()
+            self._pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError("Expected ',' or ']' while reading notebook")
+
+
+def _normalize_cell(cell: dict[str, Any]) -> NotebookCell:
+    source = cell.get("source", [])
+    if isinstance(source, str):
+        source = source.splitlines(keepends=True)
+    return {"cell_type": cell.get("cell_type", ""), "source": source}
+
+
+def _read_cells_python(file: str) -> list[NotebookCell] | None:
+    with open(file, "r", encoding="utf-8") as f:
+        scanner = _Scanner(f)
+        if scanner.peek() != "{":
+            return None
+        cells: list[NotebookCell] | None = None
+        for key in scanner.iter_object():
+            if key != "cells":
+                scanner.skip_value()
+                continue
+            cells = []
+            for _ in scanner.iter_array():
+                cell: dict[str, Any] = {}
+                for cell_key in scanner.iter_object():
+                    if cell_key in _KEPT_CELL_KEYS:
+                        cell[cell_key] = scanner.read_value()
+                    else:
+                        scanner.skip_value()
+                cells.append(_normalize_cell(cell))
+        return cells
+
+
+def _read_cells_ijson(file: str) -> list[NotebookCell] | None:
+    cells: list[NotebookCell] | None = None
+    cell: dict[str, Any] = {}
+    with open(file, "rb") as f:
+        for prefix, event, value in _ijson.parse(f):
+            if not prefix.startswith("cells"):
+                continue
+            if prefix == "cells":
+                if event == "start_array":
+                    cells = []
+            elif prefix == "cells.item":
+                if event == "start_map":
+                    cell = {}
+                elif event == "end_map" and cells is not None:
+                    cells.append(_normalize_cell(cell))
+            elif prefix == "cells.item.cell_type":
+                cell["cell_type"] = value
+            elif prefix == "cells.item.source":
+                if event == "start_array":
+                    cell["source"] = []
+                elif event == "string":
+                    cell["source"] = value
+            elif prefix == "cells.item.source.item":
+                cell["source"].append(value)
+    return cells
+
+
+def read_cells(file: str, fast: bool = True) -> list[NotebookCell] | None:
+    """
+    Read the `cell_type` and `source` of every cell in a notebook, streaming through the file
+    and skipping outputs, attachments and metadata without materializing them.
+    Uses the `ijson` C backend when it is installed, `fast` is True and the notebook is small
+    enough for tokenizing speed to matter more than skipping outputs.
+    Returns None if the notebook has no `cells` array.
+    """
+    if fast and _ijson is not None and os.path.getsize(file) <= _FAST_BACKEND_MAX_SIZE:
+        return _read_cells_ijson(file)
+    return _read_cells_python(file)
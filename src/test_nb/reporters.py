@@ -0,0 +1,308 @@
+"""
+Reporters receive the result of each notebook as soon as it finishes, then a summary of the run.
+They only keep what their final output needs, so that their memory does not grow with the suite.
+"""
+
+import heapq
+import itertools
+import json
+import re
+import time
+
+from typing import IO, Protocol
+from xml.sax.saxutils import escape, quoteattr
+
+from termcolor import cprint
+from .models import NotebookRunFailure, NotebookRunSuccess, RunSummary
+
+NotebookResult = NotebookRunSuccess | NotebookRunFailure
+
+# characters that are not allowed in XML 1.0 documents
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+# room for the counts of the suite, written once the run is over
+_JUNIT_HEADER_WIDTH = 256
+# largest counts and duration (in seconds) the header is sized for
+_JUNIT_MAX_COUNT = 10**9 - 1
+_JUNIT_MAX_DURATION = 10.0**9
+_FAILURE_LABELS = {
+    "timeout": "TIMED OUT",
+    "preflight": "FAILED PRE-FLIGHT",
+    "out_of_budget": "NOT RUN",
+}
+_FAILURE_NOTES = {
+    "timeout": " (timed out)",
+    "preflight": " (pre-flight)",
+    "out_of_budget": " (not run, out of time budget)",
+}
+
+
+class Reporter(Protocol):
+    def report(self, result: NotebookResult, notebook: str) -> None:
+        """Called once per notebook, with the notebook the result's script was generated from."""
+        ...
+
+    def summarize(self, summary: RunSummary) -> None:
+        """Called once every notebook was reported, unless the run failed."""
+        ...
+
+    def close(self) -> None:
+        """Called at the end of the run, whether it failed or not."""
+        ...
+
+
+def result_status(result: NotebookResult) -> str:
+    """
+    One of passed, cached, failed, timeout, preflight (rejected by the pre-flight checks)
+    or out_of_budget (not started before the time budget of the suite ran out).
+    """
+    if result["return_code"] == 0:
+        return "cached" if result.get("cached") else "passed"
+    return result.get("status", "failed")  # type: ignore[return-value]
+
+
+def _format_usage(result: NotebookResult) -> str:
+    if result["cpu_user"] is None or result["cpu_system"] is None:
+        cpu = "cpu n/a"
+    else:
+        cpu = f"cpu {result['cpu_user']:.2f}s user / {result['cpu_system']:.2f}s sys"
+    if result["max_rss"] is None:
+        return f"{cpu}, peak RSS n/a"
+    return f"{cpu}, peak RSS {result['max_rss'] / (1 << 20):.1f} MiB"
+
+
+class SummaryReporter:
+    """The human-readable report: a colored line per notebook, and the test summary."""
+
+    def __init__(self, verbose: bool = False, slowest: int = 5):
+        self.verbose = verbose
+        self.slowest = slowest
+        self._passed = 0
+        self._cached = 0
+        self._failures: list[NotebookRunFailure] = []
+        # min-heap of the `slowest` longest executions, the counter breaks ties
+        self._longest: list[tuple[float, int, NotebookResult]] = []
+        self._counter = itertools.count()
+
+    def report(self, result: NotebookResult, notebook: str) -> None:
+        status = result_status(result)
+        file = result["file"]
+        if status == "cached":
+            self._passed += 1
+            self._cached += 1
+            cprint(f"{file} CACHED", color="cyan", attrs=["bold"])
+            return
+        if status == "passed":
+            self._passed += 1
+            cprint(
+                f"{file} PASSED ({result['duration']:.2f}s)",
+                color="green",
+                attrs=["bold"],
+            )
+        else:
+            self._failures.append(result)  # type: ignore[arg-type]
+            cprint(
+                f"{file} {_FAILURE_LABELS.get(status, 'FAILED')} ({result['duration']:.2f}s)",
+                color="red",
+                attrs=["bold"],
+            )
+        # notebooks rejected by the pre-flight checks or out of time budget did not run
+        if self.slowest > 0 and status not in ("preflight", "out_of_budget"):
+            entry = (result["duration"], next(self._counter), result)
+            if len(self._longest) < self.slowest:
+                heapq.heappush(self._longest, entry)
+            else:
+                heapq.heappushpop(self._longest, entry)
+
+    def summarize(self, summary: RunSummary) -> None:
+        print()
+        print()
+        print("=========== TEST SUMMARY =============")
+        print()
+        cprint(
+            f"{self._passed} tests were successfull"
+            + (f" ({self._cached} cached)" if self._cached else ""),
+            color="green",
+            attrs=["bold"],
+        )
+        timeouts = sum(1 for f in self._failures if f["status"] == "timeout")
+        cprint(
+            f"{len(self._failures)} tests failed"
+            + (f" ({timeouts} timed out)" if timeouts else "")
+            + "\n",
+            color="red",
+            attrs=["bold"],
+        )
+        if summary["stopped"]:
+            cprint(
+                "Stopped at the first failure, the remaining notebooks were not run\n",
+                color="yellow",
+                attrs=["bold"],
+            )
+        if summary["out_of_budget"]:
+            cprint(
+                "The time budget of the suite ran out, the remaining notebooks were not run\n",
+                color="yellow",
+                attrs=["bold"],
+            )
+        if len(self._failures) > 0:
+            for f in self._failures:
+                print(f"\t- {f['file']}{_FAILURE_NOTES.get(f['status'], '')}\n")
+                if self.verbose:
+                    print(f"\t\tReturn Code: {f['return_code']}\n")
+                    print(f"\t\tCaptured Logs: {f['logs']}\n\n")
+                    if f["log_file"] is not None:
+                        print(f"\t\tFull Logs: {f['log_file']}\n\n")
+            if not self.verbose:
+                cprint(
+                    f"\t\t(enable the `--verbose` option to see details)",
+                    color="yellow",
+                    attrs=["bold"],
+                )
+        if self._longest:
+            print("\nSlowest notebooks:\n")
+            for _, _, r in sorted(self._longest, key=lambda e: (-e[0], e[1])):
+                print(f"\t{r['duration']:8.2f}s  {_format_usage(r)}  {r['file']}")
+        if self.slowest > 0 and summary["cell_timings"]:
+            print("\nHottest cells:\n")
+            for c in heapq.nlargest(
+                self.slowest, summary["cell_timings"], key=lambda c: c["duration"]
+            ):
+                growth = (
+                    f"peak RSS +{c['rss_growth'] / (1 << 20):.1f} MiB"
+                    if c["rss_growth"] is not None
+                    else "peak RSS n/a"
+                )
+                print(
+                    f"\t{c['duration']:8.2f}s  cell {c['cell']:<4} {growth}  {c['file']}"
+                )
+        if summary["profile"]:
+            print("\nTop functions by cumulative time:\n")
+            for function in summary["profile"]:
+                print(
+                    f"\t{function['cumulative']:8.2f}s  own {function['own']:8.2f}s  "
+                    f"in {function['notebooks']:>4} notebooks  {function['function']}"
+                )
+            if summary["profile_file"] is not None:
+                print(f"\nMerged profile written to {summary['profile_file']}")
+        if summary["log_dir"] is not None:
+            print(f"\nLogs were written to {summary['log_dir']}")
+
+    def close(self) -> None:
+        pass
+
+
+class JsonlReporter:
+    """One JSON record per notebook, written and flushed as soon as it finishes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file: IO[str] = open(path, "w", encoding="utf-8", buffering=1)
+
+    def report(self, result: NotebookResult, notebook: str) -> None:
+        record = {"notebook": notebook, "status": result_status(result), **result}
+        self._file.write(json.dumps(record) + "\n")
+
+    def summarize(self, summary: RunSummary) -> None:
+        pass
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class JUnitXmlReporter:
+    """
+    JUnit XML report with a test case per notebook. Test cases are written as notebooks finish,
+    the counts of the suite are filled in the space reserved for them in the header at the end.
+    """
+
+    def __init__(self, path: str, suite_name: str = "test-nb"):
+        self.path = path
+        self.suite_name = suite_name
+        self._tests = 0
+        self._failures = 0
+        self._skipped = 0
+        self._timestamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._start = time.perf_counter()
+        self._finished = False
+        largest = self._header(
+            _JUNIT_MAX_COUNT, _JUNIT_MAX_COUNT, _JUNIT_MAX_COUNT, _JUNIT_MAX_DURATION
+        )
+        if len(largest) > _JUNIT_HEADER_WIDTH:
+            raise ValueError(
+                f"The suite name {suite_name!r} is too long for the JUnit XML report"
+            )
+        self._file: IO[bytes] = open(path, "wb")
+        self._file.write(b'<?xml version="1.0" encoding="utf-8"?>\n<testsuites>\n')
+        self._header_offset = self._file.tell()
+        self._write_header(0.0)
+        self._file.flush()
+
+    def _header(
+        self, tests: int, failures: int, skipped: int, duration: float
+    ) -> bytes:
+        return (
+            f'<testsuite name={quoteattr(self.suite_name)} tests="{tests}" '
+            f'failures="{failures}" errors="0" skipped="{skipped}" '
+            f'time="{duration:.3f}" timestamp="{self._timestamp}"'
+        ).encode("utf-8")
+
+    def _write_header(self, duration: float) -> None:
+        tag = self._header(self._tests, self._failures, self._skipped, duration)
+        if len(tag) > _JUNIT_HEADER_WIDTH:
+            # would overwrite the first test cases
+            raise ValueError(
+                "The counts of the suite do not fit in the JUnit XML header"
+            )
+        self._file.write(tag.ljust(_JUNIT_HEADER_WIDTH) + b">\n")
+
+    def report(self, result: NotebookResult, notebook: str) -> None:
+        status = result_status(result)
+        self._tests += 1
+        case = (
+            f"  <testcase classname={quoteattr(self.suite_name)} name={quoteattr(notebook)} "
+            f'file={quoteattr(notebook)} time="{result["duration"]:.3f}"'
+        )
+        if status == "passed":
+            case += " />\n"
+        elif status == "cached":
+            self._skipped += 1
+            case += (
+                '>\n    <skipped message="passed in a previous run" />\n  </testcase>\n'
+            )
+        else:
+            self._failures += 1
+            if status == "timeout":
+                message = "Timed out"
+            elif status == "preflight":
+                message = "Failed the pre-flight checks"
+            elif status == "out_of_budget":
+                message = "Not run, the time budget of the suite ran out"
+            else:
+                message = f"Exited with code {result['return_code']}"
+            logs = _INVALID_XML.sub("", result["logs"])
+            case += (
+                f">\n    <failure message={quoteattr(message)} type={quoteattr(status)}>"
+                f"{escape(logs)}</failure>\n  </testcase>\n"
+            )
+        self._file.write(case.encode("utf-8"))
+        self._file.flush()
+
+    def _finish(self, duration: float) -> None:
+        self._finished = True
+        self._file.write(b"</testsuite>\n</testsuites>\n")
+        end = self._file.tell()
+        self._file.seek(self._header_offset)
+        self._write_header(duration)
+        self._file.seek(end)
+        self._file.flush()
+
+    def summarize(self, summary: RunSummary) -> None:
+        self._finish(summary["duration"])
+
+    def close(self) -> None:
+        try:
+            if not self._finished:
+                # the run failed: the report holds the notebooks reported so far
+                self._finish(time.perf_counter() - self._start)
+        finally:
+            self._file.close()
@@ -1,11 +1,73 @@
+import asyncio
+import collections
+import inspect
+import itertools
 import json
+import os
+import queue
+import shlex
+import shutil
+import signal
 import sys
 import subprocess
+import tempfile
+import threading
+import time
 
-from termcolor import cprint
-from .models import CodeCell, MarkdownCell, NotebookRunFailure, NotebookRunSuccess
-from .utils import find_notebooks_in_dir, file_exists, dir_exists
-from .parse import extract_bash, extract_code
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Generator, Iterable, Iterator, Literal
+
+from .models import (
+    CellTiming,
+    ConversionCacheEntry,
+    ConversionOptions,
+    ConversionResult,
+    ExecutionOptions,
+    NotebookExecution,
+    NotebookRunFailure,
+    NotebookRunSuccess,
+    TimingEntry,
+)
+from .cache import (
+    DEFAULT_CACHE_DIR,
+    ConversionCache,
+    ResultCache,
+    TimingsStore,
+)
+from .utils import (
+    DEFAULT_LOG_TAIL,
+    iter_notebooks,
+    file_exists,
+    dir_exists,
+    hash_file,
+    hash_text,
+    read_tail,
+)
+from .parse import CELL_PROFILE_ENV, emit_script, translate_cells
+from .deps import (
+    canonical_name,
+    conflicting_requirements,
+    dedup_requirements,
+    install_command,
+    missing_requirements,
+    strip_installs,
+)
+from .reader import read_cells
+from .reporters import Reporter, SummaryReporter
+from .profiler import PROFILERS, DEFAULT_PROFILE_TOP, aggregate_profiles
+from .preflight import Preflight
+from .scheduling import SchedulingPolicy, get_policy, shard_files
+from .forkserver import (
+    ForkServer,
+    ResourceUsage,
+    limits_command,
+    kill_group,
+    usage_from_rusage,
+)
+
+
+DEFAULT_PIPELINE_QUEUE = 8
 
 
 class NotebookRunner:
@@ -16,31 +78,44 @@ class NotebookRunner:
         recursive: bool = False,
         markdown_as_comment: bool = False,
         exclude_env: bool = False,
+        cache_dir: str | None = None,
+        profile_cells: bool = False,
+        shell_session: bool = False,
+        strip_installs: bool = False,
+        include: list[str] | None = None,
+        exclude: list[str] | None = None,
     ):
         if not file_paths and not directory:
             raise ValueError(
                 "At least one of `file_paths` and `directoray` should be provided"
             )
         self._files_to_exec: list[str] = []
-        self.files: list[str] = []
+        self._scripts: dict[str, str] = {}
+        # notebook each generated script comes from
+        self._notebooks: dict[str, str] = {}
+        self._files: list[str] = []
+        self._pending_files: Iterator[str] | None = None
         if file_paths is not None:
             if len(file_paths) == 0:
                 raise ValueError("Cannot pass an empty list as `file_paths` parameter")
             for file in file_paths:
                 if file_exists(file):
-                    self.files.append(file)
+                    self._files.append(file)
                 else:
                     print(
                         f"File {file} does not exist or it is not a file, skipping...",
                         file=sys.stderr,
                     )
-            if len(self.files) == 0:
+            if len(self._files) == 0:
                 raise ValueError("None of the provided files exists")
         if directory is not None:
             if dir_exists(directory):
-                _snapshot_len = len(self.files)
-                self.files.extend(find_notebooks_in_dir(directory, recursive))
-                if _snapshot_len == len(self.files) and len(self.files):
+                # only look for the first notebook here, the rest of the walk happens while converting
+                notebooks = iter_notebooks(directory, recursive, include, exclude)
+                first = next(notebooks, None)
+                if first is not None:
+                    self._pending_files = itertools.chain([first], notebooks)
+                elif len(self._files):
                     raise ValueError(
                         f"Directory {directory} did not contain any .ipynb file"
                         + " even if `recursive` is set to True"
@@ -53,102 +128,1100 @@ class NotebookRunner:
                 )
         self.markdown_as_comment = markdown_as_comment
         self.exclude_env = exclude_env
+        self.cache_dir = cache_dir
+        self.profile_cells = profile_cells
+        self.shell_session = shell_session
+        self.strip_installs = strip_installs
+        # requirements of the `pip install` commands stripped from the scripts
+        self.requirements: list[str] = []
+        # script -> requirements stripped from it
+        self._script_requirements: dict[str, list[str]] = {}
+        self.cell_timings: list[CellTiming] = []
+        # leaders of the process groups of the running notebooks
+        self._running: set[int] = set()
+        self._running_lock = threading.Lock()
 
-    def write_python_files(self, raise_on_error: bool = True, overwrite: bool = False):
-        for file in self.files:
-            with open(file, "r") as f:
-                data = json.load(f)
-            if "cells" not in data:
-                msg = f"File {file} does not have any cells, please exclude it from the files to process and re-try"
-                if raise_on_error:
-                    raise ValueError(msg)
-                else:
-                    print(msg.split(",")[0], file=sys.stderr)
-                    continue
-            cells: list[MarkdownCell | CodeCell] = data["cells"]
-            script = "import subprocess\nimport asyncio\n\nasync def main():\n"
-            for cell in cells:
-                if cell["cell_type"] == "markdown" and self.markdown_as_comment:
-                    for line in cell["source"]:
-                        if line.strip():
-                            script += "\t# " + line + "\n"
-                elif cell["cell_type"] == "code":
-                    bash = extract_bash(cell)
-                    if bash:
-                        sanitized_bash = bash.strip().replace("'", "\\'")
-                        script += f"\tsubprocess.run('{sanitized_bash}', shell=True)\n"
-                    code = extract_code(cell, self.exclude_env)
-                    if code:
-                        script += f"{code}\n"
-            script += "\n\nasyncio.run(main())"
-            py_file_name = file.replace(".ipynb", ".py")
-            if file_exists(py_file_name) and not overwrite:
-                msg = f"Python file {py_file_name} already exist and permission to overwrite has not been granted"
-                if raise_on_error:
-                    raise ValueError(msg)
-                else:
-                    print(msg + ". Skipping...", file=sys.stderr)
+    @property
+    def files(self) -> list[str]:
+        """The notebooks to convert, finishing the directory walk if it is still pending."""
+        for _ in self.iter_files():
+            pass
+        return self._files
+
+    @files.setter
+    def files(self, files: list[str]) -> None:
+        """Replace the notebooks to convert, dropping the pending directory walk."""
+        self._files = files
+        self._pending_files = None
+
+    def iter_files(self) -> Iterator[str]:
+        """Yield the notebooks to convert, discovering the ones in `directory` as they are consumed."""
+        i = 0
+        while True:
+            if i < len(self._files):
+                yield self._files[i]
+                i += 1
+            elif self._pending_files is None:
+                return
+            elif (file := next(self._pending_files, None)) is not None:
+                self._files.append(file)
+            else:
+                self._pending_files = None
+
+    def install_requirements(
+        self, python_executable: str | None = None, wheelhouse: str | None = None
+    ) -> list[str]:
+        """
+        Install the requirements of the `pip install` commands stripped from the scripts (with
+        `strip_installs`) once for the whole suite, skipping the ones `python_executable` already
+        satisfies. With `wheelhouse`, packages are installed offline from that directory.
+        Projects required with different specifiers by different notebooks are not hoisted: these
+        notebooks are converted again with their install commands.
+        Returns the requirements that were installed.
+        """
+        if conflicts := conflicting_requirements(self.requirements):
+            print(
+                f"Leaving the installs of {', '.join(sorted(conflicts))} in their notebooks:"
+                + " they require different versions"
+            )
+            self._restore_installs(conflicts)
+        python = python_command(python_executable or sys.executable)
+        missing = missing_requirements(self.requirements, python)
+        if missing:
+            print(
+                f"Installing {len(missing)} requirements"
+                + f" ({len(self.requirements) - len(missing)} already satisfied): "
+                + " ".join(missing)
+            )
+            process = subprocess.run(
+                install_command(missing, python, wheelhouse),
+                capture_output=True,
+                text=True,
+            )
+            if process.returncode != 0:
+                raise ValueError(
+                    f"Failed to install the notebook requirements:\n{process.stderr}"
+                )
+        return missing
+
+    def _restore_installs(self, names: set[str]) -> None:
+        """Convert again, keeping their install commands, the scripts requiring one of the projects `names`."""
+        options = self.conversion_options
+        options["strip_installs"] = False
+        for output, requirements in list(self._script_requirements.items()):
+            if not any(canonical_name(r) in names for r in requirements):
+                continue
+            result = _convert_notebook(
+                self._notebooks[output],
+                None,
+                options,
+                overwrite=True,
+                use_cache=False,
+                in_memory=output in self._scripts,
+            )
+            if result["error"] is not None:
+                raise ValueError(result["error"])
+            if result["script"] is not None:
+                self._scripts[output] = result["script"]
+            del self._script_requirements[output]
+        self.requirements = dedup_requirements(
+            [
+                r
+                for requirements in self._script_requirements.values()
+                for r in requirements
+            ]
+        )
+
+    def shard(
+        self, index: int, count: int, durations: dict[str, float] | None = None
+    ) -> list[str]:
+        """
+        Only keep the notebooks of shard `index` (1-based) out of `count`, balanced by the
+        recorded `durations` when available (see `shard_files`). Returns the kept notebooks.
+        """
+        self._files = shard_files(self.files, index, count, durations)
+        return self._files
+
+    def schedule(
+        self,
+        policy: str | SchedulingPolicy,
+        timings: dict[str, TimingEntry] | None = None,
+    ) -> list[str]:
+        """
+        Reorder the notebooks with a scheduling policy (or the name of a registered one), given
+        the recorded `timings` of the notebooks. Scripts are converted and started in this order.
+        """
+        if isinstance(policy, str):
+            policy = get_policy(policy)
+        self._files = policy(self.files, timings or {})
+        return self._files
+
+    @property
+    def conversion_options(self) -> ConversionOptions:
+        return {
+            "markdown_as_comment": self.markdown_as_comment,
+            "exclude_env": self.exclude_env,
+            "profile_cells": self.profile_cells,
+            "shell_session": self.shell_session,
+            "strip_installs": self.strip_installs,
+        }
+
+    def write_python_files(
+        self,
+        raise_on_error: bool = True,
+        overwrite: bool = False,
+        jobs: int = 1,
+        in_memory: bool = False,
+    ):
+        """
+        Convert the notebooks to python scripts. With `in_memory`, scripts are kept in memory
+        (and later fed to the interpreter through stdin) instead of being written next to the notebooks.
+        """
+        if jobs < 1:
+            raise ValueError("`jobs` should be a positive integer")
+        for _ in self._iter_conversions(
+            raise_on_error, overwrite, jobs, in_memory, window=4 * jobs
+        ):
+            pass
+
+    def stream_python_files(
+        self,
+        raise_on_error: bool = True,
+        overwrite: bool = False,
+        jobs: int = 1,
+        in_memory: bool = False,
+        queue_size: int = DEFAULT_PIPELINE_QUEUE,
+    ) -> Iterator[str]:
+        """
+        Like `write_python_files`, but the notebooks are converted in a background thread and each
+        script is yielded as soon as it exists, so that it can be passed to `run` while the others
+        are still being converted. At most `queue_size` converted scripts wait to be consumed.
+        """
+        if jobs < 1:
+            raise ValueError("`jobs` should be a positive integer")
+        if queue_size < 1:
+            raise ValueError("`queue_size` should be a positive integer")
+        # the queue holds what was converted ahead, the workers only what they are converting
+        conversions = self._iter_conversions(
+            raise_on_error, overwrite, jobs, in_memory, window=jobs
+        )
+        pending: queue.Queue[str | BaseException | None] = queue.Queue(queue_size)
+        stop = threading.Event()
+
+        def put(item: str | BaseException | None) -> bool:
+            while not stop.is_set():
+                try:
+                    pending.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
                     continue
+            return False
+
+        def produce() -> None:
+            item: BaseException | None = None
+            try:
+                for output in conversions:
+                    if not put(output):
+                        return
+            except BaseException as e:
+                item = e
+            finally:
+                conversions.close()
+            put(item)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while (item := pending.get()) is not None:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            producer.join()
+
+    def _iter_conversions(
+        self,
+        raise_on_error: bool,
+        overwrite: bool,
+        jobs: int,
+        in_memory: bool,
+        window: int,
+    ) -> Generator[str, None, None]:
+        """
+        Convert the notebooks as they are discovered. With `jobs` > 1, at most `window` conversions
+        are submitted to the workers ahead of the one consumed, so that a slow consumer holds
+        back discovery and conversion.
+        """
+        cache = (
+            ConversionCache(self.cache_dir)
+            if self.cache_dir is not None and not in_memory
+            else None
+        )
+        convert = partial(
+            _convert_notebook,
+            options=self.conversion_options,
+            overwrite=overwrite,
+            use_cache=cache is not None,
+            in_memory=in_memory,
+        )
+        files, cache_lookups = itertools.tee(self.iter_files())
+        cache_entries = (
+            cache.get(file) if cache is not None else None for file in cache_lookups
+        )
+        try:
+            if jobs == 1:
+                yield from self._collect_conversions(
+                    map(convert, files, cache_entries), cache, raise_on_error
+                )
             else:
-                with open(py_file_name, "w") as f:
-                    f.write(script)
-                self._files_to_exec.append(py_file_name)
+                with ProcessPoolExecutor(max_workers=jobs) as pool:
+                    yield from self._collect_conversions(
+                        _bounded_map(
+                            pool, convert, files, cache_entries, window=window
+                        ),
+                        cache,
+                        raise_on_error,
+                    )
+        finally:
+            if cache is not None:
+                cache.save()
+
+    def _collect_conversions(
+        self,
+        results: Iterable[ConversionResult],
+        cache: ConversionCache | None,
+        raise_on_error: bool,
+    ) -> Iterator[str]:
+        for result in results:
+            if result["error"] is not None:
+                if raise_on_error:
+                    raise ValueError(result["error"])
+                print(result["warning"], file=sys.stderr)
+                continue
+            if result["output"] is None:
+                continue
+            if result["script"] is not None:
+                self._scripts[result["output"]] = result["script"]
+            if (
+                cache is not None
+                and not result["cached"]
+                and result["cache_key"] is not None
+            ):
+                cache.store(
+                    result["file"],
+                    result["cache_key"],
+                    result["output"],
+                    result["requirements"],
+                )
+            self.requirements = dedup_requirements(
+                [*self.requirements, *result["requirements"]]
+            )
+            self._script_requirements[result["output"]] = result["requirements"]
+            self._notebooks[result["output"]] = result["file"]
+            self._files_to_exec.append(result["output"])
+            yield result["output"]
 
     def run(
         self,
         python_executable: str | None = None,
         timeout: float | None = None,
         verbose: bool = False,
+        jobs: int | None = None,
+        changed_only: bool = False,
+        lockfile: str | None = None,
+        log_dir: str | None = None,
+        log_tail: int = DEFAULT_LOG_TAIL,
+        fork_server: bool = False,
+        preload: list[str] | None = None,
+        slowest: int = 5,
+        files: Iterable[str] | None = None,
+        timings_file: str | None = None,
+        fail_fast: bool = False,
+        max_memory: int | None = None,
+        max_cpu: int | None = None,
+        time_budget: float | None = None,
+        reporters: list[Reporter] | None = None,
+        profile: str | None = None,
+        profile_top: int = DEFAULT_PROFILE_TOP,
+        preflight: bool = False,
     ) -> tuple[list[NotebookRunSuccess], list[NotebookRunFailure]]:
-        succ: list[NotebookRunSuccess] = []
-        fail: list[NotebookRunFailure] = []
-        if len(self._files_to_exec) == 0:
+        """
+        Run the converted scripts, or the ones yielded by `files` (e.g. `stream_python_files`),
+        starting each of them as soon as it is available and a worker is free.
+        With `fail_fast`, no other notebook is started after the first failure.
+        Each notebook runs in its own process group, killed as a whole when it times out,
+        with its address space limited to `max_memory` bytes and its CPU time to `max_cpu` seconds.
+        Notebooks still running when the `time_budget` (in seconds) of the suite runs out are
+        killed, the others are not started and reported as failed (with status out_of_budget).
+        Results are passed to the `reporters` as soon as notebooks finish, they default to the
+        human-readable summary (see `SummaryReporter`), which uses `verbose` and `slowest`.
+        With `profile` (one of `PROFILERS`), each notebook runs under a profiler and its `.pstats`
+        file is saved next to its logs. The profiles are merged into `suite.pstats`, and their
+        `profile_top` functions by cumulative time are passed to the reporters.
+        With `preflight`, scripts are compiled and their leading imports resolved by a single
+        probe process of `python_executable` (see `Preflight`), all at once when `files` is a list:
+        the notebooks bound to fail are reported right away, without being run.
+        """
+        if profile is not None and profile not in PROFILERS:
+            raise ValueError(
+                f"Unknown profiler {profile!r}, available profilers: {', '.join(PROFILERS)}"
+            )
+        if reporters is None:
+            reporters = [SummaryReporter(verbose, slowest)]
+        if files is None:
+            files = self._converted_files()
+        if not python_executable:
+            python_executable = sys.executable
+        jobs = _check_jobs(jobs)
+        options = _execution_options(
+            python_executable,
+            timeout,
+            log_dir,
+            log_tail,
+            max_memory,
+            max_cpu,
+            time_budget,
+            profile,
+        )
+        log_dir = options["log_dir"]
+        self.cell_timings = []
+        result_cache = (
+            ResultCache(self.cache_dir or DEFAULT_CACHE_DIR)
+            if changed_only or self.cache_dir is not None
+            else None
+        )
+        lockfile_hash = hash_file(lockfile) if lockfile is not None else None
+        timings = (
+            TimingsStore(self.cache_dir or DEFAULT_CACHE_DIR, timings_file)
+            if timings_file is not None or self.cache_dir is not None
+            else None
+        )
+        passed: dict[int, NotebookRunSuccess] = {}
+        failed: dict[int, NotebookRunFailure] = {}
+        # script -> its .pstats file
+        profiles: dict[str, str] = {}
+        lock = threading.Lock()
+        # a notebook is only taken from `files` once a worker is free to run it
+        free_workers = threading.Semaphore(jobs)
+        server: ForkServer | None = None
+        stop = threading.Event()
+        checker = Preflight(python_command(python_executable)) if preflight else None
+        # indices of the notebooks that failed the pre-flight checks
+        rejected: set[int] = set()
+
+        def reject(i: int, file: str, error: str) -> None:
+            rejected.add(i)
+            with lock:
+                if fail_fast:
+                    stop.set()
+                failed[i] = _not_run_failure(file, "preflight", error, options)
+                for reporter in reporters:
+                    reporter.report(failed[i], self._notebooks.get(file, file))
+
+        def skip(i: int, file: str) -> None:
+            with lock:
+                failed[i] = _not_run_failure(
+                    file,
+                    "out_of_budget",
+                    "Not run: the time budget of the suite ran out\n",
+                    options,
+                )
+                for reporter in reporters:
+                    reporter.report(failed[i], self._notebooks.get(file, file))
+
+        def execute(i: int, file: str, key: str | None) -> None:
+            try:
+                result = self._run_file(file, options, server)
+            finally:
+                free_workers.release()
+            with lock:
+                self.cell_timings.extend(result["cells"])
+                if result["profile"] is not None:
+                    profiles[file] = result["profile"]
+                if result_cache is not None and key is not None:
+                    result_cache.store(key, file, result["return_code"] == 0)
+                if timings is not None:
+                    timings.store(
+                        self._notebooks.get(file, file),
+                        result["duration"],
+                        result["return_code"] == 0,
+                    )
+                outcome: NotebookRunSuccess | NotebookRunFailure
+                if result["return_code"] != 0:
+                    if fail_fast:
+                        stop.set()
+                    failed[i] = outcome = _failure(result, options)
+                else:
+                    passed[i] = outcome = _success(result, options)
+                for reporter in reporters:
+                    reporter.report(outcome, self._notebooks.get(file, file))
+
+        seen = 0
+        stopped = False
+        out_of_budget = False
+        futures: list[Future[None]] = []
+        notebooks = iter(files)
+        start = time.perf_counter()
+        try:
+            if checker is not None and isinstance(files, list):
+                errors = checker.check([(f, self._scripts.get(f)) for f in files])
+                for i, (file, error) in enumerate(zip(files, errors)):
+                    if error is not None:
+                        reject(i, file, error)
+                checker.close()
+                checker = None
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                try:
+                    free_workers.acquire()
+                    for i, file in enumerate(notebooks):
+                        if i in rejected:
+                            # already reported by the pre-flight checks
+                            seen += 1
+                            continue
+                        if stop.is_set():
+                            stopped = True
+                            break
+                        seen += 1
+                        if out_of_budget or (
+                            options["deadline"] is not None
+                            and time.monotonic() >= options["deadline"]
+                        ):
+                            # the remaining notebooks are reported as not run
+                            out_of_budget = True
+                            skip(i, file)
+                            continue
+                        if checker is not None:
+                            error = checker.check([(file, self._scripts.get(file))])[0]
+                            if error is not None:
+                                reject(i, file, error)
+                                continue
+                        key: str | None = None
+                        if result_cache is not None:
+                            key = result_cache.key(
+                                self._script_hash(file),
+                                python_executable,
+                                lockfile_hash,
+                            )
+                            if changed_only and result_cache.passed(key):
+                                with lock:
+                                    passed[i] = {
+                                        "return_code": 0,
+                                        "logs": "",
+                                        "file": file,
+                                        "cached": True,
+                                        "log_file": None,
+                                        "duration": 0.0,
+                                        "cpu_user": None,
+                                        "cpu_system": None,
+                                        "max_rss": None,
+                                    }
+                                    for reporter in reporters:
+                                        reporter.report(
+                                            passed[i], self._notebooks.get(file, file)
+                                        )
+                                continue
+                        if fork_server and server is None:
+                            server = ForkServer(
+                                python_command(python_executable), preload
+                            )
+                        futures.append(pool.submit(execute, i, file, key))
+                        free_workers.acquire()
+                    for future in futures:
+                        future.result()
+                except BaseException:
+                    # notebooks run in their own process groups, out of reach of a Ctrl+C in the
+                    # terminal: kill them rather than waiting for them
+                    with self._running_lock:
+                        for pid in self._running:
+                            kill_group(pid)
+                    if server is not None:
+                        server.close()
+                    raise
+            if seen > 0:
+                profile_file = (
+                    os.path.join(log_dir, "suite.pstats")
+                    if profiles and options["keep_logs"]
+                    else None
+                )
+                top_functions = (
+                    aggregate_profiles(
+                        list(profiles.values()), profiles, profile_top, profile_file
+                    )
+                    if profiles
+                    else []
+                )
+                for reporter in reporters:
+                    reporter.summarize(
+                        {
+                            "log_dir": log_dir if options["keep_logs"] else None,
+                            "duration": time.perf_counter() - start,
+                            "stopped": stopped,
+                            "out_of_budget": out_of_budget,
+                            "cell_timings": self.cell_timings,
+                            "profile": top_functions,
+                            "profile_file": profile_file,
+                        }
+                    )
+        finally:
+            if isinstance(notebooks, Generator):
+                notebooks.close()
+            if server is not None:
+                server.close()
+            if checker is not None:
+                checker.close()
+            if result_cache is not None:
+                result_cache.save()
+            if timings is not None:
+                timings.save()
+            for reporter in reporters:
+                reporter.close()
+            _remove_logs(options)
+        if seen == 0:
             raise ValueError(
                 "No files to execute, please convert some files before using this method"
             )
+        succ = [passed[i] for i in sorted(passed)]
+        fail = [failed[i] for i in sorted(failed)]
+        return succ, fail
+
+    async def arun(
+        self,
+        python_executable: str | None = None,
+        timeout: float | None = None,
+        jobs: int | None = None,
+        log_dir: str | None = None,
+        log_tail: int = DEFAULT_LOG_TAIL,
+        files: Iterable[str] | None = None,
+        max_memory: int | None = None,
+        max_cpu: int | None = None,
+        time_budget: float | None = None,
+    ) -> AsyncIterator[NotebookRunSuccess | NotebookRunFailure]:
+        """
+        Asyncio counterpart of `run`: yield the result of each notebook as soon as it finishes,
+        running up to `jobs` notebooks at once with `asyncio.create_subprocess_exec`.
+        Blocking iterables of `files` (e.g. `stream_python_files`) are consumed in a thread.
+        Closing the iterator, or cancelling the task consuming it, kills the running notebooks.
+        Nothing is printed or cached, and the resource usage of the notebooks is not collected.
+        """
+        blocking = files is not None
+        notebooks = iter(self._converted_files() if files is None else files)
         if not python_executable:
             python_executable = sys.executable
-        for file in self._files_to_exec:
-            result = subprocess.run(
-                python_executable + " " + file,
-                shell=True,
-                capture_output=True,
-                timeout=timeout,
+        free_workers = asyncio.Semaphore(_check_jobs(jobs))
+        options = _execution_options(
+            python_executable,
+            timeout,
+            log_dir,
+            log_tail,
+            max_memory,
+            max_cpu,
+            time_budget,
+        )
+        self.cell_timings = []
+        done: asyncio.Queue[NotebookExecution | None] = asyncio.Queue()
+        tasks: set[asyncio.Task[None]] = set()
+
+        async def execute(file: str) -> None:
+            try:
+                result = await self._arun_file(file, options)
+            finally:
+                free_workers.release()
+            await done.put(result)
+
+        async def launch() -> None:
+            try:
+                seen = 0
+                while True:
+                    await free_workers.acquire()
+                    if blocking:
+                        file = await asyncio.to_thread(next, notebooks, None)
+                    else:
+                        file = next(notebooks, None)
+                    if file is None:
+                        break
+                    seen += 1
+                    if (
+                        options["deadline"] is not None
+                        and time.monotonic() >= options["deadline"]
+                    ):
+                        break
+                    tasks.add(asyncio.create_task(execute(file)))
+                if seen == 0:
+                    raise ValueError(
+                        "No files to execute, please convert some files before using this method"
+                    )
+                await asyncio.gather(*tasks)
+            finally:
+                await done.put(None)
+
+        launcher = asyncio.create_task(launch())
+        try:
+            while (result := await done.get()) is not None:
+                self.cell_timings.extend(result["cells"])
+                yield (
+                    _success(result, options)
+                    if result["return_code"] == 0
+                    else _failure(result, options)
+                )
+            await launcher
+        finally:
+            for task in (launcher, *tasks):
+                task.cancel()
+            await asyncio.gather(launcher, *tasks, return_exceptions=True)
+            # a generator still running in its thread cannot be closed
+            if (
+                isinstance(notebooks, Generator)
+                and inspect.getgeneratorstate(notebooks) != inspect.GEN_RUNNING
+            ):
+                notebooks.close()
+            _remove_logs(options)
+
+    def _converted_files(self) -> list[str]:
+        if len(self._files_to_exec) == 0:
+            raise ValueError(
+                "No files to execute, please convert some files before using this method"
             )
-            if result.returncode != 0:
-                fail.append(
-                    {
-                        "return_code": result.returncode,
-                        "logs": str(result.stderr, encoding="utf-8"),
-                        "file": file,
-                    }
+        return list(self._files_to_exec)
+
+    def _prepare_run(
+        self, file: str, options: ExecutionOptions
+    ) -> tuple[list[str], dict[str, Any], str | None, str]:
+        """Command and spawn arguments running `file`, its source if kept in memory, and its logs prefix."""
+        log_name = os.path.join(options["log_dir"], _log_name(file))
+        source = self._scripts.get(file)
+        env: dict[str, str] = {}
+        if self.profile_cells:
+            env[CELL_PROFILE_ENV] = cells_log = log_name + ".cells.json"
+            if os.path.exists(cells_log):
+                os.remove(cells_log)
+        python = python_command(options["python_executable"])
+        command: list[str] = []
+        if options["profile"] is not None:
+            profile = log_name + ".pstats"
+            if os.path.exists(profile):
+                os.remove(profile)
+            command.extend([PROFILER_SCRIPT, options["profile"], profile, file])
+            if source is not None:
+                command.append("--stdin")
+        elif source is None:
+            command.append(file)
+        else:
+            command.extend(["-c", _STDIN_BOOTSTRAP, file])
+        if options["max_memory"] is not None or options["max_cpu"] is not None:
+            command = limits_command(
+                python, command, options["max_memory"], options["max_cpu"]
+            )
+        else:
+            command = [*python, *command]
+        spawn = {
+            "stdin": subprocess.PIPE if source is not None else None,
+            "env": {**os.environ, **env} if env else None,
+            "start_new_session": hasattr(os, "killpg"),
+        }
+        return command, spawn, source, log_name
+
+    def _run_file(
+        self, file: str, options: ExecutionOptions, server: ForkServer | None
+    ) -> NotebookExecution:
+        command, spawn, source, log_name = self._prepare_run(file, options)
+        stdout_log = log_name + ".stdout.log"
+        stderr_log = log_name + ".stderr.log"
+        timeout = _remaining_timeout(options)
+        start = time.perf_counter()
+        timed_out = False
+        if server is not None:
+            try:
+                return_code, rusage = server.run(
+                    file,
+                    stdout_log,
+                    stderr_log,
+                    timeout,
+                    source,
+                    {CELL_PROFILE_ENV: log_name + ".cells.json"}
+                    if self.profile_cells
+                    else None,
+                    options["max_memory"],
+                    options["max_cpu"],
+                    (options["profile"], log_name + ".pstats")
+                    if options["profile"] is not None
+                    else None,
                 )
-                cprint(f"{file} FAILED", color="red", attrs=["bold"])
-            else:
-                succ.append(
+            except subprocess.TimeoutExpired:
+                return_code, rusage, timed_out = -signal.SIGKILL, None, True
+        else:
+            with open(stdout_log, "wb") as stdout, open(stderr_log, "wb") as stderr:
+                process = subprocess.Popen(
+                    command, stdout=stdout, stderr=stderr, **spawn
+                )
+                with self._running_lock:
+                    self._running.add(process.pid)
+                try:
+                    if process.stdin is not None and source is not None:
+                        try:
+                            with process.stdin:
+                                process.stdin.write(source.encode("utf-8"))
+                        except BrokenPipeError:
+                            # the notebook died early, e.g. on its memory limit
+                            pass
+                    return_code, rusage, timed_out = _wait(process, timeout)
+                finally:
+                    with self._running_lock:
+                        self._running.discard(process.pid)
+        return self._execution(
+            file,
+            options,
+            log_name,
+            return_code,
+            time.perf_counter() - start,
+            rusage,
+            timed_out,
+        )
+
+    async def _arun_file(
+        self, file: str, options: ExecutionOptions
+    ) -> NotebookExecution:
+        command, spawn, source, log_name = self._prepare_run(file, options)
+        timeout = _remaining_timeout(options)
+        start = time.perf_counter()
+        timed_out = False
+        with (
+            open(log_name + ".stdout.log", "wb") as stdout,
+            open(log_name + ".stderr.log", "wb") as stderr,
+        ):
+            process = await asyncio.create_subprocess_exec(
+                *command, stdout=stdout, stderr=stderr, **spawn
+            )
+            try:
+                if process.stdin is not None and source is not None:
+                    try:
+                        process.stdin.write(source.encode("utf-8"))
+                        process.stdin.close()
+                        await process.stdin.wait_closed()
+                    except (BrokenPipeError, ConnectionResetError):
+                        # the notebook died early, e.g. on its memory limit
+                        pass
+                return_code = await asyncio.wait_for(process.wait(), timeout)
+            except asyncio.TimeoutError:
+                kill_group(process.pid)
+                return_code, timed_out = await process.wait(), True
+            except BaseException:
+                kill_group(process.pid)
+                await asyncio.shield(process.wait())
+                raise
+        return self._execution(
+            file,
+            options,
+            log_name,
+            return_code,
+            time.perf_counter() - start,
+            None,
+            timed_out,
+        )
+
+    def _execution(
+        self,
+        file: str,
+        options: ExecutionOptions,
+        log_name: str,
+        return_code: int,
+        duration: float,
+        rusage: ResourceUsage | None,
+        timed_out: bool,
+    ) -> NotebookExecution:
+        stdout_log = log_name + ".stdout.log"
+        stderr_log = log_name + ".stderr.log"
+        cells_log = log_name + ".cells.json"
+        profile = log_name + ".pstats"
+        cells: list[CellTiming] = []
+        if self.profile_cells and os.path.exists(cells_log):
+            with open(cells_log, "r") as f:
+                cells = [
                     {
-                        "return_code": result.returncode,  # type: ignore
-                        "logs": str(result.stdout, encoding="utf-8"),
                         "file": file,
+                        "cell": timing["cell"],
+                        "duration": timing["duration"],
+                        "max_rss": timing["max_rss"],
+                        "rss_growth": timing["rss_growth"],
                     }
-                )
-                cprint(f"{file} PASSED", color="green", attrs=["bold"])
-        print()
-        print()
-        print("=========== TEST SUMMARY =============")
-        print()
-        cprint(f"{len(succ)} tests were successfull", color="green", attrs=["bold"])
-        cprint(f"{len(fail)} tests failed\n", color="red", attrs=["bold"])
-        if len(fail) > 0:
-            for f in fail:
-                print(f"\t- {f['file']}\n")
-                if verbose:
-                    print(f"\t\tReturn Code: {f['return_code']}\n")
-                    print(f"\t\tCaptured Logs: {f['logs']}\n\n")
-            if not verbose:
-                cprint(
-                    f"\t\t(enable the `--verbose` option to see details)",
-                    color="yellow",
-                    attrs=["bold"],
-                )
-        return succ, fail
+                    for timing in json.load(f)
+                ]
+        return {
+            "file": file,
+            "return_code": return_code,
+            "stdout": read_tail(stdout_log, options["log_tail"]),
+            "stderr": read_tail(stderr_log, options["log_tail"]),
+            "stdout_log": stdout_log,
+            "stderr_log": stderr_log,
+            "duration": duration,
+            "cpu_user": rusage[0] if rusage is not None else None,
+            "cpu_system": rusage[1] if rusage is not None else None,
+            "max_rss": rusage[2] if rusage is not None else None,
+            "timed_out": timed_out,
+            "cells": cells,
+            "profile": profile
+            if options["profile"] is not None and os.path.exists(profile)
+            else None,
+        }
+
+    def _script_hash(self, file: str) -> str:
+        if (source := self._scripts.get(file)) is not None:
+            return hash_text(source)
+        return hash_file(file)
+
+
+PROFILER_SCRIPT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "profiler.py"
+)
+
+# runs a script read from stdin as if it was the file named by argv[1]
+_STDIN_BOOTSTRAP = (
+    "import os, sys; sys.argv = sys.argv[1:]; "
+    "sys.path[0] = os.path.dirname(os.path.abspath(sys.argv[0])); "
+    "exec(compile(sys.stdin.read(), sys.argv[0], 'exec'), "
+    "{'__name__': '__main__', '__file__': sys.argv[0]})"
+)
+
+
+def _bounded_map(
+    pool: ProcessPoolExecutor, fn: Any, *iterables: Iterable[Any], window: int
+) -> Iterator[Any]:
+    """
+    Like `pool.map`, but the arguments are only taken from `iterables` as results are consumed:
+    at most `window` calls are submitted and not yet yielded.
+    """
+    pending: collections.deque[Future[Any]] = collections.deque()
+    try:
+        for args in zip(*iterables):
+            pending.append(pool.submit(fn, *args))
+            while pending and (len(pending) >= window or pending[0].done()):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _check_jobs(jobs: int | None) -> int:
+    if jobs is None:
+        return os.cpu_count() or 1
+    if jobs < 1:
+        raise ValueError("`jobs` should be a positive integer")
+    return jobs
+
+
+def _execution_options(
+    python_executable: str,
+    timeout: float | None,
+    log_dir: str | None,
+    log_tail: int,
+    max_memory: int | None,
+    max_cpu: int | None,
+    time_budget: float | None,
+    profile: str | None = None,
+) -> ExecutionOptions:
+    if (max_memory is not None or max_cpu is not None) and not hasattr(os, "killpg"):
+        raise ValueError("Resource limits are only available on POSIX platforms")
+    if time_budget is not None and time_budget <= 0:
+        raise ValueError("The time budget must be positive")
+    keep_logs = log_dir is not None
+    if log_dir is None:
+        # removed by `_remove_logs` at the end of the run
+        log_dir = tempfile.mkdtemp(prefix="test_nb_logs_")
+    else:
+        os.makedirs(log_dir, exist_ok=True)
+    return {
+        "python_executable": python_executable,
+        "timeout": timeout,
+        "log_dir": log_dir,
+        "keep_logs": keep_logs,
+        "log_tail": log_tail,
+        "max_memory": max_memory,
+        "max_cpu": max_cpu,
+        "deadline": time.monotonic() + time_budget if time_budget is not None else None,
+        "profile": profile,
+    }
+
+
+def _remove_logs(options: ExecutionOptions) -> None:
+    """Remove the temporary log directory of a run, once its results were reported."""
+    if not options["keep_logs"]:
+        shutil.rmtree(options["log_dir"], ignore_errors=True)
+
+
+def _log_file(path: str, options: ExecutionOptions) -> str | None:
+    return path if options["keep_logs"] else None
+
+
+def _remaining_timeout(options: ExecutionOptions) -> float | None:
+    """Timeout of a notebook started now, shortened to what is left of the suite time budget."""
+    timeout = options["timeout"]
+    if options["deadline"] is not None:
+        remaining = max(0.0, options["deadline"] - time.monotonic())
+        timeout = remaining if timeout is None else min(timeout, remaining)
+    return timeout
+
+
+def _success(
+    result: NotebookExecution, options: ExecutionOptions
+) -> NotebookRunSuccess:
+    return {
+        "return_code": 0,
+        "logs": result["stdout"],
+        "file": result["file"],
+        "cached": False,
+        "log_file": _log_file(result["stdout_log"], options),
+        "duration": result["duration"],
+        "cpu_user": result["cpu_user"],
+        "cpu_system": result["cpu_system"],
+        "max_rss": result["max_rss"],
+    }
+
+
+def _failure(
+    result: NotebookExecution, options: ExecutionOptions
+) -> NotebookRunFailure:
+    return {
+        "return_code": result["return_code"],
+        "status": "timeout" if result["timed_out"] else "failed",
+        "logs": result["stderr"],
+        "file": result["file"],
+        "log_file": _log_file(result["stderr_log"], options),
+        "duration": result["duration"],
+        "cpu_user": result["cpu_user"],
+        "cpu_system": result["cpu_system"],
+        "max_rss": result["max_rss"],
+    }
+
+
+def _not_run_failure(
+    file: str,
+    status: Literal["preflight", "out_of_budget"],
+    error: str,
+    options: ExecutionOptions,
+) -> NotebookRunFailure:
+    """Failure of a notebook that was not run (see `result_status`), whose error is written to its logs."""
+    log_file = os.path.join(options["log_dir"], _log_name(file)) + ".stderr.log"
+    with open(log_file, "w", encoding="utf-8") as f:
+        f.write(error)
+    return {
+        "return_code": 1,
+        "status": status,
+        "logs": error,
+        "file": file,
+        "log_file": _log_file(log_file, options),
+        "duration": 0.0,
+        "cpu_user": None,
+        "cpu_system": None,
+        "max_rss": None,
+    }
+
+
+def _wait(
+    process: subprocess.Popen[bytes], timeout: float | None
+) -> tuple[int, ResourceUsage | None, bool]:
+    """
+    Wait for `process` and collect its resource usage with `os.wait4` where available.
+    Once `timeout` elapses, kills the process group it leads (the process alone where process
+    groups are not available) and reports it as timed out.
+    """
+    if not hasattr(os, "wait4"):
+        try:
+            return process.wait(timeout), None, False
+        except subprocess.TimeoutExpired:
+            process.kill()
+            return process.wait(), None, True
+    lock = threading.Lock()
+    state = {"reaped": False, "killed": False}
+
+    def kill() -> None:
+        # not Popen.kill: it may reap the child behind the back of os.wait4
+        with lock:
+            if not state["reaped"]:
+                kill_group(process.pid)
+                state["killed"] = True
+
+    timer = threading.Timer(timeout, kill) if timeout is not None else None
+    if timer is not None:
+        timer.start()
+    try:
+        _, status, rusage = os.wait4(process.pid, 0)
+    finally:
+        with lock:
+            state["reaped"] = True
+        if timer is not None:
+            timer.cancel()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return (
+        process.returncode,
+        usage_from_rusage(rusage.ru_utime, rusage.ru_stime, rusage.ru_maxrss),
+        state["killed"],
+    )
+
+
+def python_command(python_executable: str) -> list[str]:
+    """Split `python_executable` into an argv list, unless it is the path of an existing file."""
+    if os.path.exists(python_executable):
+        return [python_executable]
+    return shlex.split(python_executable)
+
+
+def _log_name(file: str) -> str:
+    return os.path.normpath(file).lstrip(os.sep).replace(os.sep, "__")
+
+
+def _convert_notebook(
+    file: str,
+    cache_entry: ConversionCacheEntry | None,
+    options: ConversionOptions,
+    overwrite: bool,
+    use_cache: bool,
+    in_memory: bool = False,
+) -> ConversionResult:
+    """Convert a single notebook. Runs in worker processes, so errors are returned rather than raised."""
+    result: ConversionResult = {
+        "file": file,
+        "output": None,
+        "cache_key": None,
+        "cached": False,
+        "script": None,
+        "error": None,
+        "warning": None,
+        "requirements": [],
+    }
+    if use_cache:
+        result["cache_key"] = cache_key = ConversionCache.key(
+            hash_file(file), **options
+        )
+        if cache_entry is not None and ConversionCache.is_fresh(cache_entry, cache_key):
+            result["output"] = cache_entry["output"]
+            result["requirements"] = cache_entry.get("requirements", [])
+            result["cached"] = True
+            return result
+    cells = read_cells(file)
+    if cells is None:
+        msg = f"File {file} does not have any cells, please exclude it from the files to process and re-try"
+        result["error"] = msg
+        result["warning"] = msg.split(",")[0]
+        return result
+    translated = translate_cells(
+        cells, options["markdown_as_comment"], options["exclude_env"]
+    )
+    if options["strip_installs"]:
+        result["requirements"] = dedup_requirements(strip_installs(translated))
+    script = emit_script(translated, options["profile_cells"], options["shell_session"])
+    py_file_name = file.replace(".ipynb", ".py")
+    if in_memory:
+        result["output"] = py_file_name
+        result["script"] = script
+        return result
+    if file_exists(py_file_name) and not overwrite:
+        msg = f"Python file {py_file_name} already exist and permission to overwrite has not been granted"
+        result["error"] = msg
+        result["warning"] = msg + ". Skipping..."
+        return result
+    with open(py_file_name, "w") as f:
+        f.write(script)
+    result["output"] = py_file_name
+    return result
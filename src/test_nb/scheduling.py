@@ -0,0 +1,82 @@
+import heapq
+
+from typing import Callable
+from .models import TimingEntry
+
+# reorders the notebooks to run, given the recorded timings of the ones that have any
+SchedulingPolicy = Callable[[list[str], dict[str, TimingEntry]], list[str]]
+
+SCHEDULING_POLICIES: dict[str, SchedulingPolicy] = {}
+DEFAULT_POLICY = "discovery"
+
+
+def register_policy(name: str) -> Callable[[SchedulingPolicy], SchedulingPolicy]:
+    """Register a scheduling policy under `name`, making it available to `nb test --schedule`."""
+
+    def decorator(policy: SchedulingPolicy) -> SchedulingPolicy:
+        SCHEDULING_POLICIES[name] = policy
+        return policy
+
+    return decorator
+
+
+def get_policy(name: str) -> SchedulingPolicy:
+    try:
+        return SCHEDULING_POLICIES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown scheduling policy {name!r}, available policies: {', '.join(SCHEDULING_POLICIES)}"
+        ) from None
+
+
+@register_policy(DEFAULT_POLICY)
+def discovery_order(files: list[str], timings: dict[str, TimingEntry]) -> list[str]:
+    """Keep the order in which notebooks were found."""
+    return list(files)
+
+
+@register_policy("longest-first")
+def longest_first(files: list[str], timings: dict[str, TimingEntry]) -> list[str]:
+    """
+    Start the notebooks that took longest last time first, so that no long notebook starts
+    when the others are about to finish. Unknown notebooks count as the average duration.
+    """
+    durations = {f: entry["duration"] for f, entry in timings.items()}
+    default = sum(durations.values()) / len(durations) if durations else 0.0
+    return sorted(files, key=lambda f: -durations.get(f, default))
+
+
+@register_policy("failed-first")
+def failed_first(files: list[str], timings: dict[str, TimingEntry]) -> list[str]:
+    """Start the notebooks that failed last time first, for faster feedback on known breakages."""
+    return sorted(files, key=lambda f: f not in timings or timings[f]["passed"])
+
+
+def shard_files(
+    files: list[str],
+    index: int,
+    count: int,
+    durations: dict[str, float] | None = None,
+) -> list[str]:
+    """
+    Deterministically select the notebooks of shard `index` (1-based) out of `count`.
+    Notebooks are assigned longest first to the shard with the least expected runtime, using the
+    recorded `durations` (unknown ones count as the average); without any durations, this splits
+    the sorted notebooks round-robin, so shards differ by at most one notebook.
+    Returns the selected notebooks in their original order.
+    """
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard {index}/{count}: expected 1 <= index <= count")
+    durations = durations or {}
+    known = [durations[f] for f in files if f in durations]
+    default = sum(known) / len(known) if known else 1.0
+    weights = {f: durations.get(f, default) for f in files}
+    # (expected runtime, shard index) of every shard
+    loads = [(0.0, shard) for shard in range(count)]
+    selected: set[str] = set()
+    for file in sorted(files, key=lambda f: (-weights[f], f)):
+        load, shard = heapq.heappop(loads)
+        if shard == index - 1:
+            selected.add(file)
+        heapq.heappush(loads, (load + weights[file], shard))
+    return [f for f in files if f in selected]
@@ -1,20 +1,114 @@
+import fnmatch
+import hashlib
 import os
 
+from typing import Iterator
 
-def find_notebooks_in_dir(directory: str, recursive: bool):
-    if recursive:
-        files = []
-        for root, _, filenames in os.walk(directory):
-            for file in filenames:
-                if file.endswith(".ipynb"):
-                    files.append(os.path.join(root, file))
-        return files
-    else:
-        return [
-            os.path.join(directory, f)
-            for f in os.listdir(directory)
-            if os.path.join(directory, f).endswith(".ipynb")
-        ]
+IGNORE_FILE = ".nbtestignore"
+# directories that never hold notebooks worth testing, they are not even entered
+DEFAULT_EXCLUDED_DIRS = (".ipynb_checkpoints", ".git", ".venv", "node_modules")
+
+
+def read_ignore_file(directory: str) -> list[str]:
+    """Glob patterns listed in the `.nbtestignore` file of `directory`, if any."""
+    try:
+        with open(os.path.join(directory, IGNORE_FILE), "r", encoding="utf-8") as f:
+            lines = [line.strip() for line in f]
+    except FileNotFoundError:
+        return []
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def _matches(rel_path: str, is_dir: bool, patterns: list[str]) -> bool:
+    """
+    Gitignore-like matching: patterns containing a `/` are matched against the path relative
+    to the searched directory, the others against the file name; a trailing `/` only matches directories.
+    """
+    name = rel_path.rsplit("/", 1)[-1]
+    for pattern in patterns:
+        if pattern.endswith("/"):
+            if not is_dir:
+                continue
+            pattern = pattern.rstrip("/")
+        if "/" in pattern:
+            if fnmatch.fnmatchcase(rel_path, pattern.lstrip("/")):
+                return True
+        elif fnmatch.fnmatchcase(name, pattern):
+            return True
+    return False
+
+
+def excluded_patterns(directory: str, exclude: list[str] | None = None) -> list[str]:
+    """Patterns of the files and directories skipped when looking for notebooks in `directory`."""
+    return [*DEFAULT_EXCLUDED_DIRS, *(exclude or []), *read_ignore_file(directory)]
+
+
+def is_excluded_dir(rel_dir: str, excluded: list[str]) -> bool:
+    """Whether the directory at `rel_dir` (relative to the searched directory, with `/` separators) is skipped."""
+    parts = rel_dir.split("/")
+    return any(
+        _matches("/".join(parts[:i]), True, excluded) for i in range(1, len(parts) + 1)
+    )
+
+
+def is_included(
+    rel_path: str, excluded: list[str], include: list[str] | None = None
+) -> bool:
+    """Whether the notebook at `rel_path` (relative to the searched directory, with `/` separators) would be found."""
+    rel_dir = rel_path.rpartition("/")[0]
+    return (
+        not (rel_dir and is_excluded_dir(rel_dir, excluded))
+        and rel_path.endswith(".ipynb")
+        and not _matches(rel_path, False, excluded)
+        and (not include or _matches(rel_path, False, include))
+    )
+
+
+def iter_notebooks(
+    directory: str,
+    recursive: bool,
+    include: list[str] | None = None,
+    exclude: list[str] | None = None,
+) -> Iterator[str]:
+    """
+    Lazily yield the notebooks in `directory` (and its subdirectories, if `recursive`), in name order.
+    Notebooks must match one of the `include` globs when provided; files and directories matching
+    the `exclude` globs, the patterns in `.nbtestignore` or `DEFAULT_EXCLUDED_DIRS` are skipped,
+    and excluded directories are never entered.
+    """
+    excluded = excluded_patterns(directory, exclude)
+    stack = [(directory, "")]
+    while stack:
+        path, rel_dir = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            rel_path = rel_dir + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if recursive and not _matches(rel_path, True, excluded):
+                    subdirs.append((entry.path, rel_path + "/"))
+            elif (
+                entry.name.endswith(".ipynb")
+                and entry.is_file()
+                and not _matches(rel_path, False, excluded)
+                and (not include or _matches(rel_path, False, include))
+            ):
+                yield entry.path
+        # reversed, so that subdirectories are popped in name order
+        stack.extend(reversed(subdirs))
+
+
+def find_notebooks_in_dir(
+    directory: str,
+    recursive: bool,
+    include: list[str] | None = None,
+    exclude: list[str] | None = None,
+) -> list[str]:
+    return list(iter_notebooks(directory, recursive, include, exclude))
 
 
 def dir_exists(directory: str):
@@ -23,3 +117,31 @@ def dir_exists(directory: str):
 
 def file_exists(file: str):
     return os.path.exists(file) and os.path.isfile(file)
+
+
+def hash_file(file: str) -> str:
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# bytes of output kept from the end of the logs of a notebook
+DEFAULT_LOG_TAIL = 64 * 1024
+
+
+def read_tail(file: str, size: int) -> str:
+    with open(file, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        length = f.tell()
+        f.seek(max(0, length - size))
+        tail = f.read()
+    text = tail.decode("utf-8", errors="replace")
+    if length > size:
+        return f"[... {length - size} bytes truncated ...]\n" + text
+    return text
@@ -0,0 +1,273 @@
+"""
+File watching for `nb watch`. Watchers report the notebooks written, created or removed since
+their last call: with inotify on Linux, and by polling file and directory stats elsewhere.
+Only directories whose entries changed are listed again, the tree is never re-scanned.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from typing import Iterator, Protocol
+from .utils import excluded_patterns, is_excluded_dir, is_included
+
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+# struct inotify_event, followed by `len` bytes of NUL-padded name
+_EVENT = struct.Struct("iIII")
+
+
+class WatchTargets:
+    """Notebooks to watch: explicit files, plus the notebooks of a directory filtered as `iter_notebooks` does."""
+
+    def __init__(
+        self,
+        files: list[str] | None = None,
+        directory: str | None = None,
+        recursive: bool = False,
+        include: list[str] | None = None,
+        exclude: list[str] | None = None,
+    ):
+        self.files = {os.path.abspath(f) for f in files or []}
+        self.directory = os.path.abspath(directory) if directory is not None else None
+        self.recursive = recursive
+        self.include = include
+        self.excluded = (
+            excluded_patterns(directory, exclude) if directory is not None else []
+        )
+
+    def _relative(self, path: str) -> str | None:
+        if self.directory is None:
+            return None
+        rel = os.path.relpath(path, self.directory)
+        if rel == os.curdir or rel.startswith(os.pardir):
+            return None
+        rel = rel.replace(os.sep, "/")
+        return None if not self.recursive and "/" in rel else rel
+
+    def accepts(self, path: str) -> bool:
+        path = os.path.abspath(path)
+        if path in self.files:
+            return True
+        rel = self._relative(path)
+        return rel is not None and is_included(rel, self.excluded, self.include)
+
+    def accepts_dir(self, path: str) -> bool:
+        rel = self._relative(os.path.abspath(path))
+        return rel is not None and not is_excluded_dir(rel, self.excluded)
+
+    def scan(self, root: str) -> tuple[list[str], list[str]]:
+        """Watched directories and notebooks under `root`, which is only entered if it is watched."""
+        directories: list[str] = []
+        notebooks: list[str] = []
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            directories.append(directory)
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive and self.accepts_dir(entry.path):
+                                pending.append(entry.path)
+                        elif self.accepts(entry.path):
+                            notebooks.append(entry.path)
+            except OSError:
+                continue
+        return directories, notebooks
+
+    def initial(self) -> tuple[set[str], set[str]]:
+        """Directories to watch and notebooks found at start."""
+        directories = {os.path.dirname(f) for f in self.files}
+        notebooks = {f for f in self.files if os.path.isfile(f)}
+        if self.directory is not None:
+            tree, found = self.scan(self.directory)
+            directories.update(tree)
+            notebooks.update(found)
+        return directories, notebooks
+
+
+class Watcher(Protocol):
+    def changes(self, timeout: float | None) -> set[str]:
+        """Notebooks changed since the last call, waiting up to `timeout` seconds (forever if None) for one."""
+        ...
+
+    def close(self) -> None: ...
+
+
+def _stat(path: str) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class PollingWatcher:
+    def __init__(self, targets: WatchTargets, interval: float = 0.5):
+        self._targets = targets
+        self._interval = interval
+        directories, notebooks = targets.initial()
+        self._dirs = {d: _stat(d) for d in directories}
+        self._files = {f: _stat(f) for f in notebooks}
+
+    def changes(self, timeout: float | None) -> set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not (changed := self._poll()):
+            delay = self._interval
+            if deadline is not None:
+                if (remaining := deadline - time.monotonic()) <= 0:
+                    break
+                delay = min(delay, remaining)
+            time.sleep(delay)
+        return changed
+
+    def _poll(self) -> set[str]:
+        changed: set[str] = set()
+        for directory, stat in list(self._dirs.items()):
+            if (current := _stat(directory)) != stat:
+                if current is None:
+                    del self._dirs[directory]
+                    continue
+                self._dirs[directory] = current
+                changed |= self._list(directory)
+        for file, stat in list(self._files.items()):
+            if (current := _stat(file)) != stat:
+                changed.add(file)
+                if current is None:
+                    del self._files[file]
+                else:
+                    self._files[file] = current
+        return changed
+
+    def _list(self, directory: str) -> set[str]:
+        """Notebooks and directories that appeared in `directory`."""
+        new: set[str] = set()
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            return new
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if (
+                    entry.path not in self._dirs
+                    and self._targets.recursive
+                    and self._targets.accepts_dir(entry.path)
+                ):
+                    directories, notebooks = self._targets.scan(entry.path)
+                    self._dirs.update((d, _stat(d)) for d in directories)
+                    self._files.update((f, _stat(f)) for f in notebooks)
+                    new.update(notebooks)
+            elif entry.path not in self._files and self._targets.accepts(entry.path):
+                self._files[entry.path] = _stat(entry.path)
+                new.add(entry.path)
+        return new
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    def __init__(self, targets: WatchTargets):
+        self._targets = targets
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._watches: dict[int, str] = {}
+        directories, _ = targets.initial()
+        for directory in directories:
+            self._add(directory)
+
+    def _add(self, directory: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if wd >= 0:
+            self._watches[wd] = directory
+
+    def changes(self, timeout: float | None) -> set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed: set[str] = set()
+        while not changed:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if not readable:
+                break
+            try:
+                data = os.read(self._fd, 1 << 16)
+            except BlockingIOError:
+                continue
+            changed |= self._parse(data)
+        return changed
+
+    def _parse(self, data: bytes) -> set[str]:
+        changed: set[str] = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & _IN_Q_OVERFLOW:
+                # events were lost: consider every notebook changed
+                changed |= self._targets.initial()[1]
+                continue
+            if mask & _IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & _IN_ISDIR:
+                if (
+                    mask & (_IN_CREATE | _IN_MOVED_TO)
+                    and self._targets.recursive
+                    and self._targets.accepts_dir(path)
+                ):
+                    directories, notebooks = self._targets.scan(path)
+                    for subdirectory in directories:
+                        self._add(subdirectory)
+                    changed.update(notebooks)
+            # created files are reported once they are written and closed
+            elif mask & ~_IN_CREATE and self._targets.accepts(path):
+                changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+def create_watcher(
+    targets: WatchTargets, polling: bool = False, interval: float = 0.5
+) -> Watcher:
+    """An inotify watcher on Linux (unless `polling` is set), a polling one otherwise."""
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(targets)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(targets, interval)
+
+
+def iter_batches(watcher: Watcher, debounce: float) -> Iterator[set[str]]:
+    """Yield the notebooks changed by each burst of writes, once nothing changed for `debounce` seconds."""
+    while True:
+        batch = watcher.changes(None)
+        while more := watcher.changes(debounce):
+            batch |= more
+        yield batch
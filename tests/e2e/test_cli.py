@@ -1,8 +1,18 @@
+import json
+import subprocess
+import sys
+import venv
+import zipfile
+import xml.etree.ElementTree as ET
 import pytest
 import os
 
+from click.testing import CliRunner
 from pathlib import Path
+from test_nb.cli import app
 from test_nb.cli.commands import _convert_files_and_run_if_needed
+from test_nb.models import RunTestArgs
+from test_nb.run import NotebookRunner
 from test_nb.utils import find_notebooks_in_dir
 
 
@@ -41,3 +51,200 @@ def test_cli_run_tests(notebooks: tuple[str, ...]):
             and Path(file.replace(".ipynb", ".py")).is_file()
         )
         os.remove(file.replace(".ipynb", ".py"))
+
+
+def test_cli_run_tests_sharded(notebooks: tuple[str, ...], tmp_path: Path, capsys):
+    timings = {
+        f"test_notebooks/{name}.ipynb": {"duration": duration, "passed": True}
+        for name, duration in [("normal", 10.0), ("with_bash", 1.0), ("with_env", 1.0)]
+    }
+    for index in (1, 2):
+        # like CI nodes, every shard starts from the same timings
+        timings_file = tmp_path / f"timings_{index}.json"
+        timings_file.write_text(json.dumps(timings))
+        retcode = _convert_files_and_run_if_needed(
+            file=notebooks,
+            run_test_args={
+                "python_executable": None,
+                "timeout": None,
+                "verbose": False,
+                "in_memory": True,
+                "shard": (index, 2),
+                "timings_file": str(timings_file),
+            },
+        )
+        assert retcode == 0
+        out = capsys.readouterr().out
+        ran = [line.split()[0] for line in out.splitlines() if "PASSED" in line]
+        # the long notebook gets a shard of its own
+        expected = (
+            ["test_notebooks/normal.py"]
+            if index == 1
+            else ["test_notebooks/with_bash.py", "test_notebooks/with_env.py"]
+        )
+        assert sorted(ran) == expected
+
+
+def test_cli_run_tests_pipeline_error(tmp_path: Path, capsys):
+    notebook = tmp_path / "a.ipynb"
+    notebook.write_text(Path("test_notebooks/normal.ipynb").read_text())
+    # a.py already exists and cannot be overwritten
+    (tmp_path / "a.py").write_text("")
+    retcode = _convert_files_and_run_if_needed(
+        file=(str(notebook),),
+        run_test_args={
+            "python_executable": None,
+            "timeout": None,
+            "verbose": False,
+            "pipeline": True,
+        },
+    )
+    assert retcode == 1
+    assert "An error occurred" in capsys.readouterr().out
+
+
+def test_cli_run_tests_time_budget(notebooks: tuple[str, ...]):
+    args = ["test", "--time-budget", "0"] + [f"--file={n}" for n in notebooks]
+    result = CliRunner().invoke(app, args)
+    assert result.exit_code == 2
+    assert "--time-budget" in result.output
+
+
+def test_cli_run_tests_reports(notebooks: tuple[str, ...], tmp_path: Path):
+    jsonl, junit = tmp_path / "results.jsonl", tmp_path / "junit.xml"
+    retcode = _convert_files_and_run_if_needed(
+        file=notebooks,
+        run_test_args={
+            "python_executable": None,
+            "timeout": None,
+            "verbose": False,
+            "in_memory": True,
+            "report_jsonl": str(jsonl),
+            "junit_xml": str(junit),
+        },
+    )
+    assert retcode == 0
+    records = [json.loads(line) for line in jsonl.read_text().splitlines()]
+    assert sorted(r["notebook"] for r in records) == sorted(notebooks)
+    assert all(r["status"] == "passed" for r in records)
+    suite = ET.parse(junit).getroot().find("testsuite")
+    assert suite is not None
+    assert suite.get("tests") == str(len(notebooks)) and suite.get("failures") == "0"
+
+
+def _write_wheel(wheelhouse: Path, name: str) -> None:
+    dist_info = f"{name}-1.0.dist-info"
+    files = {
+        f"{name}/__init__.py": "VALUE = 42\n",
+        f"{dist_info}/METADATA": f"Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n",
+        f"{dist_info}/WHEEL": "Wheel-Version: 1.0\nGenerator: test\nRoot-Is-Purelib: true\nTag: py3-none-any\n",
+    }
+    record = "".join(f"{path},,\n" for path in files) + f"{dist_info}/RECORD,,\n"
+    with zipfile.ZipFile(wheelhouse / f"{name}-1.0-py3-none-any.whl", "w") as whl:
+        for path, content in files.items():
+            whl.writestr(path, content)
+        whl.writestr(f"{dist_info}/RECORD", record)
+
+
+def test_cli_run_tests_pre_install(tmp_path: Path):
+    wheelhouse = tmp_path / "wheels"
+    wheelhouse.mkdir()
+    _write_wheel(wheelhouse, "tnb_dummy")
+    venv.create(tmp_path / "venv", with_pip=True)
+    python = str(tmp_path / "venv" / "bin" / "python")
+    for name in ("a", "b"):
+        (tmp_path / f"{name}.ipynb").write_text(
+            json.dumps(
+                {
+                    "cells": [
+                        {
+                            "cell_type": "code",
+                            "source": [
+                                "!pip install -q tnb_dummy\n",
+                                "import tnb_dummy\n",
+                                "assert tnb_dummy.VALUE == 42",
+                            ],
+                        }
+                    ]
+                }
+            )
+        )
+    args: RunTestArgs = {
+        "python_executable": python,
+        "timeout": None,
+        "verbose": True,
+        "in_memory": True,
+        "pre_install": True,
+        "wheelhouse": str(wheelhouse),
+    }
+    retcode = _convert_files_and_run_if_needed(
+        directory=str(tmp_path), run_test_args=args
+    )
+    assert retcode == 0
+    # already satisfied now: nothing is installed again
+    runner = NotebookRunner(directory=str(tmp_path), strip_installs=True)
+    runner.write_python_files(in_memory=True)
+    assert runner.requirements == ["tnb_dummy"]
+    assert runner.install_requirements(python) == []
+    assert all("pip install" not in script for script in runner._scripts.values())
+
+
+def test_cli_lazy_commands():
+    # the heavy modules are only imported by the commands that use them
+    code = (
+        "import sys; sys.argv = ['nb', '--help']\n"
+        "from test_nb.main import main\n"
+        "try:\n"
+        "    main()\n"
+        "finally:\n"
+        "    print(sorted(m for m in sys.modules if m.startswith(('test_nb', 'asyncio'))))\n"
+    )
+    process = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    help_text, modules = process.stdout.rstrip().rsplit("\n", 1)
+    assert "test_nb.cli.commands" not in modules
+    assert "test_nb.run" not in modules and "asyncio" not in modules
+    for name in ("convert", "test", "watch"):
+        assert f"\n  {name} " in help_text
+    result = CliRunner().invoke(app, ["wat", "--help"])
+    assert result.exit_code == 0
+    assert result.output.startswith("Usage: app watch [OPTIONS]")
+    # scripts are kept in memory, there are no files to overwrite
+    assert "--overwrite" not in result.output
+    assert "--cache-dir" in result.output
+
+
+def test_cli_watch_survives_errors(tmp_path: Path):
+    notebook = tmp_path / "a.ipynb"
+    # no cells: nothing to run
+    notebook.write_text("{}")
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "from test_nb.main import main; main()",
+            "watch",
+            "--file",
+            str(notebook),
+            "--poll",
+            "--poll-interval",
+            "0.05",
+            "--debounce",
+            "0.05",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        env={**os.environ, "PYTHONUNBUFFERED": "1"},
+    )
+    assert process.stdout is not None
+    try:
+        lines = iter(process.stdout.readline, "")
+        assert any("An error occurred" in line for line in lines)
+        assert any("Watching 1 notebooks" in line for line in lines)
+        notebook.write_text(Path("test_notebooks/normal.ipynb").read_text())
+        assert any("PASSED" in line for line in lines)
+    finally:
+        process.kill()
+        process.wait()
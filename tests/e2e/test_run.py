@@ -1,5 +1,10 @@
+import asyncio
+import json
 import pytest
+import subprocess
 import os
+import signal
+import time
 
 from pathlib import Path
 from test_nb.run import NotebookRunner
@@ -132,3 +137,465 @@ def test_run_files(runner: NotebookRunner) -> None:
     for file in runner._files_to_exec:
         if Path(file).exists():
             os.remove(file)
+
+
+def test_run_files_parallel(runner: NotebookRunner) -> None:
+    runner.write_python_files(overwrite=True)
+    try:
+        passed, failed = runner.run(jobs=2)
+        assert len(failed) == 0
+        assert [p["file"] for p in passed] == runner._files_to_exec
+        with pytest.raises(ValueError):
+            runner.run(jobs=0)
+    finally:
+        for file in runner._files_to_exec:
+            if Path(file).exists():
+                os.remove(file)
+
+
+def test_run_files_pipelined(runner: NotebookRunner) -> None:
+    passed, failed = runner.run(
+        jobs=2, files=runner.stream_python_files(in_memory=True, queue_size=1)
+    )
+    assert len(failed) == 0
+    assert [p["file"] for p in passed] == runner._files_to_exec
+    assert len(passed) == len(runner.files)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_stream_python_files_backpressure(tmp_path: Path, jobs: int) -> None:
+    notebook = Path("test_notebooks/normal.ipynb").read_text()
+    for i in range(40):
+        (tmp_path / f"{i:02}.ipynb").write_text(notebook)
+    runner = NotebookRunner(directory=str(tmp_path))
+    converted = runner.stream_python_files(jobs=jobs, queue_size=2)
+    next(converted)
+    time.sleep(0.5)
+    # converted ahead: the queue, the workers and the one waiting for room in the queue
+    assert len(list(tmp_path.glob("*.py"))) <= 1 + 2 + jobs + 1
+    converted.close()
+
+
+def test_run_files_pipelined_conversion_error(tmp_path: Path) -> None:
+    for name in ["a", "b"]:
+        (tmp_path / f"{name}.ipynb").write_text(
+            Path("test_notebooks/normal.ipynb").read_text()
+        )
+    # b.py already exists and cannot be overwritten
+    (tmp_path / "b.py").write_text("")
+    runner = NotebookRunner(directory=str(tmp_path))
+    with pytest.raises(ValueError, match="already exist"):
+        runner.run(jobs=1, files=runner.stream_python_files())
+
+
+def test_convert_files_with_cache(tmp_path: Path) -> None:
+    runner = NotebookRunner(directory="test_notebooks/", cache_dir=str(tmp_path))
+    try:
+        runner.write_python_files(overwrite=True)
+        converted = list(runner._files_to_exec)
+        runner = NotebookRunner(directory="test_notebooks/", cache_dir=str(tmp_path))
+        # unchanged notebooks are served from the cache, so nothing is overwritten
+        runner.write_python_files()
+        assert runner._files_to_exec == converted
+        Path(converted[0]).write_text("print('edited')")
+        runner = NotebookRunner(directory="test_notebooks/", cache_dir=str(tmp_path))
+        with pytest.raises(ValueError):
+            runner.write_python_files()
+    finally:
+        for file in converted:
+            if Path(file).exists():
+                os.remove(file)
+
+
+def test_run_files_changed_only(runner: NotebookRunner, tmp_path: Path) -> None:
+    runner.cache_dir = str(tmp_path)
+    runner.write_python_files(overwrite=True)
+    try:
+        passed, _ = runner.run(changed_only=True)
+        assert not any(p["cached"] for p in passed)
+        passed, failed = runner.run(changed_only=True)
+        assert len(failed) == 0
+        assert all(p["cached"] for p in passed)
+        assert [p["file"] for p in passed] == runner._files_to_exec
+        passed, _ = runner.run(changed_only=True, lockfile="uv.lock")
+        assert not any(p["cached"] for p in passed)
+    finally:
+        for file in runner._files_to_exec:
+            if Path(file).exists():
+                os.remove(file)
+
+
+def test_convert_files_parallel(runner: NotebookRunner) -> None:
+    runner.write_python_files(overwrite=True)
+    serial = {f: Path(f).read_text() for f in runner._files_to_exec}
+    order = list(runner._files_to_exec)
+    runner._files_to_exec = []
+    try:
+        runner.write_python_files(overwrite=True, jobs=2)
+        assert runner._files_to_exec == order
+        assert {f: Path(f).read_text() for f in runner._files_to_exec} == serial
+        with pytest.raises(ValueError):
+            runner.write_python_files(jobs=2)
+    finally:
+        for file in order:
+            if Path(file).exists():
+                os.remove(file)
+
+
+def test_run_files_log_tail(tmp_path: Path) -> None:
+    notebook = tmp_path / "chatty.ipynb"
+    notebook.write_text(
+        json.dumps(
+            {
+                "cells": [
+                    {
+                        "cell_type": "code",
+                        "source": [
+                            "print('x' * 10000)\n",
+                            "print('last line')",
+                        ],
+                    }
+                ]
+            }
+        )
+    )
+    runner = NotebookRunner(file_paths=[str(notebook)])
+    runner.write_python_files()
+    log_dir = tmp_path / "logs"
+    passed, failed = runner.run(log_dir=str(log_dir), log_tail=100)
+    assert len(passed) == 1 and len(failed) == 0
+    assert passed[0]["logs"].endswith("last line\n")
+    assert len(passed[0]["logs"]) < 200
+    log_file = passed[0]["log_file"]
+    assert log_file is not None and Path(log_file).parent == log_dir
+    assert Path(log_file).stat().st_size > 10000
+
+
+def test_run_files_temporary_logs(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # without a log directory, the logs are written to a temporary one removed after the run
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    notebooks = [
+        _write_notebook(tmp_path / "ok.ipynb", "print('ok')"),
+        _write_notebook(tmp_path / "ko.ipynb", "raise RuntimeError('boom')"),
+    ]
+    runner = NotebookRunner(file_paths=notebooks)
+    runner.write_python_files(in_memory=True)
+    passed, failed = runner.run()
+    assert "boom" in failed[0]["logs"]
+    assert passed[0]["log_file"] is None and failed[0]["log_file"] is None
+    assert list(tmp_path.glob("test_nb_logs_*")) == []
+
+
+def test_run_files_fork_server(runner: NotebookRunner) -> None:
+    runner.write_python_files(overwrite=True)
+    try:
+        passed, failed = runner.run(fork_server=True, preload=["json"])
+        assert len(failed) == 0
+        assert len(passed) == 3
+    finally:
+        for file in runner._files_to_exec:
+            if Path(file).exists():
+                os.remove(file)
+
+
+@pytest.mark.parametrize("fork_server", [False, True])
+def test_run_files_in_memory(runner: NotebookRunner, fork_server: bool) -> None:
+    runner.write_python_files(in_memory=True)
+    assert len(runner._files_to_exec) == len(runner.files)
+    assert not any(Path(f).exists() for f in runner._files_to_exec)
+    passed, failed = runner.run(fork_server=fork_server)
+    assert len(failed) == 0
+    assert len(passed) == 3
+    assert not any(Path(f).exists() for f in runner._files_to_exec)
+
+
+def test_run_files_metrics(runner: NotebookRunner) -> None:
+    runner.write_python_files(in_memory=True)
+    passed, _ = runner.run(slowest=2)
+    for result in passed:
+        assert result["duration"] > 0
+        assert result["cpu_user"] is not None and result["cpu_system"] is not None
+        assert result["max_rss"] is not None and result["max_rss"] > 1 << 20
+
+
+def _write_notebook(path: Path, *sources: str) -> str:
+    path.write_text(
+        json.dumps(
+            {"cells": [{"cell_type": "code", "source": [src]} for src in sources]}
+        )
+    )
+    return str(path)
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+@pytest.mark.parametrize("fork_server", [False, True])
+def test_run_files_timeout(tmp_path: Path, fork_server: bool) -> None:
+    pid_file = tmp_path / "pid"
+    notebook = _write_notebook(
+        tmp_path / "slow.ipynb", f"!sh -c 'echo $$ > {pid_file}; exec sleep 30' & wait"
+    )
+    runner = NotebookRunner(file_paths=[notebook])
+    runner.write_python_files(in_memory=True)
+    succ, fail = runner.run(timeout=1, fork_server=fork_server)
+    assert succ == []
+    assert [(f["file"], f["status"]) for f in fail] == [
+        (notebook.replace(".ipynb", ".py"), "timeout")
+    ]
+    # the shell spawned by the notebook was killed with it
+    pid = int(pid_file.read_text())
+    for _ in range(50):
+        if not _is_alive(pid):
+            break
+        time.sleep(0.1)
+    assert not _is_alive(pid)
+
+
+@pytest.mark.parametrize("fork_server", [False, True])
+def test_run_files_limits(tmp_path: Path, fork_server: bool) -> None:
+    memory = _write_notebook(tmp_path / "memory.ipynb", "data = bytearray(1 << 30)")
+    cpu = _write_notebook(tmp_path / "cpu.ipynb", "while True: pass")
+    runner = NotebookRunner(file_paths=[memory, cpu])
+    runner.write_python_files(in_memory=True)
+    succ, fail = runner.run(
+        max_memory=512 << 20, max_cpu=1, timeout=30, fork_server=fork_server
+    )
+    assert succ == []
+    results = {Path(f["file"]).stem: f for f in fail}
+    assert [f["status"] for f in results.values()] == ["failed", "failed"]
+    assert "MemoryError" in results["memory"]["logs"]
+    assert results["cpu"]["return_code"] in (-signal.SIGXCPU, -signal.SIGKILL)
+
+
+def test_run_files_time_budget(tmp_path: Path) -> None:
+    notebooks = [
+        _write_notebook(tmp_path / f"{i}.ipynb", "import time; time.sleep(30)")
+        for i in range(2)
+    ]
+    runner = NotebookRunner(file_paths=notebooks)
+    runner.write_python_files(in_memory=True)
+    start = time.monotonic()
+    succ, fail = runner.run(jobs=1, time_budget=1)
+    assert time.monotonic() - start < 10
+    assert succ == []
+    # the second notebook was never started, it still counts as a failure
+    assert [f["status"] for f in fail] == ["timeout", "out_of_budget"]
+    assert "time budget" in fail[1]["logs"]
+    with pytest.raises(ValueError, match="positive"):
+        runner.run(time_budget=0)
+
+
+@pytest.mark.parametrize("fork_server", [False, True])
+def test_run_files_profile_cells(fork_server: bool) -> None:
+    runner = NotebookRunner(
+        file_paths=["test_notebooks/with_bash.ipynb"], profile_cells=True
+    )
+    runner.write_python_files(in_memory=True)
+    script = runner._scripts[runner._files_to_exec[0]]
+    assert "\t_test_nb_probe(0)\n" in script
+    assert "\t_test_nb_probe(2)\n" not in script  # markdown cell
+    passed, _ = runner.run(fork_server=fork_server)
+    assert len(passed) == 1
+    assert [t["cell"] for t in runner.cell_timings] == [0, 1, 3]
+    for timing in runner.cell_timings:
+        assert timing["file"] == runner._files_to_exec[0]
+        assert timing["duration"] >= 0
+
+
+def test_lazy_discovery(tmp_path: Path) -> None:
+    for name in ["a", "b", "c"]:
+        (tmp_path / f"{name}.ipynb").write_text(
+            Path("test_notebooks/normal.ipynb").read_text()
+        )
+    runner = NotebookRunner(directory=str(tmp_path))
+    # the walk is only resumed when the notebooks are consumed
+    assert runner._files == [] and runner._pending_files is not None
+    runner.write_python_files(in_memory=True)
+    assert runner.files == [str(tmp_path / f"{n}.ipynb") for n in ["a", "b", "c"]]
+    assert len(runner._files_to_exec) == 3
+
+
+def test_files_setter(tmp_path: Path) -> None:
+    for name in ["a", "b"]:
+        (tmp_path / f"{name}.ipynb").write_text(
+            Path("test_notebooks/normal.ipynb").read_text()
+        )
+    runner = NotebookRunner(directory=str(tmp_path))
+    runner.files = [str(tmp_path / "b.ipynb")]
+    runner.write_python_files(in_memory=True)
+    assert runner.files == [str(tmp_path / "b.ipynb")]
+    assert len(runner._files_to_exec) == 1
+
+
+def test_run_files_schedule_fail_fast(tmp_path: Path) -> None:
+    for name, code in [("a", "pass"), ("b", "raise ValueError()"), ("c", "pass")]:
+        (tmp_path / f"{name}.ipynb").write_text(
+            json.dumps({"cells": [{"cell_type": "code", "source": [code]}]})
+        )
+    runner = NotebookRunner(directory=str(tmp_path))
+    timings = {str(tmp_path / "b.ipynb"): {"duration": 1.0, "passed": False}}
+    runner.schedule("failed-first", timings)
+    assert [Path(f).name for f in runner.files] == ["b.ipynb", "a.ipynb", "c.ipynb"]
+    runner.write_python_files(in_memory=True)
+    passed, failed = runner.run(jobs=1, fail_fast=True)
+    assert [Path(f["file"]).name for f in failed] == ["b.py"]
+    assert passed == []
+
+
+@pytest.mark.parametrize("fork_server", [False, True])
+def test_run_files_shell_session(tmp_path: Path, fork_server: bool) -> None:
+    (tmp_path / "sub").mkdir()
+    notebook = tmp_path / "shell.ipynb"
+    notebook.write_text(
+        json.dumps(
+            {
+                "cells": [
+                    {
+                        "cell_type": "code",
+                        "source": [
+                            "%%bash\n",
+                            f"cd {tmp_path / 'sub'}\n",
+                            "export X=42",
+                        ],
+                    },
+                    {
+                        "cell_type": "code",
+                        "source": ['!echo "value=$X in $(basename $PWD)"'],
+                    },
+                    {"cell_type": "code", "source": ["!false\n", "print('done')"]},
+                ]
+            }
+        )
+    )
+    runner = NotebookRunner(file_paths=[str(notebook)], shell_session=True)
+    runner.write_python_files(in_memory=True)
+    script = runner._scripts[runner._files_to_exec[0]]
+    assert "subprocess.run(" not in script.split("_test_nb_shell_atexit.register")[1]
+    passed, failed = runner.run(fork_server=fork_server, log_dir=str(tmp_path / "logs"))
+    assert not failed
+    stdout = Path(passed[0]["log_file"]).read_text()  # type: ignore[arg-type]
+    assert stdout.splitlines() == ["value=42 in sub", "done"]
+    stderr = Path(passed[0]["log_file"].replace(".stdout.", ".stderr."))  # type: ignore[union-attr]
+    assert "Shell command exited with code 1: false" in stderr.read_text()
+
+
+def test_arun_streams_results(tmp_path: Path) -> None:
+    slow = _write_notebook(tmp_path / "a_slow.ipynb", "import time; time.sleep(1)")
+    fast = _write_notebook(tmp_path / "b_fast.ipynb", "print('fast')")
+    broken = _write_notebook(tmp_path / "c_broken.ipynb", "raise ValueError('boom')")
+    runner = NotebookRunner(file_paths=[slow, fast, broken])
+    runner.write_python_files(in_memory=True)
+
+    async def collect() -> list:
+        return [result async for result in runner.arun(jobs=3)]
+
+    results = asyncio.run(collect())
+    # results come in completion order, not discovery order
+    assert [Path(r["file"]).stem for r in results][-1] == "a_slow"
+    by_name = {Path(r["file"]).stem: r for r in results}
+    assert by_name["b_fast"]["return_code"] == 0
+    assert "fast" in by_name["b_fast"]["logs"]
+    assert by_name["c_broken"]["return_code"] == 1
+    assert "ValueError: boom" in by_name["c_broken"]["logs"]
+
+
+def test_arun_timeout_and_cancellation(tmp_path: Path) -> None:
+    pid_file = tmp_path / "pid"
+    notebooks = [
+        _write_notebook(tmp_path / "a.ipynb", "import time; time.sleep(30)"),
+        _write_notebook(
+            tmp_path / "b.ipynb", f"!sh -c 'echo $$ > {pid_file}; exec sleep 30'"
+        ),
+    ]
+    runner = NotebookRunner(file_paths=notebooks)
+    runner.write_python_files(in_memory=True)
+
+    async def first(timeout: float | None) -> dict:
+        results = runner.arun(jobs=1, timeout=timeout)
+        result = await anext(results)
+        await results.aclose()
+        return result  # type: ignore[return-value]
+
+    result = asyncio.run(first(0.5))
+    assert result["status"] == "timeout"
+
+    async def cancel() -> None:
+        task = asyncio.create_task(first(None))
+        while not pid_file.exists() or not pid_file.read_text():
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    runner._files_to_exec.reverse()
+    asyncio.run(cancel())
+    pid = int(pid_file.read_text())
+    for _ in range(50):
+        if not _is_alive(pid):
+            break
+        time.sleep(0.1)
+    assert not _is_alive(pid)
+
+
+@pytest.mark.parametrize("fork_server", [False, True])
+def test_run_files_profile(
+    tmp_path: Path, fork_server: bool, capsys: pytest.CaptureFixture[str]
+) -> None:
+    notebooks = [
+        _write_notebook(tmp_path / f"{i}.ipynb", "import time; time.sleep(0.2)")
+        for i in range(2)
+    ]
+    runner = NotebookRunner(file_paths=notebooks)
+    runner.write_python_files(in_memory=True)
+    log_dir = tmp_path / "logs"
+    succ, _ = runner.run(
+        profile="cprofile", fork_server=fork_server, log_dir=str(log_dir)
+    )
+    assert len(succ) == 2
+    assert len(list(log_dir.glob("*.py.pstats"))) == 2
+    assert (log_dir / "suite.pstats").exists()
+    report = capsys.readouterr().out.split("Top functions by cumulative time:")[1]
+    first = report.strip().splitlines()[0]
+    assert "time.sleep" in first and "in    2 notebooks" in first
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_run_files_preflight(
+    tmp_path: Path, in_memory: bool, capsys: pytest.CaptureFixture[str]
+) -> None:
+    marker = tmp_path / "ran"
+    notebooks = [
+        _write_notebook(tmp_path / "a.ipynb", "x = (1,"),
+        _write_notebook(
+            tmp_path / "b.ipynb",
+            "import no_such_module",
+            f"open({str(marker)!r}, 'w').close()",
+        ),
+        _write_notebook(tmp_path / "c.ipynb", "import json"),
+    ]
+    runner = NotebookRunner(file_paths=notebooks)
+    runner.write_python_files(in_memory=in_memory)
+    log_dir = tmp_path / "logs"
+    succ, fail = runner.run(preflight=True, log_dir=str(log_dir))
+    assert [Path(s["file"]).stem for s in succ] == ["c"]
+    assert [(Path(f["file"]).stem, f["status"]) for f in fail] == [
+        ("a", "preflight"),
+        ("b", "preflight"),
+    ]
+    # rejected notebooks are not run, their error is in their logs
+    assert not marker.exists()
+    assert "no_such_module" in Path(fail[1]["log_file"]).read_text()
+    assert "FAILED PRE-FLIGHT" in capsys.readouterr().out
+    # scripts streamed to `run` are checked one by one
+    runner = NotebookRunner(file_paths=notebooks)
+    converted = runner.stream_python_files(overwrite=True, in_memory=in_memory)
+    _, fail = runner.run(preflight=True, files=converted, fail_fast=True, jobs=1)
+    assert [(Path(f["file"]).stem, f["status"]) for f in fail] == [("a", "preflight")]
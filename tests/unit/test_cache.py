@@ -0,0 +1,65 @@
+import os
+
+from pathlib import Path
+from test_nb.cache import ConversionCache, ResultCache, TimingsStore
+
+
+def test_conversion_cache_key() -> None:
+    key = ConversionCache.key("abc", markdown_as_comment=False, exclude_env=False)
+    assert key == ConversionCache.key(
+        "abc", exclude_env=False, markdown_as_comment=False
+    )
+    assert key != ConversionCache.key(
+        "abc", markdown_as_comment=True, exclude_env=False
+    )
+    assert key != ConversionCache.key(
+        "abd", markdown_as_comment=False, exclude_env=False
+    )
+
+
+def test_conversion_cache_roundtrip(tmp_path: Path) -> None:
+    output = tmp_path / "notebook.py"
+    output.write_text("print('hello')")
+    cache = ConversionCache(str(tmp_path / "cache"))
+    assert cache.get("notebook.ipynb") is None
+    cache.store("notebook.ipynb", "key", str(output), ["numpy"])
+    cache.save()
+    assert os.path.exists(cache.path)
+    cache = ConversionCache(str(tmp_path / "cache"))
+    entry = cache.get("notebook.ipynb")
+    assert entry is not None
+    assert entry["output"] == str(output) and entry["requirements"] == ["numpy"]
+    assert ConversionCache.is_fresh(entry, "key")
+    assert not ConversionCache.is_fresh(entry, "other-key")
+    output.write_text("print('hello world')")
+    assert not ConversionCache.is_fresh(entry, "key")
+
+
+def test_result_cache_roundtrip(tmp_path: Path) -> None:
+    key = ResultCache.key("script-hash", "python3")
+    assert key != ResultCache.key("script-hash", "python3", "lock-hash")
+    assert key != ResultCache.key("script-hash", "python3.13")
+    cache = ResultCache(str(tmp_path))
+    assert not cache.passed(key)
+    cache.store(key, "notebook.py", True)
+    cache.store("failed-key", "other.py", False)
+    cache.save()
+    cache = ResultCache(str(tmp_path))
+    assert cache.passed(key)
+    assert not cache.passed("failed-key")
+
+
+def test_timings_store_roundtrip(tmp_path: Path) -> None:
+    timings = TimingsStore(str(tmp_path))
+    assert timings.get("notebooks/a.ipynb") is None
+    timings.store("notebooks/a.ipynb", 2.5, True)
+    timings.store("./notebooks/b.ipynb", 1.0, False)
+    timings.save()
+    timings = TimingsStore(path=timings.path)
+    assert timings.get(os.path.abspath("notebooks/a.ipynb")) == {
+        "duration": 2.5,
+        "passed": True,
+    }
+    assert timings.durations(["notebooks/b.ipynb", "notebooks/c.ipynb"]) == {
+        "notebooks/b.ipynb": 1.0
+    }
@@ -0,0 +1,138 @@
+import json
+import sys
+from pathlib import Path
+
+from test_nb.deps import (
+    canonical_name,
+    conflicting_requirements,
+    dedup_requirements,
+    install_command,
+    missing_requirements,
+    parse_install,
+    strip_installs,
+)
+from test_nb.models import TranslatedCell
+from test_nb.run import NotebookRunner
+
+
+def test_parse_install() -> None:
+    assert parse_install("pip install -q numpy 'pandas>=2'") == ["numpy", "pandas>=2"]
+    assert parse_install("python3 -m pip install -U requests") == ["requests"]
+    assert parse_install("uv pip install polars") == ["polars"]
+    assert parse_install("pip install -r requirements.txt") is None
+    assert parse_install("pip install --index-url http://x numpy") is None
+    assert parse_install("pip show numpy") is None
+    assert parse_install("echo pip install numpy") is None
+    assert parse_install("pip install \"numpy; python_version<'4'\"") == [
+        "numpy; python_version<'4'"
+    ]
+    # shell syntax: the command has to run in the notebook
+    assert parse_install("pip install -q termcolor > /dev/null") is None
+    assert parse_install("pip install numpy 2>/dev/null") is None
+    assert parse_install("pip install numpy; echo done") is None
+    assert parse_install("pip install numpy | tail -1") is None
+    assert parse_install("pip install numpy>=1") is None
+    assert parse_install("pip install numpy==$VERSION") is None
+    assert parse_install("pip install numpy==`cat version`") is None
+    # paths and URLs are resolved from the directory of the notebook
+    assert parse_install("pip install ./pkg") is None
+    assert parse_install("pip install ../pkg numpy") is None
+    assert parse_install("pip install git+https://github.com/org/pkg") is None
+    assert parse_install("pip install 'pkg @ https://example.com/pkg.zip'") is None
+    assert parse_install("pip install pkg-1.0-py3-none-any.whl") is None
+
+
+def test_strip_installs() -> None:
+    cells: list[TranslatedCell] = [
+        {
+            "index": 0,
+            "cell_type": "code",
+            "shell": "pip install numpy && echo done && pip install -q Pandas",
+            "code": ["import numpy\n"],
+            "comments": [],
+        },
+        {
+            "index": 1,
+            "cell_type": "code",
+            "shell": "pip install numpy",
+            "code": [],
+            "comments": [],
+        },
+        {
+            "index": 2,
+            "cell_type": "code",
+            "shell": "pip install -q termcolor > /dev/null && pip install numpy; echo done",
+            "code": [],
+            "comments": [],
+        },
+        {
+            "index": 3,
+            "cell_type": "code",
+            "shell": "pip install ./pkg && pip install git+https://github.com/org/pkg",
+            "code": [],
+            "comments": [],
+        },
+    ]
+    requirements = strip_installs(cells)
+    assert requirements == ["numpy", "Pandas", "numpy"]
+    assert dedup_requirements(requirements + ["pandas"]) == ["numpy", "Pandas"]
+    assert cells[0]["shell"] == "echo done"
+    assert cells[1]["shell"] is None
+    assert cells[2]["shell"] == (
+        "pip install -q termcolor > /dev/null && pip install numpy; echo done"
+    )
+    assert cells[3]["shell"] == (
+        "pip install ./pkg && pip install git+https://github.com/org/pkg"
+    )
+
+
+def test_missing_requirements() -> None:
+    requirements = ["pytest", "pytest>=10000", "surely-not-installed-package", "click"]
+    assert missing_requirements(requirements, [sys.executable]) == [
+        "pytest>=10000",
+        "surely-not-installed-package",
+    ]
+    assert missing_requirements([], [sys.executable]) == []
+
+
+def test_install_command_offline() -> None:
+    command = install_command(["numpy"], ["/venv/bin/python"], wheelhouse="wheels")
+    assert command[-4:] == ["--no-index", "--find-links", "wheels", "numpy"]
+
+
+def test_requirements_by_project() -> None:
+    assert canonical_name("Foo_Bar.baz[extra]>=1") == "foo-bar-baz"
+    assert dedup_requirements(["foo_bar==1", "Foo-Bar == 1", "foo-bar==2"]) == [
+        "foo_bar==1",
+        "foo-bar==2",
+    ]
+    assert conflicting_requirements(
+        ["pandas==1.5", "numpy", "Pandas==2.0", "NumPy", "requests[socks]", "requests"]
+    ) == {"pandas", "requests"}
+
+
+def test_conflicting_installs_stay_in_notebooks(tmp_path: Path) -> None:
+    for name, install in [
+        ("a", "pandas==1.5 numpy"),
+        ("b", "pandas==2.0"),
+        ("c", "numpy tqdm"),
+    ]:
+        (tmp_path / f"{name}.ipynb").write_text(
+            json.dumps(
+                {
+                    "cells": [
+                        {"cell_type": "code", "source": [f"!pip install {install}"]}
+                    ]
+                }
+            )
+        )
+    runner = NotebookRunner(directory=str(tmp_path), strip_installs=True)
+    runner.write_python_files(in_memory=True)
+    assert conflicting_requirements(runner.requirements) == {"pandas"}
+    runner._restore_installs({"pandas"})
+    # only the requirements of the notebooks without conflicts are hoisted
+    assert runner.requirements == ["numpy", "tqdm"]
+    scripts = {Path(f).stem: script for f, script in runner._scripts.items()}
+    assert "pip install pandas==1.5 numpy" in scripts["a"]
+    assert "pip install pandas==2.0" in scripts["b"]
+    assert "pip install" not in scripts["c"]
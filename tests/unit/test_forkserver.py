@@ -0,0 +1,101 @@
+import pytest
+import shutil
+import signal
+import subprocess
+import sys
+
+from pathlib import Path
+from test_nb.forkserver import ForkServer, limits_command
+
+
+@pytest.fixture()
+def server():
+    with ForkServer([sys.executable], ["json"]) as server:
+        yield server
+
+
+def test_fork_server_run(server: ForkServer, tmp_path: Path) -> None:
+    script = tmp_path / "script.py"
+    script.write_text(
+        "import json, sys\nprint(json.dumps({'a': 1}))\nprint('oops', file=sys.stderr)\nsys.exit(2)"
+    )
+    stdout, stderr = tmp_path / "out.log", tmp_path / "err.log"
+    return_code, usage = server.run(str(script), str(stdout), str(stderr))
+    assert return_code == 2
+    assert usage is not None and usage[2] > 0
+    assert stdout.read_text() == '{"a": 1}\n'
+    assert stderr.read_text() == "oops\n"
+
+
+def test_fork_server_isolation(server: ForkServer, tmp_path: Path) -> None:
+    script = tmp_path / "script.py"
+    script.write_text(
+        "import json\nassert not hasattr(json, 'mutated')\njson.mutated = True\nraise RuntimeError('boom')"
+    )
+    stdout, stderr = tmp_path / "out.log", tmp_path / "err.log"
+    for _ in range(2):
+        assert server.run(str(script), str(stdout), str(stderr))[0] == 1
+        assert "RuntimeError: boom" in stderr.read_text()
+
+
+def test_fork_server_sys_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # modules are found in PYTHONPATH and next to the script, as when running `python script.py`
+    (tmp_path / "lib").mkdir()
+    (tmp_path / "lib" / "from_pythonpath.py").write_text("")
+    (tmp_path / "from_script_dir.py").write_text("")
+    monkeypatch.setenv("PYTHONPATH", str(tmp_path / "lib"))
+    script = tmp_path / "script.py"
+    script.write_text("import from_pythonpath, from_script_dir")
+    stdout, stderr = tmp_path / "out.log", tmp_path / "err.log"
+    with ForkServer([sys.executable]) as server:
+        assert server.run(str(script), str(stdout), str(stderr))[0] == 0, (
+            stderr.read_text()
+        )
+
+
+def test_fork_server_timeout(server: ForkServer, tmp_path: Path) -> None:
+    script = tmp_path / "script.py"
+    script.write_text("import time\ntime.sleep(30)")
+    stdout, stderr = tmp_path / "out.log", tmp_path / "err.log"
+    with pytest.raises(subprocess.TimeoutExpired):
+        server.run(str(script), str(stdout), str(stderr), timeout=0.2)
+
+
+def test_limits_command() -> None:
+    command = limits_command(
+        [sys.executable],
+        ["-c", "import resource; print(resource.getrlimit(resource.RLIMIT_CPU)[0])"],
+        None,
+        5,
+    )
+    process = subprocess.run(command, capture_output=True, text=True, check=True)
+    assert process.stdout == "5\n"
+
+
+def test_fork_server_bad_preload() -> None:
+    # the error of the server is part of the message
+    with pytest.raises(RuntimeError, match="No module named 'surely_not_an"):
+        ForkServer([sys.executable], ["surely_not_an_installed_module"])
+
+
+def _older_python() -> str | None:
+    # oldest interpreter available among those older than the package supports
+    for version in ("3.8", "3.9"):
+        python = shutil.which(f"python{version}")
+        if python is not None and subprocess.run([python, "-c", ""]).returncode == 0:
+            return python
+    return None
+
+
+@pytest.mark.skipif(_older_python() is None, reason="no python3.8 or 3.9 interpreter")
+def test_fork_server_older_python(tmp_path: Path) -> None:
+    script = tmp_path / "script.py"
+    script.write_text("import sys\nprint(sys.version_info[:2])\nsys.exit(3)")
+    killed = tmp_path / "killed.py"
+    killed.write_text("import os, signal\nos.kill(os.getpid(), signal.SIGTERM)")
+    stdout, stderr = tmp_path / "out.log", tmp_path / "err.log"
+    with ForkServer([str(_older_python())]) as server:
+        assert server.run(str(script), str(stdout), str(stderr))[0] == 3
+        version = stdout.read_text()
+        assert server.run(str(killed), str(stdout), str(stderr))[0] == -signal.SIGTERM
+    assert version in ("(3, 8)\n", "(3, 9)\n")
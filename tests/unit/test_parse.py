@@ -1,7 +1,7 @@
 import pytest
 
-from test_nb.parse import extract_bash, extract_code
-from test_nb.models import CodeCell
+from test_nb.parse import build_script, extract_bash, extract_code, translate_cells
+from test_nb.models import CodeCell, NotebookCell
 
 
 @pytest.fixture()
@@ -100,3 +100,44 @@ def test_parsing_utils_with_code_and_bash(
     for item in code_cell_with_code_and_bash["source"]:
         if not item.startswith("!") and not item.startswith("%"):
             assert "\t" + item in code
+
+
+def test_translate_cells() -> None:
+    cells: list[NotebookCell] = [
+        {"cell_type": "markdown", "source": ["# Title\n", "\n", "text"]},
+        {"cell_type": "code", "source": ["!echo 'hi'\n", "x = 1\n", "\n", "print(x)"]},
+        {"cell_type": "raw", "source": ["ignored"]},
+        {"cell_type": "code", "source": []},
+    ]
+    assert translate_cells(cells, markdown_as_comment=True) == [
+        {
+            "index": 0,
+            "cell_type": "markdown",
+            "shell": None,
+            "code": [],
+            "comments": ["# Title\n", "text"],
+        },
+        {
+            "index": 1,
+            "cell_type": "code",
+            "shell": "echo 'hi'",
+            "code": ["x = 1\n", "print(x)"],
+            "comments": [],
+        },
+        {"index": 3, "cell_type": "code", "shell": None, "code": [], "comments": []},
+    ]
+    assert build_script(
+        cells,
+        {
+            "markdown_as_comment": True,
+            "exclude_env": False,
+            "profile_cells": False,
+            "shell_session": False,
+        },
+    ) == (
+        "import subprocess\nimport asyncio\n\nasync def main():\n"
+        "\t# # Title\n\n\t# text\n"
+        "\tsubprocess.run('echo \\'hi\\'', shell=True)\n"
+        "\tx = 1\n\tprint(x)\n"
+        "\n\nasyncio.run(main())"
+    )
@@ -0,0 +1,78 @@
+import sys
+from pathlib import Path
+
+from test_nb.models import TranslatedCell
+from test_nb.parse import emit_script
+from test_nb.preflight import Preflight
+
+
+def _script(*cells: tuple[str | None, str]) -> str:
+    translated: list[TranslatedCell] = [
+        {
+            "index": i,
+            "cell_type": "code",
+            "comments": [],
+            "shell": shell,
+            "code": [line + "\n" for line in code.splitlines()],
+        }
+        for i, (shell, code) in enumerate(cells)
+    ]
+    return emit_script(translated)
+
+
+def test_preflight(tmp_path: Path) -> None:
+    (tmp_path / "helpers.py").write_text("")
+    (tmp_path / "lib").mkdir()
+    (tmp_path / "lib" / "helper_in_lib.py").write_text("")
+    on_disk = tmp_path / "on_disk.py"
+    on_disk.write_text(_script((None, "import helpers\nimport json.decoder")))
+    scripts = [
+        (str(on_disk), None),
+        (str(tmp_path / "syntax.py"), _script((None, "x = (1,"))),
+        (
+            str(tmp_path / "missing.py"),
+            _script((None, "import os\nfrom no_such_module import x")),
+        ),
+        # only the imports before the first other statement of the cells are checked
+        (
+            str(tmp_path / "optional.py"),
+            _script(
+                (
+                    None,
+                    "try:\n    import no_such_module\nexcept ImportError:\n    pass",
+                ),
+                ("pip install no_such_module", "import no_such_module"),
+            ),
+        ),
+        # passes once its `lib` directory is in sys.path
+        (
+            str(tmp_path / "path.py"),
+            _script(
+                (
+                    None,
+                    "import os\nimport sys\n"
+                    "sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'lib'))\n"
+                    "import helper_in_lib",
+                )
+            ),
+        ),
+    ]
+    checker = Preflight([sys.executable])
+    try:
+        errors = checker.check(scripts)
+        assert errors[0] is None and errors[3] is None and errors[4] is None
+        assert errors[1] is not None and "SyntaxError" in errors[1]
+        assert (
+            errors[2]
+            == "ModuleNotFoundError: No module named 'no_such_module' (line 6)\n"
+        )
+        # the probe keeps answering
+        assert checker.check(scripts[:1]) == [None]
+    finally:
+        checker.close()
+
+
+def test_preflight_without_probe(tmp_path: Path) -> None:
+    checker = Preflight([str(tmp_path / "no-python")])
+    assert checker.check([("a.py", "x = (1,")]) == [None]
+    checker.close()
@@ -0,0 +1,75 @@
+import cProfile
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+import pytest
+
+from test_nb.profiler import aggregate_profiles, run_profiled
+from test_nb.run import PROFILER_SCRIPT
+
+
+def _slow() -> None:
+    time.sleep(0.05)
+
+
+def _profile(path: Path, calls: int) -> str:
+    def run() -> None:
+        for _ in range(calls):
+            _slow()
+
+    run_profiled(run, "cprofile", str(path))
+    return str(path)
+
+
+def test_aggregate_profiles(tmp_path: Path) -> None:
+    paths = [_profile(tmp_path / f"{i}.pstats", i + 1) for i in range(2)]
+    merged = tmp_path / "suite.pstats"
+    top = aggregate_profiles(paths, top=50, output=str(merged))
+    assert merged.exists()
+    by_name = {entry["function"].rsplit("(", 1)[-1].rstrip(")"): entry for entry in top}
+    slow = by_name["_slow"]
+    assert slow["notebooks"] == 2
+    assert slow["cumulative"] >= 0.15
+    assert [entry["cumulative"] for entry in top] == sorted(
+        (entry["cumulative"] for entry in top), reverse=True
+    )
+    # frames of the profiled scripts are left out
+    top = aggregate_profiles(paths, scripts={__file__}, top=50)
+    assert all(not entry["function"].startswith(__file__) for entry in top)
+
+
+def test_run_profiled_saves_on_error(tmp_path: Path) -> None:
+    def fail() -> None:
+        raise SystemExit(3)
+
+    output = tmp_path / "out.pstats"
+    try:
+        run_profiled(fail, "cprofile", str(output))
+    except SystemExit as e:
+        assert e.code == 3
+    assert output.exists()
+    cProfile.Profile().dump_stats(str(tmp_path / "empty.pstats"))
+    assert aggregate_profiles([str(tmp_path / "empty.pstats")]) == []
+
+
+def _python39() -> str | None:
+    python = shutil.which("python3.9")
+    if python is None or subprocess.run([python, "-c", ""]).returncode != 0:
+        return None
+    return python
+
+
+@pytest.mark.skipif(_python39() is None, reason="no python3.9 interpreter")
+def test_profiler_script_older_python(tmp_path: Path) -> None:
+    script = tmp_path / "script.py"
+    script.write_text("print('ok')")
+    output = tmp_path / "script.pstats"
+    process = subprocess.run(
+        [str(_python39()), PROFILER_SCRIPT, "cprofile", str(output), str(script)],
+        capture_output=True,
+        text=True,
+    )
+    assert process.returncode == 0, process.stderr
+    assert process.stdout == "ok\n" and output.exists()
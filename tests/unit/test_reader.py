@@ -0,0 +1,105 @@
+import json
+import pytest
+import time
+
+from pathlib import Path
+from test_nb import reader
+from test_nb.reader import read_cells
+
+
+@pytest.fixture()
+def notebook_with_outputs(tmp_path: Path) -> Path:
+    path = tmp_path / "outputs.ipynb"
+    path.write_text(
+        json.dumps(
+            {
+                "metadata": {"kernelspec": {"name": "python3"}},
+                "cells": [
+                    {
+                        "cell_type": "markdown",
+                        "attachments": {"image.png": {"image/png": "A" * 100_000}},
+                        "source": "# Title\nsome text",
+                    },
+                    {
+                        "cell_type": "code",
+                        "execution_count": 1,
+                        "metadata": {"tags": ["a]b}c"]},
+                        "outputs": [
+                            {
+                                "output_type": "display_data",
+                                "data": {"text/plain": ['"quoted\\" [text]', "{"]},
+                            }
+                        ],
+                        "source": ["print('hello')\n", "x = {'a': [1]}"],
+                    },
+                ],
+                "nbformat": 4,
+            }
+        )
+    )
+    return path
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_read_cells(notebook_with_outputs: Path, fast: bool) -> None:
+    cells = read_cells(str(notebook_with_outputs), fast=fast)
+    assert cells == [
+        {"cell_type": "markdown", "source": ["# Title\n", "some text"]},
+        {"cell_type": "code", "source": ["print('hello')\n", "x = {'a': [1]}"]},
+    ]
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_read_cells_matches_json(fast: bool) -> None:
+    for file in Path("test_notebooks").rglob("*.ipynb"):
+        data = json.loads(file.read_text())
+        expected = [
+            {"cell_type": c["cell_type"], "source": c["source"]} for c in data["cells"]
+        ]
+        assert read_cells(str(file), fast=fast) == expected
+
+
+def test_read_cells_small_chunks(
+    notebook_with_outputs: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    expected = read_cells(str(notebook_with_outputs), fast=False)
+    for size in (1, 3, 17):
+        monkeypatch.setattr(reader, "_CHUNK_SIZE", size)
+        assert read_cells(str(notebook_with_outputs), fast=False) == expected
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_read_cells_no_cells(tmp_path: Path, fast: bool) -> None:
+    path = tmp_path / "empty.ipynb"
+    path.write_text(json.dumps({"metadata": {}, "nbformat": 4}))
+    assert read_cells(str(path), fast=fast) is None
+
+
+def test_read_cells_truncated(tmp_path: Path) -> None:
+    path = tmp_path / "truncated.ipynb"
+    path.write_text('{"cells": [{"cell_type": "code", "outputs": ["abc')
+    with pytest.raises(ValueError):
+        read_cells(str(path), fast=False)
+
+
+def test_read_cells_escaped_outputs(tmp_path: Path) -> None:
+    # progress bars and colored logs: strings made of escapes, skipped in linear time
+    path = tmp_path / "progress.ipynb"
+    output = "\r\x1b[32m" * 100_000 + "\n" * 4_000_000
+    path.write_text(
+        json.dumps(
+            {
+                "cells": [
+                    {
+                        "cell_type": "code",
+                        "outputs": [{"output_type": "stream", "text": [output]}],
+                        "source": ["print('\\\\')"],
+                    }
+                ]
+            }
+        )
+    )
+    start = time.perf_counter()
+    cells = read_cells(str(path), fast=False)
+    assert time.perf_counter() - start < 1
+    assert cells == [{"cell_type": "code", "source": ["print('\\\\')"]}]
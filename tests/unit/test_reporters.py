@@ -0,0 +1,153 @@
+import json
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import pytest
+
+from test_nb.models import NotebookRunFailure, NotebookRunSuccess, RunSummary
+from test_nb.reporters import (
+    JsonlReporter,
+    JUnitXmlReporter,
+    SummaryReporter,
+    result_status,
+)
+
+
+def _success(file: str, duration: float, cached: bool = False) -> NotebookRunSuccess:
+    return {
+        "return_code": 0,
+        "logs": "ok\n",
+        "file": file,
+        "cached": cached,
+        "log_file": None,
+        "duration": duration,
+        "cpu_user": None,
+        "cpu_system": None,
+        "max_rss": None,
+    }
+
+
+def _failure(file: str, status: str = "failed") -> NotebookRunFailure:
+    return {
+        "return_code": 1 if status == "failed" else -9,
+        "status": status,  # type: ignore[typeddict-item]
+        "logs": "Traceback <boom> & \x1b[31mred\x1b[0m\n",
+        "file": file,
+        "log_file": f"{file}.stderr.log",
+        "duration": 2.0,
+        "cpu_user": 1.0,
+        "cpu_system": 0.5,
+        "max_rss": 1 << 20,
+    }
+
+
+RESULTS = [
+    _success("a.py", 1.0),
+    _success("b.py", 0.0, cached=True),
+    _failure("c.py"),
+    _failure("d.py", "timeout"),
+]
+SUMMARY: RunSummary = {
+    "log_dir": "logs",
+    "duration": 3.5,
+    "stopped": False,
+    "out_of_budget": False,
+    "cell_timings": [],
+    "profile": [],
+    "profile_file": None,
+}
+
+
+def test_result_status() -> None:
+    assert [result_status(r) for r in RESULTS] == [
+        "passed",
+        "cached",
+        "failed",
+        "timeout",
+    ]
+
+
+def test_jsonl_reporter(tmp_path: Path) -> None:
+    path = tmp_path / "results.jsonl"
+    reporter = JsonlReporter(str(path))
+    reporter.report(RESULTS[0], "a.ipynb")
+    # records are written as soon as notebooks finish
+    assert json.loads(path.read_text())["notebook"] == "a.ipynb"
+    for result in RESULTS[1:]:
+        reporter.report(result, result["file"].replace(".py", ".ipynb"))
+    reporter.summarize(SUMMARY)
+    reporter.close()
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["status"] for r in records] == ["passed", "cached", "failed", "timeout"]
+    assert records[2]["return_code"] == 1
+
+
+def test_junit_xml_reporter(tmp_path: Path) -> None:
+    path = tmp_path / "junit.xml"
+    reporter = JUnitXmlReporter(str(path))
+    reporter.report(RESULTS[0], "a.ipynb")
+    assert b'name="a.ipynb"' in path.read_bytes()
+    for result in RESULTS[1:]:
+        reporter.report(result, result["file"].replace(".py", ".ipynb"))
+    reporter.summarize(SUMMARY)
+    reporter.close()
+    suite = ET.parse(path).getroot().find("testsuite")
+    assert suite is not None
+    assert {k: suite.get(k) for k in ("tests", "failures", "skipped", "time")} == {
+        "tests": "4",
+        "failures": "2",
+        "skipped": "1",
+        "time": "3.500",
+    }
+    cases = suite.findall("testcase")
+    assert [c.get("name") for c in cases] == [
+        "a.ipynb",
+        "b.ipynb",
+        "c.ipynb",
+        "d.ipynb",
+    ]
+    assert cases[1].find("skipped") is not None
+    failure = cases[2].find("failure")
+    assert failure is not None and failure.text is not None
+    assert "Traceback <boom> &" in failure.text
+    assert cases[3].find("failure").get("type") == "timeout"  # type: ignore[union-attr]
+
+
+def test_junit_xml_reporter_interrupted(tmp_path: Path) -> None:
+    # the run failed before `summarize`: the report is still a complete document
+    path = tmp_path / "junit.xml"
+    reporter = JUnitXmlReporter(str(path))
+    reporter.report(RESULTS[0], "a.ipynb")
+    reporter.report(RESULTS[2], "c.ipynb")
+    reporter.close()
+    suite = ET.parse(path).getroot().find("testsuite")
+    assert suite is not None
+    assert (suite.get("tests"), suite.get("failures")) == ("2", "1")
+    assert [c.get("name") for c in suite.findall("testcase")] == ["a.ipynb", "c.ipynb"]
+
+
+def test_junit_xml_reporter_suite_name(tmp_path: Path) -> None:
+    path = tmp_path / "junit.xml"
+    with pytest.raises(ValueError, match="too long"):
+        JUnitXmlReporter(str(path), suite_name="x" * 200)
+    # the header is measured in bytes
+    reporter = JUnitXmlReporter(str(path), suite_name="é" * 30)
+    reporter.report(RESULTS[0], "a.ipynb")
+    reporter.summarize(SUMMARY)
+    reporter.close()
+    suite = ET.parse(path).getroot().find("testsuite")
+    assert suite is not None and suite.get("name") == "é" * 30
+
+
+def test_summary_reporter(capsys: pytest.CaptureFixture[str]) -> None:
+    reporter = SummaryReporter(slowest=2)
+    for result in RESULTS:
+        reporter.report(result, result["file"])
+    reporter.summarize(SUMMARY)
+    out = capsys.readouterr().out
+    assert "2 tests were successfull (1 cached)" in out
+    assert "2 tests failed (1 timed out)" in out
+    assert "\t- d.py (timed out)\n" in out
+    slowest = out.split("Slowest notebooks:\n\n")[1].split("\n\n")[0].splitlines()
+    assert len(slowest) == 2
+    assert slowest[0].endswith("c.py") and slowest[1].endswith("d.py")
@@ -0,0 +1,78 @@
+import pytest
+
+from test_nb.models import TimingEntry
+from test_nb.scheduling import (
+    DEFAULT_POLICY,
+    SCHEDULING_POLICIES,
+    get_policy,
+    register_policy,
+    shard_files,
+)
+
+FILES = [f"nb_{i}.ipynb" for i in range(7)]
+
+
+def test_shard_files_by_count() -> None:
+    shards = [shard_files(FILES, i, 3) for i in range(1, 4)]
+    assert sorted(sum(shards, [])) == FILES
+    assert sorted(len(shard) for shard in shards) == [2, 2, 3]
+    # every node computes the same partition, whatever the discovery order
+    assert shard_files(FILES[::-1], 2, 3) == shards[1][::-1]
+
+
+def test_shard_files_by_duration() -> None:
+    durations = {"nb_0.ipynb": 60.0, "nb_1.ipynb": 20.0, "nb_2.ipynb": 20.0}
+    durations.update({f: 5.0 for f in FILES[3:]})
+    shards = [shard_files(FILES, i, 2, durations) for i in range(1, 3)]
+    assert shards[0] == ["nb_0.ipynb"]
+    assert sorted(sum(shards, [])) == FILES
+    # unknown notebooks count as the average duration
+    durations = {"nb_0.ipynb": 30.0, "nb_1.ipynb": 10.0}
+    assert shard_files(FILES, 1, 2, durations) == [
+        "nb_0.ipynb",
+        "nb_4.ipynb",
+        "nb_6.ipynb",
+    ]
+
+
+def test_shard_files_invalid() -> None:
+    with pytest.raises(ValueError):
+        shard_files(FILES, 0, 2)
+    with pytest.raises(ValueError):
+        shard_files(FILES, 3, 2)
+
+
+def test_scheduling_policies() -> None:
+    timings: dict[str, TimingEntry] = {
+        "nb_1.ipynb": {"duration": 1.0, "passed": True},
+        "nb_2.ipynb": {"duration": 9.0, "passed": True},
+        "nb_3.ipynb": {"duration": 2.0, "passed": False},
+    }
+    files = ["nb_0.ipynb", "nb_1.ipynb", "nb_2.ipynb", "nb_3.ipynb"]
+    assert get_policy(DEFAULT_POLICY)(files, timings) == files
+    # nb_0 has no timings and counts as the average duration, 4 seconds
+    assert get_policy("longest-first")(files, timings) == [
+        "nb_2.ipynb",
+        "nb_0.ipynb",
+        "nb_3.ipynb",
+        "nb_1.ipynb",
+    ]
+    assert get_policy("failed-first")(files, timings) == [
+        "nb_3.ipynb",
+        "nb_0.ipynb",
+        "nb_1.ipynb",
+        "nb_2.ipynb",
+    ]
+    with pytest.raises(ValueError):
+        get_policy("random")
+
+
+def test_register_policy() -> None:
+    @register_policy("reversed")
+    def reverse(files: list[str], timings: dict[str, TimingEntry]) -> list[str]:
+        return files[::-1]
+
+    try:
+        assert get_policy("reversed")(FILES, {}) == FILES[::-1]
+    finally:
+        del SCHEDULING_POLICIES["reversed"]
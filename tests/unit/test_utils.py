@@ -1,4 +1,11 @@
-from test_nb.utils import find_notebooks_in_dir, file_exists, dir_exists
+from pathlib import Path
+from test_nb.utils import (
+    find_notebooks_in_dir,
+    iter_notebooks,
+    file_exists,
+    dir_exists,
+    read_tail,
+)
 
 
 def test_file_exists() -> None:
@@ -31,3 +38,53 @@ def test_find_notebooks_in_dir() -> None:
             "test_notebooks/nested/notebook.ipynb",
         ]
     )
+
+
+def test_iter_notebooks_ignore_rules(tmp_path: Path) -> None:
+    for rel in [
+        "a.ipynb",
+        "b.ipynb",
+        "notes.txt",
+        ".ipynb_checkpoints/a-checkpoint.ipynb",
+        "node_modules/pkg/x.ipynb",
+        "examples/c.ipynb",
+        "examples/draft_d.ipynb",
+        "build/e.ipynb",
+        "docs/nested/f.ipynb",
+    ]:
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_text("{}")
+    (tmp_path / ".nbtestignore").write_text("# generated\nbuild/\n")
+
+    def found(**kwargs) -> list[str]:
+        return [
+            Path(p).relative_to(tmp_path).as_posix()
+            for p in iter_notebooks(str(tmp_path), **kwargs)
+        ]
+
+    assert found(recursive=False) == ["a.ipynb", "b.ipynb"]
+    assert found(recursive=True) == [
+        "a.ipynb",
+        "b.ipynb",
+        "docs/nested/f.ipynb",
+        "examples/c.ipynb",
+        "examples/draft_d.ipynb",
+    ]
+    assert found(recursive=True, exclude=["draft_*", "docs/"]) == [
+        "a.ipynb",
+        "b.ipynb",
+        "examples/c.ipynb",
+    ]
+    assert found(recursive=True, include=["examples/*"]) == [
+        "examples/c.ipynb",
+        "examples/draft_d.ipynb",
+    ]
+
+
+def test_read_tail(tmp_path: Path) -> None:
+    log = tmp_path / "notebook.log"
+    log.write_bytes(b"a" * 100 + b"the end")
+    assert read_tail(str(log), 1000) == "a" * 100 + "the end"
+    tail = read_tail(str(log), 7)
+    assert tail.endswith("\nthe end")
+    assert "100 bytes truncated" in tail
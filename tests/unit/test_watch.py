@@ -0,0 +1,103 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from test_nb.watch import (
+    InotifyWatcher,
+    PollingWatcher,
+    Watcher,
+    WatchTargets,
+    iter_batches,
+)
+
+
+def _watchers() -> list[str]:
+    kinds = ["polling"]
+    if sys.platform.startswith("linux"):
+        kinds.append("inotify")
+    return kinds
+
+
+def _create(kind: str, targets: WatchTargets) -> Watcher:
+    if kind == "inotify":
+        return InotifyWatcher(targets)
+    return PollingWatcher(targets, interval=0.01)
+
+
+def _write(path: Path, content: str = "{}") -> None:
+    path.write_text(content)
+    # make sure polling sees a different mtime even on coarse-grained filesystems
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+@pytest.fixture(params=_watchers())
+def kind(request: pytest.FixtureRequest) -> str:
+    return request.param
+
+
+def test_watch_targets(tmp_path: Path) -> None:
+    (tmp_path / "a.ipynb").write_text("{}")
+    (tmp_path / "notes.txt").write_text("")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b.ipynb").write_text("{}")
+    (tmp_path / ".ipynb_checkpoints").mkdir()
+    (tmp_path / ".ipynb_checkpoints" / "a-checkpoint.ipynb").write_text("{}")
+    targets = WatchTargets(directory=str(tmp_path), recursive=True)
+    directories, notebooks = targets.initial()
+    assert directories == {str(tmp_path), str(tmp_path / "sub")}
+    assert notebooks == {str(tmp_path / "a.ipynb"), str(tmp_path / "sub" / "b.ipynb")}
+    flat = WatchTargets(directory=str(tmp_path))
+    assert flat.initial()[1] == {str(tmp_path / "a.ipynb")}
+    assert not flat.accepts(str(tmp_path / "sub" / "b.ipynb"))
+
+
+def test_watcher_reports_changes(tmp_path: Path, kind: str) -> None:
+    notebook = tmp_path / "a.ipynb"
+    notebook.write_text("{}")
+    watcher = _create(kind, WatchTargets(directory=str(tmp_path), recursive=True))
+    try:
+        assert watcher.changes(0.05) == set()
+        _write(notebook, '{"cells": []}')
+        assert watcher.changes(2) == {str(notebook)}
+        (tmp_path / "sub").mkdir()
+        _write(tmp_path / "sub" / "b.ipynb")
+        changed: set[str] = set()
+        deadline = time.monotonic() + 2
+        while str(tmp_path / "sub" / "b.ipynb") not in changed:
+            assert time.monotonic() < deadline
+            changed |= watcher.changes(0.1)
+        checkpoints = tmp_path / ".ipynb_checkpoints"
+        checkpoints.mkdir()
+        _write(checkpoints / "a-checkpoint.ipynb")
+        _write(tmp_path / "notes.txt")
+        assert watcher.changes(0.2) == set()
+        notebook.unlink()
+        assert watcher.changes(2) == {str(notebook)}
+    finally:
+        watcher.close()
+
+
+def test_iter_batches_debounce(tmp_path: Path, kind: str) -> None:
+    notebooks = [tmp_path / f"{i}.ipynb" for i in range(3)]
+    for notebook in notebooks:
+        notebook.write_text("{}")
+    watcher = _create(kind, WatchTargets(directory=str(tmp_path)))
+
+    def save_all() -> None:
+        for notebook in notebooks:
+            _write(notebook, '{"cells": []}')
+            time.sleep(0.02)
+
+    try:
+        writer = threading.Thread(target=save_all)
+        writer.start()
+        batch = next(iter_batches(watcher, debounce=0.3))
+        writer.join()
+        assert batch == {str(notebook) for notebook in notebooks}
+    finally:
+        watcher.close()